@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Hashable
+
+from redis.exceptions import RedisError
+from sqlalchemy import event
+
+import ckan.model as model
+import ckan.plugins.toolkit as tk
+from ckan.lib.redis import connect_to_redis
+
+log = logging.getLogger(__name__)
+
+NS_HIERARCHY = "hierarchy"
+
+# namespaces invalidated after the commit of the session's transaction
+SESSION_PENDING_KEY = "datavicmain_pending_invalidation"
+
+_lock = threading.Lock()
+
+
+def user_namespace(user_id: str) -> str:
+    """Namespace of values that depend on user's memberships"""
+    return f"user:{user_id}"
+
+
+def _version_key(namespace: str) -> str:
+    site_id = tk.config["ckan.site_id"]
+    return f"ckan:{site_id}:datavicmain:cache_version:{namespace}"
+
+
+def _version_base() -> int:
+    """Initial version of a namespace.
+
+    Versions don't start from 0, so after a Redis reset they don't repeat
+    values already seen by CKAN processes and stale values are not
+    reported as fresh."""
+    return time.time_ns() // 1000
+
+
+def get_versions(*namespaces: str) -> tuple[int, ...] | None:
+    """Return current versions of namespaces.
+
+    Versions are kept in Redis, so every CKAN process and node sees the same
+    versions. None is returned if Redis is not available."""
+    if not namespaces:
+        return ()
+
+    keys = [_version_key(namespace) for namespace in namespaces]
+
+    try:
+        conn = connect_to_redis()
+        values = conn.mget(keys)
+
+        if None in values:
+            pipe = conn.pipeline()
+
+            for key, value in zip(keys, values):
+                if value is None:
+                    pipe.set(key, _version_base(), nx=True)
+
+            pipe.mget(keys)
+            values = pipe.execute()[-1]
+    except RedisError:
+        log.warning("Cannot read cache versions of %s", namespaces)
+        return None
+
+    return tuple(int(value) for value in values)
+
+
+def invalidate(*namespaces: str) -> None:
+    """Bump versions of namespaces. Every cached value that depends on them
+    becomes stale in all CKAN processes"""
+    try:
+        pipe = connect_to_redis().pipeline()
+
+        for namespace in namespaces:
+            key = _version_key(namespace)
+            pipe.set(key, _version_base(), nx=True)
+            pipe.incr(key)
+
+        pipe.execute()
+    except RedisError:
+        log.exception("Cannot invalidate cache namespaces %s", namespaces)
+        return
+
+    log.debug("Invalidated cache namespaces: %s", namespaces)
+
+
+def invalidate_on_commit(*namespaces: str) -> None:
+    """Invalidate namespaces after the current transaction is committed.
+
+    If namespaces are invalidated before the commit, other processes can
+    cache values computed from the data that is not committed yet."""
+    model.Session.info.setdefault(SESSION_PENDING_KEY, set()).update(
+        namespaces
+    )
+
+
+@event.listens_for(model.Session, "after_commit")
+def _invalidate_committed(session: Any) -> None:
+    namespaces = session.info.pop(SESSION_PENDING_KEY, None)
+
+    if namespaces:
+        invalidate(*namespaces)
+
+
+class VersionedCache:
+    """In-process cache of values that depend on namespace versions.
+
+    Value is recalculated when any of namespaces it depends on has been
+    invalidated since the value was stored. Values also expire after ttl
+    seconds, in case an invalidation was lost. Cache is bypassed if versions
+    are not available."""
+
+    def __init__(self, *depends_on: str, maxsize: int = 1024, ttl: int = 600):
+        self.depends_on = depends_on
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: dict[Hashable, tuple[tuple[int, ...], float, Any]] = {}
+
+    def get(
+        self,
+        key: Hashable,
+        factory: Callable[[], Any],
+        extra_namespaces: tuple[str, ...] = (),
+    ) -> Any:
+        version = get_versions(*self.depends_on, *extra_namespaces)
+
+        if version is None:
+            return factory()
+
+        cached = self._data.get(key)
+        now = time.monotonic()
+
+        if cached is not None and cached[0] == version and cached[1] > now:
+            return cached[2]
+
+        value = factory()
+
+        with _lock:
+            self._data[key] = (version, now + self.ttl, value)
+
+            while len(self._data) > self.maxsize:
+                del self._data[next(iter(self._data))]
+
+        return value
+
+    def clear(self) -> None:
+        with _lock:
+            self._data.clear()
+
+
+hierarchy_cache = VersionedCache(NS_HIERARCHY, maxsize=16)
+user_labels_cache = VersionedCache(NS_HIERARCHY, maxsize=4096)
@@ -6,7 +6,7 @@ from ckan.plugins.toolkit import enqueue_job
 
 from ckanext.datavicmain import jobs
 
-from . import maintain, report
+from . import maintain, report, syndicate
 
 log = logging.getLogger(__name__)
 
@@ -32,6 +32,9 @@ def ckan_worker_job_monitor():
 
 datavic_main.add_command(maintain.maintain)
 datavic_main.add_command(report.report)
+datavic_main.add_command(syndicate.syndicate_bulk)
+datavic_main.add_command(syndicate.syndication_failures)
+datavic_main.add_command(syndicate.syndication_retry)
 
 
 def get_commands():
@@ -22,6 +22,7 @@ import ckan.model as model
 import ckan.plugins.toolkit as tk
 from ckan.lib.munge import munge_title_to_name
 from ckan.lib.search import clear as search_clear
+from ckan.lib.search import commit as search_commit
 from ckan.lib.search import rebuild
 from ckan.lib.uploader import get_resource_uploader
 from ckan.model import Resource, ResourceView
@@ -30,7 +31,10 @@ from ckan.types import Context
 from ckanext.datastore.backend import get_all_resources_ids_in_datastore
 from ckanext.harvest.model import HarvestObject, HarvestSource
 
+from ckanext.datavicmain import cache, jobs, utils
 from ckanext.datavicmain.helpers import field_choices
+from ckanext.datavicmain.implementation import bulk_indexing
+from ckanext.datavicmain.model import ReindexTask
 
 log = logging.getLogger(__name__)
 
@@ -862,6 +866,64 @@ def get_resources_by_size(empty: bool, limit: bool, restricted: bool):
     )
 
 
+@maintain.command("refresh-org-restriction")
+@click.argument("org_id", required=False)
+def refresh_org_restriction(org_id: str | None):
+    """Recalculate the materialized organisation restriction. Recalculate it
+    for all organisations if ORG_ID is not provided. Datasets of
+    organisations whose restriction changed are reindexed in background."""
+    changed = utils.refresh_org_restriction(org_id)
+    model.repo.commit()
+    cache.invalidate(cache.NS_HIERARCHY)
+
+    for changed_id in changed:
+        jobs.enqueue_organization_reindex(changed_id, labels_only=True)
+
+    click.secho("Organisation restriction has been recalculated", fg="green")
+
+
+@maintain.command("rebuild-search-index")
+@click.option(
+    "-i", "--force", is_flag=True, help="Ignore exceptions when rebuilding"
+)
+@click.option(
+    "-o", "--only-missing", is_flag=True, help="Index non indexed datasets"
+)
+@click.option("-c", "--clear", is_flag=True, help="Clear the index before")
+@click.argument("package_id", required=False)
+def rebuild_search_index(
+    force: bool, only_missing: bool, clear: bool, package_id: str | None
+):
+    """Rebuild search index with labels of organisations precomputed once,
+    instead of checking the restriction for every dataset."""
+    with bulk_indexing():
+        rebuild(
+            package_id,
+            only_missing=only_missing,
+            force=force,
+            defer_commit=True,
+            clear=clear,
+        )
+
+    search_commit()
+    click.secho("Search index has been rebuilt", fg="green")
+
+
+@maintain.command("resume-reindex")
+@click.argument("task_id")
+def resume_reindex(task_id: str):
+    """Enqueue jobs for failed and unfinished chunks of the organisation
+    reindex task."""
+    task = ReindexTask.get(task_id)
+
+    if not task:
+        tk.error_shout(f"Reindex task {task_id} not found")
+        raise click.Abort()
+
+    enqueued = jobs.enqueue_reindex_chunks(task)
+    click.secho(f"Enqueued {enqueued} chunks of the task", fg="green")
+
+
 @maintain.command("make-datatables-view-prioritized")
 def make_datatables_view_prioritized():
     """Check if there are resources that have recline_view and datatables_view and
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import logging
+from datetime import datetime
+from itertools import groupby
+
+import click
+
+import ckan.model as model
+
+from ckanext.syndicate.utils import get_profiles
+
+from ckanext.datavicmain import config, jobs
+from ckanext.datavicmain.model import FailedResourceSync
+from ckanext.datavicmain.syndication import bulk, listeners
+
+log = logging.getLogger(__name__)
+
+
+@click.command("syndicate-bulk")
+@click.option(
+    "-p",
+    "--profile",
+    "profile_ids",
+    multiple=True,
+    help="Syndication profile. All profiles are used by default.",
+)
+@click.option(
+    "-o",
+    "--org",
+    "orgs",
+    multiple=True,
+    help="Organisation ID or name. Datasets of suborganisations included.",
+)
+@click.option("-q", "--query", help="Search query selecting datasets.")
+@click.option(
+    "-s",
+    "--since",
+    type=click.DateTime(),
+    help="Select datasets modified after the date.",
+)
+@click.option(
+    "-w", "--workers", default=4, show_default=True, type=click.IntRange(1)
+)
+@click.option(
+    "--dry-run", is_flag=True, help="Only report the number of datasets."
+)
+def syndicate_bulk(
+    profile_ids: tuple[str, ...],
+    orgs: tuple[str, ...],
+    query: str | None,
+    since: datetime | None,
+    workers: int,
+    dry_run: bool,
+):
+    """Syndicate selected datasets using a pool of workers. Without filters
+    every active dataset is syndicated."""
+    profiles = [
+        profile
+        for profile in get_profiles()
+        if not profile_ids or profile.id in profile_ids
+    ]
+
+    if not profiles:
+        raise click.ClickException("No syndication profiles found")
+
+    org_ids = []
+
+    for org_id in orgs:
+        org = model.Group.get(org_id)
+
+        if not org or not org.is_organization:
+            raise click.BadParameter(
+                f"Organisation {org_id} not found", param_hint="--org"
+            )
+
+        org_ids.append(org.id)
+
+    package_ids = bulk.select_package_ids(org_ids, query, since)
+
+    click.secho(
+        f"{len(package_ids)} datasets will be syndicated into"
+        f" {', '.join(profile.id for profile in profiles)}",
+        fg="green",
+    )
+
+    if dry_run or not package_ids:
+        return
+
+    app = click.get_current_context().meta["flask_app"]
+
+    with click.progressbar(
+        length=len(package_ids) * len(profiles)
+    ) as progress:
+        result = bulk.syndicate_bulk(
+            app,
+            package_ids,
+            profiles,
+            workers,
+            on_progress=lambda: progress.update(1),
+        )
+
+    click.secho(
+        f"Synced: {result.synced}, skipped: {result.skipped},"
+        f" failed: {len(result.failed)} in {result.elapsed:.1f}s"
+        f" ({result.throughput:.2f} syndications/s)",
+        fg="red" if result.failed else "green",
+    )
+
+    for (package_id, profile_id), error in result.failed.items():
+        click.secho(f"{package_id} ({profile_id}): {error}", fg="red")
+
+
+@click.command("syndication-failures")
+@click.option(
+    "--retry",
+    is_flag=True,
+    help="Reset attempts and enqueue retry jobs for listed datasets.",
+)
+def syndication_failures(retry: bool):
+    """List datasets with resources that could not be synchronized with the
+    syndication target after all the attempts."""
+    records = FailedResourceSync.stuck(
+        config.get_resource_sync_retries()
+    ).all()
+    found = False
+
+    for (package_id, profile_id), group in groupby(
+        records, lambda record: (record.package_id, record.profile_id)
+    ):
+        found = True
+        failures = list(group)
+        pkg = model.Package.get(package_id)
+
+        click.secho(
+            f"{pkg.name if pkg else package_id} ({profile_id}):"
+            f" {len(failures)} resource(s)",
+            fg="yellow",
+        )
+
+        for record in failures:
+            click.echo(f"\t{record.resource_id}: {record.error}")
+
+        if not retry:
+            continue
+
+        for record in failures:
+            record.attempts = 0
+
+        model.Session.commit()
+        listeners.enqueue_retry(package_id, profile_id)
+
+    if not found:
+        click.secho("No stuck datasets found", fg="green")
+
+
+@click.command("syndication-retry")
+def syndication_retry():
+    """Enqueue retries of failed syndication that are due. Run it
+    periodically, e.g. every minute from cron."""
+    datasets = listeners.enqueue_due_retries()
+    organizations = jobs.enqueue_due_propagations()
+    click.secho(
+        f"Enqueued retries for {datasets} dataset(s)"
+        f" and {organizations} organisation(s)",
+        fg="green",
+    )
@@ -6,6 +6,17 @@ CONFIG_PAGES_BASE_URL = "ckan.pages.base_url"
 CONFIG_DTV_URL = "ckanext.datavicmain.dtv.url"
 CONFIG_DTV_MAX_SIZE_LIMIT = "ckanext.datavicmain.dtv.max_size_limit"
 CONFIG_DTV_EXTERNAL_LINK = "ckanext.datavicmain.dtv.external_link"
+CONFIG_REINDEX_CHUNK_SIZE = "ckanext.datavicmain.reindex.chunk_size"
+CONFIG_REINDEX_PENDING_TTL = "ckanext.datavicmain.reindex.pending_ttl"
+CONFIG_ORG_PROPAGATION_RETRIES = "ckanext.datavicmain.org_propagation.retries"
+CONFIG_ORG_PROPAGATION_BACKOFF = "ckanext.datavicmain.org_propagation.backoff"
+CONFIG_SYNDICATION_DELTA = "ckanext.datavicmain.syndication.delta"
+CONFIG_RESOURCE_RETRIES = "ckanext.datavicmain.syndication.resource_retries"
+CONFIG_RESOURCE_BACKOFF = "ckanext.datavicmain.syndication.resource_backoff"
+CONFIG_SYNDICATION_CONCURRENCY = "ckanext.datavicmain.syndication.concurrency"
+CONFIG_PROFILE_CONCURRENCY = (
+    "ckanext.datavicmain.syndication.{profile}.concurrency"
+)
 
 
 def get_pages_base_url() -> str:
@@ -22,3 +33,40 @@ def get_dtv_max_size_limit() -> int:
 
 def get_dtv_external_link() -> str:
     return tk.config.get(CONFIG_DTV_EXTERNAL_LINK, "")
+
+
+def get_reindex_chunk_size() -> int:
+    return tk.config[CONFIG_REINDEX_CHUNK_SIZE]
+
+
+def get_reindex_pending_ttl() -> int:
+    return tk.config[CONFIG_REINDEX_PENDING_TTL]
+
+
+def get_org_propagation_retries() -> int:
+    return tk.config[CONFIG_ORG_PROPAGATION_RETRIES]
+
+
+def get_org_propagation_backoff() -> int:
+    return tk.config[CONFIG_ORG_PROPAGATION_BACKOFF]
+
+
+def is_syndication_delta_enabled() -> bool:
+    return tk.config[CONFIG_SYNDICATION_DELTA]
+
+
+def get_resource_sync_retries() -> int:
+    return tk.config[CONFIG_RESOURCE_RETRIES]
+
+
+def get_resource_sync_backoff() -> int:
+    return tk.config[CONFIG_RESOURCE_BACKOFF]
+
+
+def get_syndication_concurrency(profile_id: str) -> int:
+    value = tk.config.get(
+        CONFIG_PROFILE_CONCURRENCY.format(profile=profile_id),
+        tk.config[CONFIG_SYNDICATION_CONCURRENCY],
+    )
+
+    return max(1, tk.asint(value))
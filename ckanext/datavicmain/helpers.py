@@ -17,7 +17,7 @@ from ckanext.harvest.model import HarvestObject
 from ckanext.datavicmain.config import get_dtv_external_link, get_dtv_url
 
 from . import config as conf
-from . import const, utils
+from . import utils
 
 log = logging.getLogger(__name__)
 WORKFLOW_STATUS_OPTIONS = [
@@ -433,54 +433,27 @@ def datavic_is_pending_request_to_join_org(username: str, org_id: str) -> bool:
 
 
 def datavic_org_has_unrestricted_child(org_id: str) -> bool:
-    """Check if the organization has restricted children orgs"""
+    """Check if the organization has unrestricted children orgs"""
     organization = model.Group.get(org_id)
 
     if not organization:
         return False
 
-    child_orgs = organization.get_children_group_hierarchy("organization")
-
-    if not child_orgs:
-        return False
-
-    for child_org in child_orgs:
-        org_object = model.Group.get(child_org[0])
-
-        if not org_object:
-            continue
-
-        if (
-            org_object.extras.get(
-                const.ORG_VISIBILITY_FIELD, const.ORG_UNRESTRICTED
-            )
-            == const.ORG_UNRESTRICTED
-        ):
-            return True
-
-    return False
+    return utils.org_has_unrestricted_descendant(organization.id)
 
 
 def datavic_org_has_restricted_parents(org_id: str) -> bool:
-    """Check if the organization has restricted children orgs"""
+    """Check if the organization has restricted parent orgs. Restriction is
+    inherited, so it's enough to check the direct parent"""
     organization = model.Group.get(org_id)
 
     if not organization:
         return False
 
-    parent_orgs = organization.get_parent_group_hierarchy("organization")
-
-    if not parent_orgs:
-        return False
-
-    for parent_org in parent_orgs:
-        if (
-            parent_org.extras.get(const.ORG_VISIBILITY_FIELD)
-            == const.ORG_RESTRICTED
-        ):
-            return True
-
-    return False
+    return any(
+        utils.is_org_restricted(parent.id)
+        for parent in organization.get_parent_groups("organization")
+    )
 
 
 def datavic_is_org_restricted(org_id: str) -> bool:
@@ -519,21 +492,10 @@ def datavic_restrict_hierarchy_tree(
     ]
     """
 
-    result = []
-
-    for org_dict in hierarchy_tree:
-        if not utils.user_has_org_access(
-            org_dict["id"], toolkit.current_user.name
-        ):
-            continue
-
-        org_dict["children"] = datavic_restrict_hierarchy_tree(
-            org_dict["children"]
-        )
-
-        result.append(org_dict)
-
-    return result
+    return utils.filter_hierarchy_tree(
+        hierarchy_tree,
+        utils.get_org_access_resolver(toolkit.current_user.name),
+    )
 
 
 @toolkit.chained_helper
@@ -544,24 +506,21 @@ def group_tree_parents(next_func, id_, type_="organization"):
 
 
 def _group_tree_parents(id_, type_="organization"):
-    try:
-        tree_node = toolkit.get_action("organization_show")({}, {"id": id_})
-    except toolkit.ObjectNotFound:
-        return []
+    """Return the parents of organisation that are available to the current
+    user. Parents above the first unavailable one are not shown"""
+    chain = utils.get_org_chain(id_, type_)
+    resolver = utils.get_org_access_resolver(toolkit.current_user.name)
+    accessible = resolver.filter_accessible(node["id"] for node in chain)
 
-    if tree_node["groups"]:
-        parent_id = tree_node["groups"][0]["name"]
+    available = []
 
-        try:
-            parent_node = toolkit.get_action("organization_show")(
-                {}, {"id": parent_id}
-            )
-        except toolkit.ObjectNotFound:
-            return []
+    for node in reversed(chain):
+        if node["id"] not in accessible:
+            break
 
-        return _group_tree_parents(parent_id) + [parent_node]
-    else:
-        return []
+        available.insert(0, node)
+
+    return available[:-1]
 
 
 def add_current_organisation(
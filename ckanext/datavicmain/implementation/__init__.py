@@ -1,5 +1,6 @@
-from .permission_labels import PermissionLabels
+from .permission_labels import PermissionLabels, bulk_indexing
 
 __all__ = [
     "PermissionLabels",
+    "bulk_indexing",
 ]
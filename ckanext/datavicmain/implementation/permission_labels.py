@@ -1,23 +1,27 @@
 from __future__ import annotations
 
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
 import ckan.plugins as p
 import ckan.plugins.toolkit as tk
 from ckan import model
 from ckan.lib.plugins import DefaultPermissionLabels
 
-from ckanext.datavicmain import utils
+from ckanext.datavicmain import cache, utils
+from ckanext.datavicmain.model import OrgRestriction
+
+_bulk_org_labels: ContextVar[dict[str, str] | None] = ContextVar(
+    "datavicmain_bulk_org_labels", default=None
+)
 
 
 class PermissionLabels(p.SingletonPlugin, DefaultPermissionLabels):
     p.implements(p.IPermissionLabels)
 
     def get_dataset_labels(self, dataset_obj: model.Package) -> list[str]:
-        labels: list[str] = []
-
-        if utils.is_org_restricted(dataset_obj.owner_org):
-            labels.append(_org_restriction_label(dataset_obj.owner_org))
-        else:
-            labels.append("public")
+        labels: list[str] = [_get_owner_org_label(dataset_obj.owner_org)]
 
         if tk.config["ckan.auth.allow_dataset_collaborators"]:
             labels.append(f"collaborator-{dataset_obj.id}")
@@ -25,13 +29,26 @@ class PermissionLabels(p.SingletonPlugin, DefaultPermissionLabels):
         return labels
 
     def get_user_dataset_labels(self, user_obj: model.User) -> list[str]:
-        labels: list[str] = super().get_user_dataset_labels(user_obj)
-
         if not user_obj or user_obj.is_anonymous:
-            return labels
+            return super().get_user_dataset_labels(user_obj)
+
+        # labels depend on hierarchy, memberships and collaborations. All of
+        # them invalidate the cache on change. Sysadmin flag is a part of the
+        # key, because `ckan sysadmin` changes it without any action.
+        return list(
+            cache.user_labels_cache.get(
+                (user_obj.id, user_obj.sysadmin),
+                lambda: self._compute_user_dataset_labels(user_obj),
+                extra_namespaces=(cache.user_namespace(user_obj.id),),
+            )
+        )
+
+    def _compute_user_dataset_labels(self, user_obj: model.User) -> list[str]:
+        labels: list[str] = super().get_user_dataset_labels(user_obj)
+        restrictions = utils.get_org_restrictions()
 
         for org in _get_user_orgs_ids(user_obj.name):
-            if not utils.is_org_restricted(org["id"]):
+            if not restrictions.is_restricted(org["id"]):
                 continue
 
             labels.append(_org_restriction_label(org["id"]))
@@ -48,6 +65,42 @@ class PermissionLabels(p.SingletonPlugin, DefaultPermissionLabels):
         return labels
 
 
+@contextmanager
+def bulk_indexing() -> Iterator[None]:
+    """Precompute labels of every owner organisation for the search index
+    rebuild, so datasets don't check the restriction of their organisation
+    one by one.
+
+    Example:
+        with bulk_indexing():
+            rebuild(package_ids=ids)
+    """
+    org_labels = {
+        org_id: _org_restriction_label(org_id) if restricted else "public"
+        for org_id, restricted in model.Session.query(
+            OrgRestriction.org_id, OrgRestriction.restricted
+        )
+    }
+    token = _bulk_org_labels.set(org_labels)
+
+    try:
+        yield
+    finally:
+        _bulk_org_labels.reset(token)
+
+
+def _get_owner_org_label(owner_org: str | None) -> str:
+    org_labels = _bulk_org_labels.get()
+
+    if org_labels is not None and owner_org in org_labels:
+        return org_labels[owner_org]
+
+    if utils.is_org_restricted(owner_org):
+        return _org_restriction_label(owner_org)
+
+    return "public"
+
+
 def _org_restriction_label(org_id: str) -> str:
     """View access for risk."""
     return f"vicmain-restricted-org-{org_id}"
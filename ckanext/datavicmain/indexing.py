@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import json
+import logging
+from functools import cached_property
+from typing import Any, Callable, Iterable
+
+import requests
+from pysolr import SolrError
+
+import ckan.model as model
+import ckan.plugins.toolkit as tk
+from ckan.lib.plugins import get_permission_labels
+from ckan.lib.search.common import SolrSettings, make_connection
+
+log = logging.getLogger(__name__)
+
+API_FORMATS = {
+    "WMS",
+    "WFS",
+    "API",
+    "ARCGIS GEOSERVICES REST API",
+    "ESRI REST",
+    "GEOJSON",
+}
+ALL_API_FORMAT = "ALL_API"
+LABELS_FIELD = "permission_labels"
+ORG_LABEL_PREFIX = "vicmain-restricted-org-"
+
+_atomic_updates_supported: bool | None = None
+
+_stages: list[Callable[[IndexDocument], None]] = []
+
+
+class IndexDocument:
+    """Search index document of a dataset.
+
+    Resources are taken from the serialized dataset that CKAN puts into the
+    document before calling `before_dataset_index`, so stages don't need to
+    fetch the dataset once again.
+    """
+
+    def __init__(self, data: dict[str, Any]):
+        self.data = data
+
+    @cached_property
+    def resources(self) -> list[dict[str, Any]]:
+        for field in ("validated_data_dict", "data_dict"):
+            if not self.data.get(field):
+                continue
+
+            try:
+                return json.loads(self.data[field]).get("resources") or []
+            except (TypeError, ValueError):
+                log.warning(
+                    "Cannot parse %s of the dataset %s",
+                    field,
+                    self.data.get("id"),
+                )
+
+        return tk.get_action("package_show")(
+            {"ignore_auth": True}, {"id": self.data["id"]}
+        ).get("resources", [])
+
+
+def index_stage(func: Callable[[IndexDocument], None]):
+    """Register a function that enriches the search index document"""
+    _stages.append(func)
+    return func
+
+
+def enrich_index_document(pkg_dict: dict[str, Any]) -> dict[str, Any]:
+    """Apply all registered stages to the search index document"""
+    document = IndexDocument(pkg_dict)
+
+    for stage in _stages:
+        stage(document)
+
+    return document.data
+
+
+@index_stage
+def normalize_res_format(document: IndexDocument) -> None:
+    """Turn formats into uppercase and strip file extension prefixes"""
+    if not document.data.get("res_format"):
+        return
+
+    document.data["res_format"] = [
+        res_format.upper().split(".")[-1]
+        for res_format in document.data["res_format"]
+    ]
+
+
+@index_stage
+def add_all_api_format(document: IndexDocument) -> None:
+    """Add the ALL_API format if the dataset contains a resource in a format
+    recognized as an API. Resource is an API if it's a CSV uploaded into the
+    datastore or its format is one of API_FORMATS"""
+    formats: list[str] = document.data.get("res_format") or []
+
+    if not formats:
+        return
+
+    if API_FORMATS.intersection(formats) or _has_datastore_csv(document):
+        formats.append(ALL_API_FORMAT)
+
+
+def _has_datastore_csv(document: IndexDocument) -> bool:
+    return any(
+        (resource.get("format") or "").upper() == "CSV"
+        and tk.asbool(resource.get("datastore_active"))
+        for resource in document.resources
+    )
+
+
+def update_permission_labels(package_ids: list[str]) -> list[str]:
+    """Set new permission labels of indexed datasets with a Solr atomic
+    update, instead of indexing the whole datasets again.
+
+    Only the organisation label is expected to change. Datasets that are not
+    indexed, or have other labels different from the expected ones, are not
+    updated. Return IDs of datasets that require the full reindex."""
+    if not package_ids:
+        return []
+
+    if not atomic_updates_supported():
+        return package_ids
+
+    conn = make_connection()
+
+    try:
+        indexed = {
+            doc["id"]: doc
+            for doc in conn.search(
+                "*:*",
+                fq=[
+                    "+site_id:{}".format(
+                        json.dumps(tk.config["ckan.site_id"])
+                    ),
+                    "+entity_type:package",
+                    "{!terms f=id}" + ",".join(package_ids),
+                ],
+                fl=f"id,index_id,{LABELS_FIELD}",
+                rows=len(package_ids),
+            )
+        }
+    except SolrError:
+        log.exception("Cannot fetch indexed permission labels")
+        return package_ids
+
+    labels_plugin = get_permission_labels()
+    updates: list[dict[str, Any]] = []
+    rest: list[str] = []
+
+    for pkg in model.Session.query(model.Package).filter(
+        model.Package.id.in_(package_ids)
+    ):
+        doc = indexed.get(pkg.id)
+        labels = labels_plugin.get_dataset_labels(pkg)
+
+        if not doc or _other_labels(doc.get(LABELS_FIELD) or []) != (
+            _other_labels(labels)
+        ):
+            rest.append(pkg.id)
+            continue
+
+        updates.append({"index_id": doc["index_id"], LABELS_FIELD: labels})
+
+    try:
+        if updates:
+            conn.add(updates, fieldUpdates={LABELS_FIELD: "set"}, commit=False)
+    except SolrError:
+        log.exception("Atomic update of permission labels failed")
+        return package_ids
+
+    return rest
+
+
+def atomic_updates_supported() -> bool:
+    """Check whether Solr schema allows atomic updates of documents.
+
+    Atomic update rebuilds the document from stored fields, so every field
+    must be stored, have docValues or be a copyField destination. Otherwise
+    the value of the field is lost. The result is cached for the process."""
+    global _atomic_updates_supported
+
+    if _atomic_updates_supported is None:
+        try:
+            _atomic_updates_supported = _check_solr_schema()
+        except (requests.RequestException, ValueError, KeyError):
+            log.exception("Cannot read Solr schema")
+            return False
+
+        if not _atomic_updates_supported:
+            log.warning(
+                "Solr schema does not support atomic updates, datasets will"
+                " be indexed in full"
+            )
+
+    return _atomic_updates_supported
+
+
+def _check_solr_schema() -> bool:
+    url, user, password = SolrSettings.get()
+    auth = (user, password) if user and password else None
+
+    def fetch(path: str) -> dict[str, Any]:
+        resp = requests.get(
+            f"{url.rstrip('/')}/schema/{path}",
+            params={"showDefaults": "true", "wt": "json"},
+            auth=auth,
+            timeout=10,
+        )
+        resp.raise_for_status()
+        return resp.json()
+
+    destinations = {item["dest"] for item in fetch("copyfields")["copyFields"]}
+    fields: Iterable[dict[str, Any]] = [
+        *fetch("fields")["fields"],
+        *fetch("dynamicfields")["dynamicFields"],
+    ]
+
+    return all(
+        field["name"] in destinations
+        or field.get("stored")
+        or (field.get("docValues") and field.get("useDocValuesAsStored"))
+        for field in fields
+    )
+
+
+def _other_labels(labels: Iterable[str]) -> set[str]:
+    """Labels that don't depend on the organisation restriction"""
+    return {
+        label
+        for label in labels
+        if label != "public" and not label.startswith(ORG_LABEL_PREFIX)
+    }
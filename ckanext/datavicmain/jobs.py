@@ -2,53 +2,388 @@ from __future__ import annotations
 
 import logging
 import os
-from itertools import chain
+from datetime import datetime, timedelta
+from typing import Any, Iterator
 
+import ckanapi
 import requests
+import sqlalchemy as sa
+from redis.exceptions import RedisError
+from requests.exceptions import RequestException
 
+import ckan.plugins.toolkit as tk
 from ckan import model
+from ckan.lib.redis import connect_to_redis
 from ckan.lib.search import commit, rebuild
 
+from ckanext.syndicate.utils import get_profiles
+
+from ckanext.datavicmain import config, indexing, utils
+from ckanext.datavicmain.implementation import bulk_indexing
+from ckanext.datavicmain.model import (
+    OrgPropagation,
+    ReindexChunk,
+    ReindexTask,
+)
+from ckanext.datavicmain.syndication.organization import (
+    propagate_organization,
+)
+
 log = logging.getLogger(__name__)
 
+REINDEX_FULL = b"full"
+REINDEX_LABELS = b"labels"
+REINDEX_CLAIMED = b"claimed"
+
+PROPAGATION_LEASE = timedelta(hours=1)
+
+
+def enqueue_organization_reindex(
+    org_id: str, labels_only: bool = False
+) -> bool:
+    """Enqueue reindex_organization for the organisation, unless it's already
+    pending for the organisation or for one of its parents. The parent's
+    reindex covers the whole subtree, so the request is absorbed by it.
+
+    Reindex of `labels_only` is covered by any pending reindex, while the
+    full reindex is covered only by a full one.
+
+    Return True if the new job was enqueued."""
+    mode = REINDEX_LABELS if labels_only else REINDEX_FULL
+    parent_ids = [
+        org["id"] for org in utils.get_org_chain(org_id) if org["id"] != org_id
+    ]
+    key = _pending_reindex_key(org_id)
+    ttl = config.get_reindex_pending_ttl()
+
+    try:
+        conn = connect_to_redis()
+
+        if parent_ids and any(
+            _covers(pending, mode)
+            for pending in conn.mget(
+                [_pending_reindex_key(id_) for id_ in parent_ids]
+            )
+        ):
+            log.debug("Reindex of %s is absorbed by a parent", org_id)
+            return False
+
+        if not conn.set(key, mode, nx=True, ex=ttl):
+            if _covers(conn.get(key), mode):
+                log.debug("Reindex of %s is already pending", org_id)
+                return False
+
+            # pending labels-only reindex is upgraded to the full one, and
+            # the claimed marker is replaced by the new pending one
+            conn.set(key, mode, ex=ttl)
+
+    except RedisError:
+        log.exception("Cannot check pending reindex of %s", org_id)
+
+    tk.enqueue_job(
+        reindex_organization,
+        [org_id],
+        {"coalesced": True, "labels_only": labels_only},
+        title=f"Reindex organization {org_id}",
+    )
+    return True
+
 
-def reindex_organization(id_or_name: str) -> None:
-    """Rebuild search index for all datasets inside the organization."""
+def reindex_organization(
+    id_or_name: str, coalesced: bool = False, labels_only: bool = False
+) -> None:
+    """Rebuild search index for all datasets inside the organization.
+
+    Datasets are split into chunks of a configured size and each chunk is
+    indexed by a separate job, so workers can process them in parallel and a
+    failed chunk can be resumed without indexing everything again.
+
+    Jobs enqueued by enqueue_organization_reindex are `coalesced`. Such job
+    is skipped, if its marker was claimed by another job, i.e. the reindex
+    was already done by a job of a parent organisation or by a duplicate.
+
+    If only permission labels have to be updated, `labels_only` reindex
+    updates them in place, when Solr allows it."""
     org = model.Group.get(id_or_name)
 
     if not org:
         log.warning("Organization with ID or name %s not found", id_or_name)
         return
 
-    rebuild(package_ids=_get_related_package_ids(org), force=True)
-    commit()
+    done_by_other, modes = _claim_pending_reindex(org.id)
+
+    if coalesced and done_by_other:
+        log.info("Reindex of %s is already done by another job", org.name)
+        return
+
+    if REINDEX_FULL in modes:
+        labels_only = False
+
+    task = ReindexTask(org_id=org.id, total=0, labels_only=labels_only)
+    model.Session.add(task)
+    model.Session.flush()
+
+    for position, package_ids in enumerate(
+        iter_related_package_ids(org.id, config.get_reindex_chunk_size())
+    ):
+        task.total += len(package_ids)
+        model.Session.add(
+            ReindexChunk(
+                task_id=task.id, position=position, package_ids=package_ids
+            )
+        )
+
+    model.Session.commit()
+
+    log.info(
+        "Reindexing %s datasets of organization %s, task %s",
+        task.total,
+        org.name,
+        task.id,
+    )
+    enqueue_reindex_chunks(task)
+
+
+def enqueue_reindex_chunks(task: ReindexTask) -> int:
+    """Enqueue jobs for every unfinished chunk of the task. Return the number
+    of enqueued jobs"""
+    chunks = task.unfinished_chunks()
+
+    for chunk in chunks:
+        tk.enqueue_job(
+            reindex_chunk,
+            [chunk.id],
+            title=f"Reindex {task.org_id}, chunk {chunk.position}",
+        )
+
+    return len(chunks)
+
+
+def reindex_chunk(chunk_id: str) -> None:
+    """Rebuild search index for a single chunk of the ReindexTask"""
+    chunk = ReindexChunk.get(chunk_id)
+
+    if not chunk:
+        log.warning("Reindex chunk %s not found", chunk_id)
+        return
+
+    if chunk.state == ReindexTask.STATE_COMPLETE:
+        log.debug("Reindex chunk %s is already complete", chunk_id)
+        return
+
+    chunk.state = ReindexTask.STATE_RUNNING
+    chunk.attempts += 1
+    model.Session.commit()
+
+    task = ReindexTask.get(chunk.task_id)
+
+    try:
+        with bulk_indexing():
+            package_ids = (
+                indexing.update_permission_labels(chunk.package_ids)
+                if task and task.labels_only
+                else chunk.package_ids
+            )
 
+            if package_ids:
+                rebuild(package_ids=package_ids, force=True)
 
-def _get_related_package_ids(org: model.Group) -> list[str]:
-    child_groups = org.get_children_group_hierarchy("organization")
+        commit()
+    except Exception as e:
+        log.exception("Reindex chunk %s failed", chunk_id)
+        model.Session.rollback()
 
-    package_ids: list[str] = [
-        p.id
-        for p in model.Session.query(model.Package.id)
-        .filter_by(state=model.State.ACTIVE)
-        .filter_by(owner_org=org.id)
+        chunk.state = ReindexTask.STATE_FAILED
+        chunk.error = str(e)
+        model.Session.commit()
+        raise
+
+    chunk.state = ReindexTask.STATE_COMPLETE
+    chunk.error = None
+    model.Session.commit()
+
+
+def _pending_reindex_key(org_id: str) -> str:
+    site_id = tk.config["ckan.site_id"]
+    return f"ckan:{site_id}:datavicmain:pending_reindex:{org_id}"
+
+
+def _claim_pending_reindex(org_id: str) -> tuple[bool, set[bytes]]:
+    """Claim pending reindex markers of the organisation and its subtree.
+
+    Markers are replaced with REINDEX_CLAIMED. Further changes enqueue a new
+    job, because datasets are not collected yet. Pending jobs of descendants
+    find their markers claimed and skip the reindex. A job whose marker
+    expired or was never stored still runs.
+
+    Return whether the organisation's marker was already claimed by another
+    job and the modes of all claimed markers, so the job covers all of them.
+    If the state is unknown, the full reindex is returned."""
+    descendants = utils.org_descendants_cte(org_id)
+    keys = [_pending_reindex_key(org_id)] + [
+        _pending_reindex_key(id_)
+        for id_ in model.Session.execute(sa.select(descendants.c.id)).scalars()
     ]
+    ttl = config.get_reindex_pending_ttl()
 
-    child_package_ids = list(
-        chain.from_iterable(
-            [
-                [
-                    pkg.id
-                    for pkg in model.Session.query(model.Package.id).filter_by(
-                        owner_org=org[0]
-                    )
-                ]
-                for org in child_groups
-            ]
+    try:
+        pipe = connect_to_redis().pipeline()
+        pipe.mget(keys)
+
+        for key in keys:
+            pipe.set(key, REINDEX_CLAIMED, ex=ttl)
+
+        pending = pipe.execute()[0]
+    except RedisError:
+        log.exception("Cannot claim pending reindex of %s", org_id)
+        return False, {REINDEX_FULL}
+
+    return pending[0] == REINDEX_CLAIMED, {
+        mode for mode in pending if mode and mode != REINDEX_CLAIMED
+    }
+
+
+def _covers(pending: bytes | None, mode: bytes) -> bool:
+    return pending == REINDEX_FULL or pending == mode
+
+
+def iter_related_package_ids(
+    org_id: str, batch_size: int
+) -> Iterator[list[str]]:
+    """Stream IDs of active datasets that belong to the organisation or any
+    active organisation below it. IDs are fetched with a single query and
+    returned in batches."""
+    descendants = utils.org_descendants_cte(org_id)
+    subtree = (
+        sa.select(model.Group.id)
+        .join(descendants, descendants.c.id == model.Group.id)
+        .where(
+            model.Group.is_organization.is_(True),
+            model.Group.state == model.State.ACTIVE,
+        )
+        .union(sa.select(sa.literal(org_id)))
+    )
+    stmt = (
+        sa.select(model.Package.id)
+        .where(
+            model.Package.state == model.State.ACTIVE,
+            model.Package.owner_org.in_(subtree),
         )
+        .order_by(model.Package.id)
+    )
+
+    result = model.Session.execute(
+        stmt, execution_options={"stream_results": True}
+    )
+
+    for batch in result.scalars().partitions(batch_size):
+        yield list(batch)
+
+
+def propagate_organization_update(
+    org_id: str,
+    profile_id: str,
+    name: str,
+    patch: dict[str, Any],
+    image_path: str | None = None,
+) -> None:
+    """Apply organisation changes to the syndication profile's portal.
+
+    Failed attempts are retried with exponential backoff. The retry is
+    scheduled in OrgPropagation and enqueued by `enqueue_due_propagations`,
+    so waiting doesn't occupy the worker. The result is recorded in
+    OrgPropagation as well."""
+    profile = next((p for p in get_profiles() if p.id == profile_id), None)
+
+    if not profile:
+        log.warning("Syndication profile %s not found", profile_id)
+        return
+
+    record = OrgPropagation.get(org_id, profile_id) or OrgPropagation.reset(
+        org_id, profile_id
     )
+    retries = max(1, config.get_org_propagation_retries())
+
+    record.attempts += 1
+    record.next_attempt_at = None
+
+    try:
+        remote = propagate_organization(profile, name, patch, image_path)
+    except (ckanapi.ValidationError, ckanapi.NotAuthorized) as e:
+        # repeating the same request won't help
+        record.error = str(e)
+    except (RequestException, ckanapi.CKANAPIError) as e:
+        log.warning(
+            "Attempt %s to update organization %s in %s failed: %s",
+            record.attempts,
+            name,
+            profile.ckan_url,
+            e,
+        )
+        record.error = str(e)
+
+        if record.attempts < retries:
+            delay = config.get_org_propagation_backoff() * 2 ** (
+                record.attempts - 1
+            )
+            record.next_attempt_at = datetime.utcnow() + timedelta(
+                seconds=delay
+            )
+            record.payload = {
+                "name": name,
+                "patch": patch,
+                "image_path": image_path,
+            }
+            model.Session.commit()
+            return
+    else:
+        record.state = (
+            OrgPropagation.STATE_SUCCESS
+            if remote
+            else OrgPropagation.STATE_NOT_FOUND
+        )
+        record.error = None
+        record.payload = None
+        model.Session.commit()
+        return
+
+    log.error("Cannot update organization %s in %s", name, profile.ckan_url)
+    record.state = OrgPropagation.STATE_FAILED
+    record.payload = None
+    model.Session.commit()
+
+
+def enqueue_due_propagations() -> int:
+    """Enqueue retries of organisation propagation that are due. Return the
+    number of enqueued jobs.
+
+    The retry is postponed by PROPAGATION_LEASE first, so it's not enqueued
+    twice while the job is pending. If the job is lost or killed, the retry
+    is enqueued again after the lease."""
+    records = OrgPropagation.due().all()
+
+    for record in records:
+        record.next_attempt_at = datetime.utcnow() + PROPAGATION_LEASE
+
+    model.Session.commit()
+
+    for record in records:
+        tk.enqueue_job(
+            propagate_organization_update,
+            [
+                record.org_id,
+                record.profile_id,
+                record.payload["name"],
+                record.payload["patch"],
+                record.payload["image_path"],
+            ],
+            title=(
+                f"Propagate organization {record.payload['name']}"
+                f" to {record.profile_id}"
+            ),
+        )
 
-    return package_ids + child_package_ids
+    return len(records)
 
 
 def ckan_worker_job_monitor():
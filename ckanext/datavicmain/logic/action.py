@@ -1,10 +1,10 @@
 from __future__ import annotations
 
+import copy
 import logging
 from typing import Any, cast
 
-import ckanapi
-from requests.exceptions import RequestException
+import sqlalchemy as sa
 from sqlalchemy import or_
 
 import ckan.lib.plugins as lib_plugins
@@ -18,10 +18,16 @@ from ckan.types import Action, Context, DataDict, ErrorDict
 from ckanext.datavic_harvester.harvesters.base import get_resource_size
 from ckanext.mailcraft.exception import MailerException
 from ckanext.mailcraft.utils import get_mailer
-from ckanext.syndicate.utils import get_profiles, get_target
+from ckanext.syndicate.utils import get_profiles
 
-from ckanext.datavicmain import const, helpers, jobs, utils
+from ckanext.datavicmain import cache, const, helpers, jobs, utils
 from ckanext.datavicmain.logic import schema as vic_schema
+from ckanext.datavicmain.syndication import eligibility
+from ckanext.datavicmain.model import (
+    OrgPropagation,
+    OrgRestriction,
+    ReindexTask,
+)
 
 
 log = logging.getLogger(__name__)
@@ -76,6 +82,8 @@ def organization_update(next_, context, data_dict):
             f"The organisation {result['id']} visibility can't be changed after creation."
         )
 
+    _refresh_org_restriction(context, result["id"])
+
     tracked_fields: list[str] = toolkit.aslist(
         toolkit.config.get(
             CONFIG_SYNCHRONIZED_ORGANIZATION_FIELDS,
@@ -86,40 +94,261 @@ def organization_update(next_, context, data_dict):
     if not _is_org_changed(old, result, tracked_fields):
         return result
 
-    for profile in get_profiles():
-        ckan = get_target(profile.ckan_url, profile.api_key)
-        try:
-            remote = ckan.action.organization_show(id=old_name)
-        except ckanapi.NotFound:
-            continue
-        except RequestException as e:
-            log.error(
-                f"Error updating organization {old_name} in {profile.ckan_url}: {e}"
-            )
-            continue
+    patch = {f: result[f] for f in tracked_fields if f in result}
+    image_path = None
 
-        patch = {f: result[f] for f in tracked_fields if f in result}
-
-        if "image_url" in tracked_fields and result.get("image_display_url"):
-            grp_uloader: uploader.PUploader = uploader.get_uploader("group")
-            file_data = None
-            with open(
-                grp_uloader.storage_path + "/" + result["image_url"], "rb"
-            ) as f:
-                file_data = f.read()
-
-            patch["id"] = remote["id"]
-            ckan.call_action(
-                "organization_patch",
-                data_dict=patch,
-                files={"image_upload": (result["image_url"], file_data)},
-            )
-        else:
-            return ckan.action.organization_patch(id=remote["id"], **patch)
+    if "image_url" in tracked_fields and result.get("image_display_url"):
+        grp_uloader: uploader.PUploader = uploader.get_uploader("group")
+        image_path = grp_uloader.storage_path + "/" + result["image_url"]
+
+    profiles = list(get_profiles())
+
+    for profile in profiles:
+        OrgPropagation.reset(result["id"], profile.id)
+
+    if not context.get("defer_commit"):
+        model.repo.commit()
+
+    # remote portals are updated in background, so the slow or unavailable
+    # portal doesn't block the request
+    for profile in profiles:
+        toolkit.enqueue_job(
+            jobs.propagate_organization_update,
+            [result["id"], profile.id, old_name, patch, image_path],
+            title=f"Propagate organization {result['name']} to {profile.id}",
+        )
 
     return result
 
 
+@toolkit.chained_action
+def organization_create(
+    next_: types.ChainedAction,
+    context: types.Context,
+    data_dict: types.DataDict,
+) -> types.ActionResult.OrganizationCreate:
+    """Materialize the restriction of a new organisation"""
+    result = next_(context, data_dict)
+
+    _refresh_org_restriction(
+        context, result if isinstance(result, str) else result["id"]
+    )
+
+    return result
+
+
+@toolkit.chained_action
+def organization_delete(
+    next_: types.ChainedAction,
+    context: types.Context,
+    data_dict: types.DataDict,
+) -> types.ActionResult.OrganizationDelete:
+    """Children of a deleted organisation become top-level organisations and
+    do not inherit its restriction anymore"""
+    child_ids = _get_direct_child_org_ids(data_dict["id"])
+
+    result = next_(context, data_dict)
+
+    for org_id in [data_dict["id"], *child_ids]:
+        _refresh_org_restriction(context, org_id)
+
+    return result
+
+
+@toolkit.chained_action
+def organization_purge(
+    next_: types.ChainedAction,
+    context: types.Context,
+    data_dict: types.DataDict,
+) -> None:
+    """Drop the materialized restriction of a purged organisation and
+    recalculate it for its children"""
+    organization = model.Group.get(data_dict["id"])
+    org_id = organization.id if organization else data_dict["id"]
+    child_ids = _get_direct_child_org_ids(org_id)
+
+    result = next_(context, data_dict)
+
+    OrgRestriction.delete_many([org_id])
+
+    for child_id in child_ids:
+        _refresh_org_restriction(context, child_id)
+
+    if not context.get("defer_commit"):
+        model.repo.commit()
+
+    _invalidate(context, cache.NS_HIERARCHY)
+
+    return result
+
+
+@toolkit.chained_action
+def member_create(
+    next_: types.ChainedAction,
+    context: types.Context,
+    data_dict: types.DataDict,
+) -> types.ActionResult.MemberCreate:
+    """Organisation could be attached to another one as a member. It changes
+    the hierarchy, so the restriction must be recalculated"""
+    result = next_(context, data_dict)
+
+    if data_dict.get("object_type") == "group":
+        _refresh_org_restriction(context, data_dict["id"])
+        _refresh_org_restriction(context, data_dict["object"])
+    elif data_dict.get("object_type") == "user":
+        _invalidate_user_cache(context, data_dict["object"])
+
+    utils.forget_org_access_resolvers()
+
+    return result
+
+
+@toolkit.chained_action
+def member_delete(
+    next_: types.ChainedAction,
+    context: types.Context,
+    data_dict: types.DataDict,
+) -> types.ActionResult.MemberDelete:
+    """Organisation could be detached from its parent. It changes the
+    hierarchy, so the restriction must be recalculated"""
+    result = next_(context, data_dict)
+
+    if data_dict.get("object_type") == "group":
+        _refresh_org_restriction(context, data_dict["id"])
+        _refresh_org_restriction(context, data_dict["object"])
+    elif data_dict.get("object_type") == "user":
+        _invalidate_user_cache(context, data_dict["object"])
+
+    utils.forget_org_access_resolvers()
+
+    return result
+
+
+@toolkit.chained_action
+def package_collaborator_create(
+    next_: types.ChainedAction,
+    context: types.Context,
+    data_dict: types.DataDict,
+) -> types.ActionResult.PackageCollaboratorCreate:
+    result = next_(context, data_dict)
+    _invalidate_user_cache(context, data_dict["user_id"])
+
+    return result
+
+
+@toolkit.chained_action
+def package_collaborator_delete(
+    next_: types.ChainedAction,
+    context: types.Context,
+    data_dict: types.DataDict,
+) -> types.ActionResult.PackageCollaboratorDelete:
+    result = next_(context, data_dict)
+    _invalidate_user_cache(context, data_dict["user_id"])
+
+    return result
+
+
+@toolkit.chained_action
+def user_delete(
+    next_: types.ChainedAction,
+    context: types.Context,
+    data_dict: types.DataDict,
+) -> types.ActionResult.UserDelete:
+    """Deleted user loses all the memberships"""
+    result = next_(context, data_dict)
+    _invalidate_user_cache(context, data_dict["id"])
+
+    return result
+
+
+@toolkit.chained_action
+def user_update(
+    next_: types.ChainedAction,
+    context: types.Context,
+    data_dict: types.DataDict,
+) -> types.ActionResult.UserUpdate:
+    """Promotion, demotion or state change of the user affects values cached
+    for the user. user_patch calls user_update, so it's covered as well"""
+    user = model.User.get(data_dict.get("id") or data_dict.get("name"))
+    before = (user.sysadmin, user.state) if user else None
+
+    result = next_(context, data_dict)
+
+    if before != (result.get("sysadmin"), result.get("state")):
+        _invalidate_user_cache(context, result["id"])
+
+    return result
+
+
+def _invalidate_user_cache(context: types.Context, id_or_name: str) -> None:
+    """Drop cached values that depend on user's memberships"""
+    user = model.User.get(id_or_name)
+
+    if user:
+        _invalidate(context, cache.user_namespace(user.id))
+
+
+def _invalidate(context: types.Context, *namespaces: str) -> None:
+    """Invalidate cache namespaces. If the action doesn't commit its changes,
+    namespaces are invalidated after the commit of the caller, otherwise
+    values could be recalculated from the old data"""
+    if context.get("defer_commit"):
+        cache.invalidate_on_commit(*namespaces)
+    else:
+        cache.invalidate(*namespaces)
+
+
+def _refresh_org_restriction(context: types.Context, org_id: str) -> None:
+    """Recalculate the restriction of the organisation subtree and reindex
+    permission labels of datasets whose organisation changed restriction"""
+    changed = utils.refresh_org_restriction(org_id)
+
+    if not context.get("defer_commit"):
+        model.repo.commit()
+
+    _invalidate(context, cache.NS_HIERARCHY)
+
+    for changed_id in changed:
+        jobs.enqueue_organization_reindex(changed_id, labels_only=True)
+
+
+def _get_direct_child_org_ids(id_or_name: str) -> list[str]:
+    organization = model.Group.get(id_or_name)
+
+    if not organization:
+        return []
+
+    return [
+        child_id
+        for child_id, _name, _title, parent_id in (
+            organization.get_children_group_hierarchy("organization")
+        )
+        if parent_id == organization.id
+    ]
+
+
+@toolkit.chained_action
+@toolkit.side_effect_free
+def group_tree(
+    next_: types.ChainedAction,
+    context: types.Context,
+    data_dict: types.DataDict,
+) -> list[dict[str, Any]]:
+    """Cache the organisation hierarchy tree. It's invalidated when
+    organisations are created, moved or deleted"""
+    group_type = data_dict.get("type", "group")
+
+    if group_type != "organization":
+        return next_(context, data_dict)
+
+    tree = cache.hierarchy_cache.get(
+        ("group_tree", group_type), lambda: next_(context, data_dict)
+    )
+
+    # tree nodes are modified by hierarchy helpers, don't spoil the cache
+    return copy.deepcopy(tree)
+
+
 def _is_org_changed(
     old_org: dict[str, Any], new_org: dict[str, Any], tracked_fields: list[str]
 ) -> bool:
@@ -146,7 +375,7 @@ def _update_package_visibility(
             " index",
             result["id"],
         )
-        toolkit.enqueue_job(jobs.reindex_organization, [result["id"]])
+        jobs.enqueue_organization_reindex(result["id"], labels_only=True)
 
     return result
 
@@ -160,9 +389,12 @@ def organization_show(
 ) -> types.ActionResult.OrganizationShow:
     org_dict = next_(context, data_dict)
 
-    if not context.get(
-        "_skip_restriction_check"
-    ) and not utils.user_has_org_access(org_dict["id"], context["user"]):
+    if context.get("_skip_restriction_check"):
+        return org_dict
+
+    resolver = utils.get_org_access_resolver(context["user"])
+
+    if not resolver.has_access(org_dict["id"]):
         raise toolkit.ObjectNotFound
 
     return org_dict
@@ -175,9 +407,14 @@ def organization_list(
     context: types.Context,
     data_dict: types.DataDict,
 ) -> types.ActionResult.OrganizationList:
-    """Restrict organisations. Force all_fields and include_extras, because we
+    """Restrict organisations. Force include_extras for all_fields, because we
     need visibility field to be here.
-    Throw out extra fields later if it's not all_fields initially"""
+
+    Core action can't be extended with extra filters, so its result is
+    filtered afterwards: one more query joins the returned organisations
+    with the materialized restriction and drops restricted ones the user
+    is not a member of. Because of that, a page may contain fewer items
+    than `limit`."""
     all_fields = data_dict.get("all_fields", False)
 
     if all_fields:
@@ -186,37 +423,25 @@ def organization_list(
     context["_skip_restriction_check"] = True
 
     org_list: types.ActionResult.OrganizationList = next_(context, data_dict)
+    resolver = utils.get_org_access_resolver(context["user"])
 
-    if not all_fields:
-        orgs = model.Session.query(model.Group).filter(
-            model.Group.name.in_(org_list)
-        )
-
-        # Intead of all all_fields, lets get the ID from the Objet as it much faster
-        org_list = [{"id": org.id, "name": org.name} for org in orgs]
-
-    filtered_orgs = _hide_restricted_orgs(context, org_list)
-
-    if not all_fields:
-        return [org["name"] for org in filtered_orgs]
+    if not org_list or resolver.is_sysadmin:
+        return org_list
 
-    return filtered_orgs
-
-
-def _hide_restricted_orgs(
-    context: types.Context,
-    org_list: types.ActionResult.OrganizationList,
-) -> types.ActionResult.OrganizationList:
-    """Throw out organisation if it's restricted and user doesn't have access to it"""
-    result = []
+    if all_fields:
+        accessible = resolver.select_accessible(
+            model.Group.id, [org["id"] for org in org_list]
+        )
 
-    for org in org_list:
-        if not utils.user_has_org_access(org["id"], context["user"]):
-            continue
+        return [org for org in org_list if org["id"] in accessible]
 
-        result.append(org)
+    # API v2 refers organisations by ID instead of name
+    column = (
+        model.Group.id if context.get("api_version") == 2 else model.Group.name
+    )
+    accessible = resolver.select_accessible(column, org_list)
 
-    return result
+    return [org for org in org_list if org in accessible]
 
 
 @toolkit.chained_action
@@ -377,6 +602,158 @@ def datavic_list_incomplete_resources(context, data_dict):
     }
 
 
+@toolkit.side_effect_free
+@validate(vic_schema.datavic_reindex_status)
+def datavic_reindex_status(
+    context: Context, data_dict: DataDict
+) -> dict[str, Any]:
+    """Show the progress of the organisation search index rebuild.
+
+    :param id: ID of the reindex task
+    :type id: str, optional
+    :param org_id: ID or name of the organisation. The latest reindex task of
+        the organisation is shown, if the task ID is not provided
+    :type org_id: str, optional
+    """
+    toolkit.check_access("datavic_reindex_status", context, data_dict)
+
+    if "id" in data_dict:
+        task = ReindexTask.get(data_dict["id"])
+    elif "org_id" in data_dict:
+        org = model.Group.get(data_dict["org_id"])
+        task = ReindexTask.get_latest(org.id) if org else None
+    else:
+        raise ValidationError({"id": [toolkit._("Missing value")]})
+
+    if not task:
+        raise toolkit.ObjectNotFound(toolkit._("Reindex task not found"))
+
+    return task.dictize(context)
+
+
+@toolkit.side_effect_free
+@validate(vic_schema.datavic_syndication_eligibility)
+def datavic_syndication_eligibility(
+    context: Context, data_dict: DataDict
+) -> dict[str, Any]:
+    """Explain whether datasets are syndicated into syndication profiles,
+    without syndicating them.
+
+    Datasets are selected by IDs or by the organisation. Without filters
+    every dataset is checked. The summary counts reasons of all selected
+    datasets, while results are paginated.
+
+    Decisions are made by the database on every call. Only the restriction
+    of organisations is cached, until the hierarchy or visibility of
+    organisations changes.
+
+    :param ids: IDs or names of datasets
+    :type ids: list, optional
+    :param org_id: ID or name of the organisation. Datasets of its
+        suborganisations are included
+    :type org_id: str, optional
+    :param profile: ID of the syndication profile. All profiles are checked
+        by default
+    :type profile: str, optional
+    :param skipped_only: list only datasets that are not syndicated
+        (default: false)
+    :type skipped_only: bool, optional
+    :param limit: number of results (default: 1000)
+    :type limit: int, optional
+    :param offset: number of skipped results (default: 0)
+    :type offset: int, optional
+    """
+    toolkit.check_access("datavic_syndication_eligibility", context, data_dict)
+
+    profiles = [
+        profile
+        for profile in get_profiles()
+        if data_dict.get("profile", profile.id) == profile.id
+    ]
+
+    if not profiles:
+        raise toolkit.ObjectNotFound(
+            toolkit._("Syndication profile not found")
+        )
+
+    stmt = sa.select(model.Package.id, model.Package.name)
+
+    if "ids" in data_dict:
+        stmt = stmt.where(
+            or_(
+                model.Package.id.in_(data_dict["ids"]),
+                model.Package.name.in_(data_dict["ids"]),
+            )
+        )
+
+    if "org_id" in data_dict:
+        org = model.Group.get(data_dict["org_id"])
+
+        if not org or not org.is_organization:
+            raise toolkit.ObjectNotFound(toolkit._("Organization not found"))
+
+        descendants = utils.org_descendants_cte(org.id)
+        stmt = stmt.where(
+            or_(
+                model.Package.owner_org == org.id,
+                model.Package.owner_org.in_(sa.select(descendants.c.id)),
+            )
+        )
+
+    restricted = utils.get_org_restrictions().restricted
+    checks = [
+        stmt.add_columns(
+            sa.literal(idx).label("profile_idx"),
+            eligibility.reason_clause(profile, restricted).label("reason"),
+        ).subquery()
+        for idx, profile in enumerate(profiles)
+    ]
+
+    summary: dict[str, dict[str, int]] = {
+        profile.id: dict(
+            model.Session.execute(
+                sa.select(check.c.reason, sa.func.count()).group_by(
+                    check.c.reason
+                )
+            ).all()
+        )
+        for profile, check in zip(profiles, checks)
+    }
+
+    rows = sa.union_all(*[sa.select(check) for check in checks]).subquery()
+    page = (
+        sa.select(rows)
+        .order_by(rows.c.name, rows.c.profile_idx)
+        .offset(data_dict["offset"])
+        .limit(data_dict["limit"])
+    )
+
+    if data_dict["skipped_only"]:
+        page = page.where(rows.c.reason.notin_(eligibility.ELIGIBLE))
+
+    return {
+        "count": sum(
+            count
+            for reasons in summary.values()
+            for reason, count in reasons.items()
+            if not (
+                data_dict["skipped_only"] and reason in eligibility.ELIGIBLE
+            )
+        ),
+        "summary": summary,
+        "results": [
+            {
+                "id": row.id,
+                "name": row.name,
+                "profile": profiles[row.profile_idx].id,
+                "eligible": row.reason in eligibility.ELIGIBLE,
+                "reason": row.reason,
+            }
+            for row in model.Session.execute(page)
+        ],
+    }
+
+
 @validate(vic_schema.datatables_view_prioritize)
 def datavic_datatables_view_prioritize(
     context: Context, data_dict: DataDict
@@ -51,6 +51,14 @@ def datavic_toggle_organization_uploads(context, data_dict):
     return {"success": False}
 
 
+def datavic_reindex_status(context, data_dict):
+    return {"success": False}
+
+
+def datavic_syndication_eligibility(context, data_dict):
+    return {"success": False}
+
+
 def user_show(context: Context, data_dict: DataDict) -> AuthResult:
     if tk.request and (
         tk.get_endpoint() == ("datavicuser", "perform_reset")
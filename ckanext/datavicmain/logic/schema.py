@@ -51,3 +51,31 @@ def datatables_view_prioritize(not_empty):
             not_empty,
         ],
     }
+
+
+@validator_args
+def datavic_reindex_status(ignore_missing, unicode_safe):
+    return {
+        "id": [ignore_missing, unicode_safe],
+        "org_id": [ignore_missing, unicode_safe],
+    }
+
+
+@validator_args
+def datavic_syndication_eligibility(
+    ignore_missing,
+    unicode_safe,
+    convert_to_list_if_string,
+    list_of_strings,
+    default,
+    boolean_validator,
+    natural_number_validator,
+):
+    return {
+        "ids": [ignore_missing, convert_to_list_if_string, list_of_strings],
+        "org_id": [ignore_missing, unicode_safe],
+        "profile": [ignore_missing, unicode_safe],
+        "skipped_only": [default(False), boolean_validator],
+        "limit": [default(1000), natural_number_validator],
+        "offset": [default(0), natural_number_validator],
+    }
@@ -0,0 +1,33 @@
+"""Add org propagation table
+
+Revision ID: 2d8f6a1c0b47
+Revises: e6a04c8f3d19
+Create Date: 2026-10-18 13:05:12.640337
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "2d8f6a1c0b47"
+down_revision = "e6a04c8f3d19"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "datavic_org_propagation",
+        sa.Column("org_id", sa.Text(), nullable=False),
+        sa.Column("profile_id", sa.Text(), nullable=False),
+        sa.Column("state", sa.Text(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("modified_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("org_id", "profile_id"),
+    )
+
+
+def downgrade():
+    op.drop_table("datavic_org_propagation")
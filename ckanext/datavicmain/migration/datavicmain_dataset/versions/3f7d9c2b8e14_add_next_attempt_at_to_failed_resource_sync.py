@@ -0,0 +1,36 @@
+"""Add next_attempt_at to failed resource sync
+
+Revision ID: 3f7d9c2b8e14
+Revises: 5a1b8e3c6f20
+Create Date: 2026-10-18 18:41:07.203915
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "3f7d9c2b8e14"
+down_revision = "5a1b8e3c6f20"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "datavic_failed_resource_sync",
+        sa.Column("next_attempt_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index(
+        "ix_datavic_failed_resource_sync_next_attempt_at",
+        "datavic_failed_resource_sync",
+        ["next_attempt_at"],
+    )
+
+
+def downgrade():
+    op.drop_index(
+        "ix_datavic_failed_resource_sync_next_attempt_at",
+        "datavic_failed_resource_sync",
+    )
+    op.drop_column("datavic_failed_resource_sync", "next_attempt_at")
@@ -0,0 +1,57 @@
+"""Add reindex task tables
+
+Revision ID: 4e1f0d9b7a52
+Revises: c2afcfa1183b
+Create Date: 2026-10-18 10:02:17.408316
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects.postgresql import ARRAY
+
+# revision identifiers, used by Alembic.
+revision = "4e1f0d9b7a52"
+down_revision = "c2afcfa1183b"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "datavic_reindex_task",
+        sa.Column("id", sa.Text(), nullable=False),
+        sa.Column("org_id", sa.Text(), nullable=False),
+        sa.Column("total", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_datavic_reindex_task_org_id", "datavic_reindex_task", ["org_id"]
+    )
+
+    op.create_table(
+        "datavic_reindex_chunk",
+        sa.Column("id", sa.Text(), nullable=False),
+        sa.Column("task_id", sa.Text(), nullable=False),
+        sa.Column("position", sa.Integer(), nullable=False),
+        sa.Column("package_ids", ARRAY(sa.Text()), nullable=False),
+        sa.Column("state", sa.Text(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("modified_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.ForeignKeyConstraint(
+            ["task_id"], ["datavic_reindex_task.id"], ondelete="CASCADE"
+        ),
+    )
+    op.create_index(
+        "ix_datavic_reindex_chunk_task_id",
+        "datavic_reindex_chunk",
+        ["task_id"],
+    )
+
+
+def downgrade():
+    op.drop_table("datavic_reindex_chunk")
+    op.drop_table("datavic_reindex_task")
@@ -0,0 +1,43 @@
+"""Add failed resource sync table
+
+Revision ID: 5a1b8e3c6f20
+Revises: 7c4e2a9f5d13
+Create Date: 2026-10-18 16:02:31.554870
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5a1b8e3c6f20"
+down_revision = "7c4e2a9f5d13"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "datavic_failed_resource_sync",
+        sa.Column("resource_id", sa.Text(), nullable=False),
+        sa.Column("profile_id", sa.Text(), nullable=False),
+        sa.Column("package_id", sa.Text(), nullable=False),
+        sa.Column("remote_package_id", sa.Text(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("modified_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("resource_id", "profile_id"),
+    )
+    op.create_index(
+        "ix_datavic_failed_resource_sync_package_id",
+        "datavic_failed_resource_sync",
+        ["package_id"],
+    )
+
+
+def downgrade():
+    op.drop_index(
+        "ix_datavic_failed_resource_sync_package_id",
+        "datavic_failed_resource_sync",
+    )
+    op.drop_table("datavic_failed_resource_sync")
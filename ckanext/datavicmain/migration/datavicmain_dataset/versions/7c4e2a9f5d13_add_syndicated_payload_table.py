@@ -0,0 +1,32 @@
+"""Add syndicated payload table
+
+Revision ID: 7c4e2a9f5d13
+Revises: 2d8f6a1c0b47
+Create Date: 2026-10-18 15:21:47.118203
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "7c4e2a9f5d13"
+down_revision = "2d8f6a1c0b47"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "datavic_syndicated_payload",
+        sa.Column("remote_id", sa.Text(), nullable=False),
+        sa.Column("profile_id", sa.Text(), nullable=False),
+        sa.Column("hashes", postgresql.JSONB(), nullable=False),
+        sa.Column("modified_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("remote_id", "profile_id"),
+    )
+
+
+def downgrade():
+    op.drop_table("datavic_syndicated_payload")
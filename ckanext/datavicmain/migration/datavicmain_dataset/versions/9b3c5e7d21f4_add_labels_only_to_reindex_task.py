@@ -0,0 +1,32 @@
+"""Add labels_only to reindex task
+
+Revision ID: 9b3c5e7d21f4
+Revises: 4e1f0d9b7a52
+Create Date: 2026-10-18 11:24:53.017264
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "9b3c5e7d21f4"
+down_revision = "4e1f0d9b7a52"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "datavic_reindex_task",
+        sa.Column(
+            "labels_only",
+            sa.Boolean(),
+            nullable=False,
+            server_default=sa.false(),
+        ),
+    )
+
+
+def downgrade():
+    op.drop_column("datavic_reindex_task", "labels_only")
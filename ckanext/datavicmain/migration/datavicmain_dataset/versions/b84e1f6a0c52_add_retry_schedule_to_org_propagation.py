@@ -0,0 +1,42 @@
+"""Add retry schedule to org propagation
+
+Revision ID: b84e1f6a0c52
+Revises: 3f7d9c2b8e14
+Create Date: 2026-10-18 19:12:45.618302
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "b84e1f6a0c52"
+down_revision = "3f7d9c2b8e14"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "datavic_org_propagation",
+        sa.Column("next_attempt_at", sa.DateTime(), nullable=True),
+    )
+    op.add_column(
+        "datavic_org_propagation",
+        sa.Column("payload", postgresql.JSONB(), nullable=True),
+    )
+    op.create_index(
+        "ix_datavic_org_propagation_next_attempt_at",
+        "datavic_org_propagation",
+        ["next_attempt_at"],
+    )
+
+
+def downgrade():
+    op.drop_index(
+        "ix_datavic_org_propagation_next_attempt_at",
+        "datavic_org_propagation",
+    )
+    op.drop_column("datavic_org_propagation", "payload")
+    op.drop_column("datavic_org_propagation", "next_attempt_at")
@@ -0,0 +1,54 @@
+"""Add org restriction table
+
+Revision ID: c2afcfa1183b
+Revises: ab7177567d5a
+Create Date: 2026-10-18 09:12:41.532118
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c2afcfa1183b"
+down_revision = "ab7177567d5a"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "datavic_org_restriction",
+        sa.Column("org_id", sa.Text(), nullable=False),
+        sa.Column("restricted", sa.Boolean(), nullable=False),
+        sa.Column("modified_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("org_id"),
+    )
+
+    op.execute("""
+        WITH RECURSIVE tree(org_id, ancestor_id, depth) AS (
+            SELECT g.id, g.id, 0 FROM "group" AS g
+            WHERE g.is_organization AND g.state = 'active'
+            UNION ALL
+            SELECT t.org_id, m.table_id, t.depth + 1
+            FROM tree AS t
+            INNER JOIN member AS m
+                ON m.group_id = t.ancestor_id
+                AND m.table_name = 'group'
+                AND m.state = 'active'
+            WHERE t.depth < 8
+        )
+        INSERT INTO datavic_org_restriction (org_id, restricted, modified_at)
+        SELECT t.org_id, bool_or(COALESCE(e.value = 'restricted', false)),
+            now() AT TIME ZONE 'utc'
+        FROM tree AS t
+        LEFT OUTER JOIN group_extra AS e
+            ON e.group_id = t.ancestor_id
+            AND e.key = 'visibility'
+            AND e.state = 'active'
+        GROUP BY t.org_id
+    """)
+
+
+def downgrade():
+    op.drop_table("datavic_org_restriction")
@@ -0,0 +1,34 @@
+"""Add syndicated resource table
+
+Revision ID: e6a04c8f3d19
+Revises: 9b3c5e7d21f4
+Create Date: 2026-10-18 12:10:36.274905
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e6a04c8f3d19"
+down_revision = "9b3c5e7d21f4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "datavic_syndicated_resource",
+        sa.Column("resource_id", sa.Text(), nullable=False),
+        sa.Column("profile_id", sa.Text(), nullable=False),
+        sa.Column("remote_id", sa.Text(), nullable=False),
+        sa.Column("digest", sa.Text(), nullable=False),
+        sa.Column("size", sa.BigInteger(), nullable=False),
+        sa.Column("mtime", sa.Float(), nullable=False),
+        sa.Column("modified_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("resource_id", "profile_id"),
+    )
+
+
+def downgrade():
+    op.drop_table("datavic_syndicated_resource")
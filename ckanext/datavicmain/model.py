@@ -0,0 +1,400 @@
+from __future__ import annotations
+
+import logging
+from datetime import datetime
+from typing import Any, Iterable
+
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Integer,
+    Text,
+    func,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
+from sqlalchemy.orm import Query
+from typing_extensions import Self
+
+from ckan import model
+from ckan.plugins import toolkit as tk
+
+log = logging.getLogger(__name__)
+
+
+class OrgRestriction(tk.BaseModel):
+    """Materialized effective restriction of an organisation.
+
+    Organisation is restricted if it has a restricted visibility itself or
+    one of its parents is restricted. The table keeps the result of this
+    calculation, so we don't need to walk through the hierarchy every time.
+    """
+
+    __tablename__ = "datavic_org_restriction"
+
+    org_id = Column(Text, primary_key=True)
+    restricted = Column(Boolean, nullable=False, default=False)
+    modified_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return (
+            f"OrgRestriction(org_id={self.org_id},"
+            f" restricted={self.restricted})"
+        )
+
+    @classmethod
+    def get(cls, org_id: str) -> Self | None:
+        return model.Session.get(cls, org_id)
+
+    @classmethod
+    def get_many(cls, org_ids: Iterable[str]) -> dict[str, Self]:
+        query: Query = model.Session.query(cls).filter(
+            cls.org_id.in_(list(org_ids))
+        )
+
+        return {item.org_id: item for item in query}
+
+    @classmethod
+    def all_ids(cls) -> set[str]:
+        query: Query = model.Session.query(cls.org_id)
+
+        return {org_id for org_id, in query}
+
+    @classmethod
+    def restricted_ids(cls) -> set[str]:
+        query: Query = model.Session.query(cls.org_id).filter(
+            cls.restricted.is_(True)
+        )
+
+        return {org_id for org_id, in query}
+
+    @classmethod
+    def delete_many(cls, org_ids: Iterable[str]) -> None:
+        model.Session.query(cls).filter(cls.org_id.in_(list(org_ids))).delete(
+            synchronize_session=False
+        )
+
+
+class ReindexTask(tk.BaseModel):
+    """Search index rebuild of an organisation, split into chunks.
+
+    The state of the task is derived from the state of its chunks, so
+    chunk jobs never update the same row.
+    """
+
+    __tablename__ = "datavic_reindex_task"
+
+    STATE_PENDING = "pending"
+    STATE_RUNNING = "running"
+    STATE_COMPLETE = "complete"
+    STATE_FAILED = "failed"
+
+    id = Column(Text, primary_key=True, default=model.types.make_uuid)
+    org_id = Column(Text, nullable=False, index=True)
+    total = Column(Integer, nullable=False, default=0)
+    labels_only = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    @classmethod
+    def get(cls, task_id: str) -> Self | None:
+        return model.Session.get(cls, task_id)
+
+    @classmethod
+    def get_latest(cls, org_id: str) -> Self | None:
+        query: Query = (
+            model.Session.query(cls)
+            .filter(cls.org_id == org_id)
+            .order_by(cls.created_at.desc())
+        )
+
+        return query.first()
+
+    @property
+    def chunks(self) -> Query:
+        return model.Session.query(ReindexChunk).filter(
+            ReindexChunk.task_id == self.id
+        )
+
+    def unfinished_chunks(self) -> list[ReindexChunk]:
+        return (
+            self.chunks.filter(ReindexChunk.state != self.STATE_COMPLETE)
+            .order_by(ReindexChunk.position)
+            .all()
+        )
+
+    def dictize(self, context: Any = None) -> dict[str, Any]:
+        counts: dict[str, int] = dict(
+            self.chunks.with_entities(ReindexChunk.state, func.count())
+            .group_by(ReindexChunk.state)
+            .all()
+        )
+        processed = (
+            self.chunks.with_entities(
+                func.sum(func.cardinality(ReindexChunk.package_ids))
+            )
+            .filter(ReindexChunk.state == self.STATE_COMPLETE)
+            .scalar()
+        )
+
+        return {
+            "id": self.id,
+            "org_id": self.org_id,
+            "state": self._get_state(counts),
+            "total": self.total,
+            "labels_only": self.labels_only,
+            "processed": processed or 0,
+            "chunks": {
+                state: counts.get(state, 0)
+                for state in (
+                    self.STATE_PENDING,
+                    self.STATE_RUNNING,
+                    self.STATE_COMPLETE,
+                    self.STATE_FAILED,
+                )
+            },
+            "created_at": self.created_at.isoformat(),
+        }
+
+    def _get_state(self, counts: dict[str, int]) -> str:
+        if counts.get(self.STATE_RUNNING):
+            return self.STATE_RUNNING
+
+        if counts.get(self.STATE_PENDING):
+            return (
+                self.STATE_RUNNING
+                if counts.get(self.STATE_COMPLETE)
+                or counts.get(self.STATE_FAILED)
+                else self.STATE_PENDING
+            )
+
+        if counts.get(self.STATE_FAILED):
+            return self.STATE_FAILED
+
+        return self.STATE_COMPLETE
+
+
+class ReindexChunk(tk.BaseModel):
+    """A fixed-size portion of datasets of the ReindexTask. Every chunk is
+    indexed and committed by a separate job"""
+
+    __tablename__ = "datavic_reindex_chunk"
+
+    id = Column(Text, primary_key=True, default=model.types.make_uuid)
+    task_id = Column(
+        Text,
+        ForeignKey("datavic_reindex_task.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    position = Column(Integer, nullable=False)
+    package_ids = Column(ARRAY(Text), nullable=False)
+    state = Column(Text, nullable=False, default=ReindexTask.STATE_PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+    modified_at = Column(
+        DateTime,
+        nullable=False,
+        default=datetime.utcnow,
+        onupdate=datetime.utcnow,
+    )
+
+    @classmethod
+    def get(cls, chunk_id: str) -> Self | None:
+        return model.Session.get(cls, chunk_id)
+
+
+class SyndicatedResource(tk.BaseModel):
+    """The state of the resource file at the moment of the last successful
+    syndication into the profile's portal"""
+
+    __tablename__ = "datavic_syndicated_resource"
+
+    resource_id = Column(Text, primary_key=True)
+    profile_id = Column(Text, primary_key=True)
+    remote_id = Column(Text, nullable=False)
+    digest = Column(Text, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    mtime = Column(Float, nullable=False)
+    modified_at = Column(
+        DateTime,
+        nullable=False,
+        default=datetime.utcnow,
+        onupdate=datetime.utcnow,
+    )
+
+    @classmethod
+    def get(cls, resource_id: str, profile_id: str) -> Self | None:
+        return model.Session.get(cls, (resource_id, profile_id))
+
+    @classmethod
+    def get_many(
+        cls, resource_ids: Iterable[str], profile_id: str
+    ) -> dict[str, Self]:
+        query: Query = (
+            model.Session.query(cls)
+            .filter(cls.profile_id == profile_id)
+            .filter(cls.resource_id.in_(list(resource_ids)))
+        )
+
+        return {item.resource_id: item for item in query}
+
+
+class SyndicatedPayload(tk.BaseModel):
+    """Hashes of dataset fields sent to the profile's portal during the last
+    successful syndication"""
+
+    __tablename__ = "datavic_syndicated_payload"
+
+    remote_id = Column(Text, primary_key=True)
+    profile_id = Column(Text, primary_key=True)
+    hashes = Column(JSONB, nullable=False)
+    modified_at = Column(
+        DateTime,
+        nullable=False,
+        default=datetime.utcnow,
+        onupdate=datetime.utcnow,
+    )
+
+    @classmethod
+    def get(cls, remote_id: str, profile_id: str) -> Self | None:
+        return model.Session.get(cls, (remote_id, profile_id))
+
+
+class FailedResourceSync(tk.BaseModel):
+    """Resource of the syndicated dataset that failed to synchronize with the
+    profile's portal and waits for a retry"""
+
+    __tablename__ = "datavic_failed_resource_sync"
+
+    resource_id = Column(Text, primary_key=True)
+    profile_id = Column(Text, primary_key=True)
+    package_id = Column(Text, nullable=False, index=True)
+    remote_package_id = Column(Text, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+    next_attempt_at = Column(DateTime, index=True)
+    modified_at = Column(
+        DateTime,
+        nullable=False,
+        default=datetime.utcnow,
+        onupdate=datetime.utcnow,
+    )
+
+    @classmethod
+    def for_dataset(cls, package_id: str, profile_id: str) -> list[Self]:
+        return (
+            model.Session.query(cls)
+            .filter(cls.package_id == package_id)
+            .filter(cls.profile_id == profile_id)
+            .all()
+        )
+
+    @classmethod
+    def stuck(cls, max_attempts: int) -> Query:
+        """Failures that are not retried anymore"""
+        return (
+            model.Session.query(cls)
+            .filter(cls.attempts >= max_attempts)
+            .order_by(cls.package_id, cls.profile_id, cls.resource_id)
+        )
+
+    @classmethod
+    def due(cls, max_attempts: int) -> Query:
+        """Datasets and profiles with failures whose retry is due"""
+        return (
+            model.Session.query(cls.package_id, cls.profile_id)
+            .filter(cls.next_attempt_at <= datetime.utcnow())
+            .filter(cls.attempts < max_attempts)
+            .distinct()
+        )
+
+    def dictize(self, context: Any = None) -> dict[str, Any]:
+        return {
+            "resource_id": self.resource_id,
+            "profile_id": self.profile_id,
+            "package_id": self.package_id,
+            "remote_package_id": self.remote_package_id,
+            "attempts": self.attempts,
+            "error": self.error,
+            "next_attempt_at": (
+                self.next_attempt_at.isoformat()
+                if self.next_attempt_at
+                else None
+            ),
+            "modified_at": self.modified_at.isoformat(),
+        }
+
+
+class OrgPropagation(tk.BaseModel):
+    """The state of the latest propagation of organisation changes into the
+    syndication profile's portal"""
+
+    __tablename__ = "datavic_org_propagation"
+
+    STATE_PENDING = "pending"
+    STATE_SUCCESS = "success"
+    STATE_NOT_FOUND = "not_found"
+    STATE_FAILED = "failed"
+
+    org_id = Column(Text, primary_key=True)
+    profile_id = Column(Text, primary_key=True)
+    state = Column(Text, nullable=False, default=STATE_PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+    next_attempt_at = Column(DateTime, index=True)
+    # arguments of the propagation job, kept for the scheduled retry
+    payload = Column(JSONB)
+    modified_at = Column(
+        DateTime,
+        nullable=False,
+        default=datetime.utcnow,
+        onupdate=datetime.utcnow,
+    )
+
+    @classmethod
+    def get(cls, org_id: str, profile_id: str) -> Self | None:
+        return model.Session.get(cls, (org_id, profile_id))
+
+    @classmethod
+    def reset(cls, org_id: str, profile_id: str) -> Self:
+        """Mark the propagation as pending, creating the record if needed"""
+        record = cls.get(org_id, profile_id)
+
+        if not record:
+            record = cls(org_id=org_id, profile_id=profile_id)
+            model.Session.add(record)
+
+        record.state = cls.STATE_PENDING
+        record.attempts = 0
+        record.error = None
+        record.next_attempt_at = None
+        record.payload = None
+
+        return record
+
+    @classmethod
+    def due(cls) -> Query:
+        """Pending propagations whose retry is due"""
+        return (
+            model.Session.query(cls)
+            .filter(cls.state == cls.STATE_PENDING)
+            .filter(cls.next_attempt_at <= datetime.utcnow())
+        )
+
+    def dictize(self, context: Any = None) -> dict[str, Any]:
+        return {
+            "org_id": self.org_id,
+            "profile_id": self.profile_id,
+            "state": self.state,
+            "attempts": self.attempts,
+            "error": self.error,
+            "next_attempt_at": (
+                self.next_attempt_at.isoformat()
+                if self.next_attempt_at
+                else None
+            ),
+            "modified_at": self.modified_at.isoformat(),
+        }
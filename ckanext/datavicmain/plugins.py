@@ -20,12 +20,12 @@ from ckanext.datavic_harvester.harvesters.base import get_resource_size
 from ckanext.oidc_pkce.interfaces import IOidcPkce
 from ckanext.syndicate.interfaces import ISyndicate, Profile
 from ckanext.transmute.interfaces import ITransmute
-from ckanext.datavicmain import cli, helpers
+from ckanext.datavicmain import cli, helpers, indexing
 from ckanext.datavicmain.implementation import PermissionLabels
 from ckanext.datavicmain.syndication.odp import prepare_package_for_odp
 from ckanext.datavicmain.transmutators import get_transmutators
 from ckanext.datavicmain.views import get_blueprints
-from ckanext.datavicmain.syndication import listeners
+from ckanext.datavicmain.syndication import eligibility, listeners
 
 from ckanext.datavicmain.syndication import listeners
 from ckanext.datavicmain.implementation import PermissionLabels
@@ -377,45 +377,7 @@ class DatasetForm(
                 helpers.set_private_activity(pkg_dict, context, str("changed"))
 
     def before_dataset_index(self, pkg_dict: dict[str, Any]) -> dict[str, Any]:
-        if pkg_dict.get("res_format"):
-            pkg_dict["res_format"] = [
-                res_format.upper().split(".")[-1]
-                for res_format in pkg_dict["res_format"]
-            ]
-
-            if self._is_all_api_format(pkg_dict):
-                pkg_dict["res_format"].append("ALL_API")
-
-        return pkg_dict
-
-    def _is_all_api_format(self, pkg_dict: dict[str, Any]) -> bool:
-        """Check if the dataset contains a resource in a format recognized as an API.
-        This involves determining if the format of the resource is CSV and if this resource exists in the datastore
-        or matches a format inside a predefined list.
-        """
-        for resource in toolkit.get_action("package_show")(
-            {"ignore_auth": True}, {"id": pkg_dict["id"]}
-        ).get("resources", []):
-            if resource["format"].upper() == "CSV" and resource.get(
-                "datastore_active"
-            ):
-                return True
-
-        if [
-            res_format
-            for res_format in pkg_dict["res_format"]
-            if res_format
-            in [
-                "WMS",
-                "WFS",
-                "API",
-                "ARCGIS GEOSERVICES REST API",
-                "ESRI REST",
-                "GEOJSON",
-            ]
-        ]:
-            return True
-        return False
+        return indexing.enrich_index_document(pkg_dict)
 
     # IClick
     def get_commands(self):
@@ -426,10 +388,9 @@ class DatasetForm(
         self, pkg: model.Package, profile: Profile
     ) -> bool:
         """Decide, whether the package must be deleted from Discover."""
-        is_syndicated = bool(pkg.extras.get(profile.field_id))
-        is_deleted = pkg.state == "deleted"
-        is_archived = pkg.extras.get("workflow_status") == "archived"
-        return is_syndicated and (is_deleted or is_archived)
+        return eligibility.requires_removal(
+            eligibility.PackageFacts.from_package(pkg), profile
+        )
 
     def prepare_package_for_syndication(self, package_id, data_dict, profile):
         if profile.id == "odp":
@@ -446,40 +407,18 @@ class DatasetForm(
     def skip_syndication(
         self, package: model.Package, profile: Profile
     ) -> bool:
-        if package.extras.get("skip_syndication", "false") == "true":
-            log.debug(
-                "Do not syndicate %s because it is marked as skipped", package.id)
-            return True
-
-        if toolkit.h.datavic_is_org_restricted(package.owner_org):
-            log.debug(
-                "Do not syndicate %s because its organisation is restricted",
-                package.id,
-            )
-            return True
-
-        if package.type == "harvest":
-            log.debug(
-                "Do not syndicate %s because it is a harvest source",
-                package.id,
-            )
-            return True
-
-        if self._requires_public_removal(package, profile):
-            log.debug("Syndicate %s because it requires removal", package.id)
-            return False
-
-        if package.private:
-            log.debug("Do not syndicate %s because it is private", package.id)
-            return True
+        eligible, reason = eligibility.check(
+            eligibility.PackageFacts.from_package(package), profile
+        )
 
-        if "published" != package.extras.get("workflow_status"):
-            log.debug(
-                "Do not syndicate %s because it is not published", package.id
-            )
-            return True
+        log.debug(
+            "%s %s because %s",
+            "Syndicate" if eligible else "Do not syndicate",
+            package.id,
+            eligibility.REASONS[reason],
+        )
 
-        return False
+        return not eligible
 
     # ITransmute
 
@@ -0,0 +1,260 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Iterable, Iterator
+
+import ckanapi
+import requests
+from flask import Flask
+from requests.adapters import HTTPAdapter
+
+import ckan.model as model
+import ckan.plugins as p
+import ckan.plugins.toolkit as tk
+
+import ckanext.syndicate.signals as signals
+from ckanext.syndicate import tasks
+from ckanext.syndicate.interfaces import ISyndicate, Profile
+from ckanext.syndicate.types import Topic
+
+from ckanext.datavicmain import jobs
+from ckanext.datavicmain.syndication import delta
+
+log = logging.getLogger(__name__)
+
+SEARCH_PAGE_SIZE = 1000
+
+
+@dataclass
+class BulkResult:
+    synced: int = 0
+    skipped: int = 0
+    failed: dict[tuple[str, str], str] = field(default_factory=dict)
+    elapsed: float = 0
+
+    @property
+    def total(self) -> int:
+        return self.synced + self.skipped + len(self.failed)
+
+    @property
+    def throughput(self) -> float:
+        return self.total / self.elapsed if self.elapsed else 0
+
+
+class PooledTargets:
+    """Remote portals that share a pooled HTTP session per portal, instead of
+    opening a new connection for every dataset"""
+
+    def __init__(self, pool_size: int):
+        self.pool_size = pool_size
+        self._targets: dict[tuple[str, str], ckanapi.RemoteCKAN] = {}
+        self._lock = threading.Lock()
+
+    def get(self, profile: Profile) -> Any:
+        """Client of the profile's portal. Wrapped into DeltaCKAN, if delta
+        syndication is enabled"""
+        key = (profile.ckan_url, profile.api_key)
+
+        with self._lock:
+            if key not in self._targets:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=1, pool_maxsize=self.pool_size
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+
+                self._targets[key] = ckanapi.RemoteCKAN(
+                    profile.ckan_url, apikey=profile.api_key, session=session
+                )
+
+            target = self._targets[key]
+
+        return delta.wrap_target(target, profile)
+
+    def close(self) -> None:
+        with self._lock:
+            for target in self._targets.values():
+                target.close()
+
+            self._targets.clear()
+
+
+def select_package_ids(
+    org_ids: Iterable[str] = (),
+    query: str | None = None,
+    since: datetime | None = None,
+) -> list[str]:
+    """Collect IDs of active datasets. All the filters are combined: datasets
+    of the organisations subtrees, datasets matching the search query and
+    datasets modified after the date."""
+    stmt = model.Session.query(model.Package.id).filter(
+        model.Package.state == model.State.ACTIVE,
+        model.Package.type == "dataset",
+    )
+
+    if since:
+        stmt = stmt.filter(model.Package.metadata_modified >= since)
+
+    ids = {pkg_id for pkg_id, in stmt}
+
+    org_ids = list(org_ids)
+
+    if org_ids:
+        ids &= {
+            pkg_id
+            for org_id in org_ids
+            for batch in jobs.iter_related_package_ids(
+                org_id, SEARCH_PAGE_SIZE
+            )
+            for pkg_id in batch
+        }
+
+    if query:
+        ids &= set(_search_package_ids(query))
+
+    return sorted(ids)
+
+
+def _search_package_ids(query: str) -> Iterator[str]:
+    start = 0
+
+    while True:
+        result = tk.get_action("package_search")(
+            {"ignore_auth": True},
+            {
+                "q": query,
+                "fl": "id",
+                "rows": SEARCH_PAGE_SIZE,
+                "start": start,
+                "include_private": True,
+            },
+        )
+
+        for pkg in result["results"]:
+            yield pkg["id"]
+
+        start += SEARCH_PAGE_SIZE
+
+        if start >= result["count"]:
+            break
+
+
+def syndicate_bulk(
+    app: Flask,
+    package_ids: list[str],
+    profiles: list[Profile],
+    workers: int,
+    on_progress: Callable[[], Any] | None = None,
+) -> BulkResult:
+    """Syndicate datasets into every profile using a pool of workers.
+
+    Datasets that are skipped by ISyndicate.skip_syndication are not sent.
+    Datasets that already exist on the remote portal are updated through
+    pooled clients, the rest is created by the ckanext-syndicate task."""
+    result = BulkResult()
+    targets = PooledTargets(workers)
+    started = time.monotonic()
+
+    try:
+        with ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="datavic-syndicate-bulk"
+        ) as executor:
+            futures = {
+                executor.submit(
+                    _syndicate, app, package_id, profile, targets
+                ): (package_id, profile.id)
+                for profile in profiles
+                for package_id in package_ids
+            }
+
+            for future in as_completed(futures):
+                try:
+                    if future.result():
+                        result.synced += 1
+                    else:
+                        result.skipped += 1
+                except Exception as e:
+                    log.exception(
+                        "Cannot syndicate %s into %s", *futures[future]
+                    )
+                    result.failed[futures[future]] = str(e)
+
+                if on_progress:
+                    on_progress()
+    finally:
+        targets.close()
+
+    result.elapsed = time.monotonic() - started
+
+    return result
+
+
+def _syndicate(
+    app: Flask, package_id: str, profile: Profile, targets: PooledTargets
+) -> bool:
+    """Syndicate the dataset into the profile. Runs in a worker thread, so it
+    needs its own app context and database session."""
+    with app.test_request_context():
+        try:
+            pkg = model.Package.get(package_id)
+
+            if not pkg or any(
+                plugin.skip_syndication(pkg, profile)
+                for plugin in p.PluginImplementations(ISyndicate)
+            ):
+                return False
+
+            if not _update_remote(pkg, profile, targets):
+                tasks.sync_package(package_id, Topic.update, profile)
+
+            return True
+        finally:
+            model.Session.remove()
+
+
+def _update_remote(
+    pkg: model.Package, profile: Profile, targets: PooledTargets
+) -> bool:
+    """Update the remote copy of the dataset through the pooled client.
+
+    Return False if the dataset was never syndicated into the profile or
+    its remote copy is missing. Creating the remote dataset requires name
+    and organisation mapping, which is left to the ckanext-syndicate
+    task."""
+    remote_id = pkg.extras.get(profile.field_id)
+
+    if not remote_id:
+        return False
+
+    ckan = targets.get(profile)
+
+    try:
+        remote = ckan.action.package_show(id=remote_id)
+    except ckanapi.NotFound:
+        return False
+
+    data_dict = tk.get_action("package_show")(
+        {"ignore_auth": True}, {"id": pkg.id}
+    )
+
+    for plugin in p.PluginImplementations(ISyndicate):
+        data_dict = plugin.prepare_package_for_syndication(
+            pkg.id, data_dict, profile
+        )
+
+    data_dict.update(
+        id=remote["id"], name=remote["name"], owner_org=remote["owner_org"]
+    )
+    result = ckan.action.package_update(**data_dict)
+
+    signals.after_syndication.send(
+        pkg.id, profile=profile, remote=result, get_target=targets.get
+    )
+
+    return True
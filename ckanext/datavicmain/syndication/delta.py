@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+from typing import Any, Callable
+
+import ckanapi
+
+import ckan.model as model
+
+from ckanext.syndicate.interfaces import Profile
+
+from ckanext.datavicmain import config
+from ckanext.datavicmain.model import SyndicatedPayload
+
+log = logging.getLogger(__name__)
+
+IGNORED_FIELDS = {"id"}
+
+
+def payload_hashes(data_dict: dict[str, Any]) -> dict[str, str]:
+    """Hash every top-level field of the payload"""
+    return {
+        key: (
+            hashlib.sha256(
+                json.dumps(value, sort_keys=True, default=str).encode()
+            ).hexdigest()
+        )
+        for key, value in data_dict.items()
+        if key not in IGNORED_FIELDS
+    }
+
+
+def diff_payload(
+    data_dict: dict[str, Any], hashes: dict[str, str], previous: dict[str, str]
+) -> dict[str, Any] | None:
+    """Fields of the payload that changed since the previous syndication.
+
+    Return None if the payload cannot be applied as a patch, because some
+    fields were removed from it."""
+    if set(previous) - set(hashes):
+        return None
+
+    return {
+        key: data_dict[key]
+        for key, digest in hashes.items()
+        if previous.get(key) != digest
+    }
+
+
+def wrap_target(
+    ckan: ckanapi.RemoteCKAN, profile: Profile
+) -> ckanapi.RemoteCKAN | DeltaCKAN:
+    """Wrap the client of the profile's portal into DeltaCKAN, if delta
+    syndication is enabled"""
+    if not config.is_syndication_delta_enabled():
+        return ckan
+
+    return DeltaCKAN(ckan, profile.id)
+
+
+class DeltaCKAN:
+    """Client of the remote portal that replaces package_update with
+    package_patch containing only changed fields.
+
+    When nothing changed, the remote call is skipped and the dataset returned
+    by the latest package_show is used as the result. Every other action is
+    passed to the wrapped client unchanged."""
+
+    def __init__(self, ckan: ckanapi.RemoteCKAN, profile_id: str):
+        self.ckan = ckan
+        self.profile_id = profile_id
+        self.action = _DeltaActions(self)
+        self._shown: dict[str, dict[str, Any]] = {}
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.ckan, name)
+
+    def package_show(self, **data_dict: Any) -> dict[str, Any]:
+        result = self.ckan.action.package_show(**data_dict)
+        self._shown[result["id"]] = result
+        self._shown[result["name"]] = result
+
+        return result
+
+    def package_create(self, **data_dict: Any) -> dict[str, Any]:
+        result = self.ckan.action.package_create(**data_dict)
+        self._save(result["id"], payload_hashes(data_dict))
+
+        return result
+
+    def package_update(self, **data_dict: Any) -> dict[str, Any]:
+        remote_id = data_dict.get("id")
+        hashes = payload_hashes(data_dict)
+        record = (
+            SyndicatedPayload.get(remote_id, self.profile_id)
+            if remote_id
+            else None
+        )
+        changes = (
+            diff_payload(data_dict, hashes, record.hashes) if record else None
+        )
+
+        if changes is None:
+            result = self.ckan.action.package_update(**data_dict)
+        elif changes:
+            result = self.ckan.action.package_patch(id=remote_id, **changes)
+        else:
+            log.debug(
+                "Dataset %s is not changed in %s", remote_id, self.profile_id
+            )
+            return self._shown.get(remote_id) or self.package_show(
+                id=remote_id
+            )
+
+        self._save(result["id"], hashes)
+
+        return result
+
+    def _save(self, remote_id: str, hashes: dict[str, str]) -> None:
+        record = SyndicatedPayload.get(remote_id, self.profile_id)
+
+        if not record:
+            record = SyndicatedPayload(
+                remote_id=remote_id, profile_id=self.profile_id
+            )
+            model.Session.add(record)
+
+        record.hashes = hashes
+        model.Session.commit()
+
+
+class _DeltaActions:
+    def __init__(self, delta: DeltaCKAN):
+        self._delta = delta
+
+    def __getattr__(self, name: str) -> Callable[..., Any]:
+        if name in ("package_show", "package_create", "package_update"):
+            return getattr(self._delta, name)
+
+        return getattr(self._delta.ckan.action, name)
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Collection, Iterable
+
+import sqlalchemy as sa
+
+import ckan.model as model
+
+from ckanext.syndicate.interfaces import Profile
+
+from ckanext.datavicmain import utils
+
+log = logging.getLogger(__name__)
+
+SKIP_FLAG = "skip_flag"
+RESTRICTED_ORG = "restricted_org"
+HARVEST_SOURCE = "harvest_source"
+REMOVAL = "removal"
+PRIVATE = "private"
+NOT_PUBLISHED = "not_published"
+PUBLISHED = "published"
+
+REASONS = {
+    SKIP_FLAG: "it is marked as skipped",
+    RESTRICTED_ORG: "its organisation is restricted",
+    HARVEST_SOURCE: "it is a harvest source",
+    REMOVAL: "it requires removal",
+    PRIVATE: "it is private",
+    NOT_PUBLISHED: "it is not published",
+    PUBLISHED: "it is published",
+}
+
+ELIGIBLE = frozenset([REMOVAL, PUBLISHED])
+
+EXTRAS = ["skip_syndication", "workflow_status"]
+
+
+@dataclass(frozen=True)
+class PackageFacts:
+    """Fields of the dataset that decide whether it's syndicated"""
+
+    id: str
+    name: str
+    type: str
+    state: str
+    private: bool
+    owner_org: str | None
+    extras: dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def from_package(cls, pkg: model.Package) -> PackageFacts:
+        return cls(
+            pkg.id,
+            pkg.name,
+            pkg.type,
+            pkg.state,
+            pkg.private,
+            pkg.owner_org,
+            dict(pkg.extras),
+        )
+
+
+def check(
+    facts: PackageFacts,
+    profile: Profile,
+    restrictions: utils.OrgRestrictions | None = None,
+) -> tuple[bool, str]:
+    """Decide whether the dataset is syndicated into the profile. Return the
+    decision and its reason, one of REASONS keys.
+
+    Only the snapshot of organisation restrictions is cached, it's dropped
+    when the organisation hierarchy or visibility changes. Organisations
+    missing from the snapshot are checked live."""
+    if restrictions is None:
+        restrictions = utils.get_org_restrictions()
+
+    if facts.extras.get("skip_syndication", "false") == "true":
+        return False, SKIP_FLAG
+
+    if restrictions.is_restricted(facts.owner_org):
+        return False, RESTRICTED_ORG
+
+    if facts.type == "harvest":
+        return False, HARVEST_SOURCE
+
+    if requires_removal(facts, profile):
+        return True, REMOVAL
+
+    if facts.private:
+        return False, PRIVATE
+
+    if facts.extras.get("workflow_status") != "published":
+        return False, NOT_PUBLISHED
+
+    return True, PUBLISHED
+
+
+def requires_removal(facts: PackageFacts, profile: Profile) -> bool:
+    """Decide, whether the package must be deleted from Discover."""
+    is_syndicated = bool(facts.extras.get(profile.field_id))
+    is_deleted = facts.state == "deleted"
+    is_archived = facts.extras.get("workflow_status") == "archived"
+    return is_syndicated and (is_deleted or is_archived)
+
+
+def load_facts(
+    package_ids: Iterable[str], profiles: Iterable[Profile]
+) -> list[PackageFacts]:
+    """Load facts of many datasets with two queries, instead of loading
+    every dataset with all its extras"""
+    package_ids = list(package_ids)
+    keys = EXTRAS + [profile.field_id for profile in profiles]
+    extras: dict[str, dict[str, str]] = defaultdict(dict)
+
+    for package_id, key, value in (
+        model.Session.query(
+            model.PackageExtra.package_id,
+            model.PackageExtra.key,
+            model.PackageExtra.value,
+        )
+        .filter(model.PackageExtra.package_id.in_(package_ids))
+        .filter(model.PackageExtra.key.in_(keys))
+    ):
+        extras[package_id][key] = value
+
+    return [
+        PackageFacts(*row, extras=extras[row[0]])
+        for row in model.Session.query(
+            model.Package.id,
+            model.Package.name,
+            model.Package.type,
+            model.Package.state,
+            model.Package.private,
+            model.Package.owner_org,
+        ).filter(model.Package.id.in_(package_ids))
+    ]
+
+
+def reason_clause(profile: Profile, restricted: Collection[str]) -> Any:
+    """SQL counterpart of `check` for queries of the package table. It
+    returns the reason of the decision and must be changed together with
+    `check`.
+
+    `restricted` contains IDs of restricted organisations, usually taken
+    from the cached snapshot of organisation restrictions."""
+    skip = _extra_value("skip_syndication")
+    status = _extra_value("workflow_status")
+    syndicated = _extra_value(profile.field_id)
+
+    return sa.case(
+        (sa.func.coalesce(skip, "false") == "true", SKIP_FLAG),
+        (model.Package.owner_org.in_(list(restricted)), RESTRICTED_ORG),
+        (model.Package.type == "harvest", HARVEST_SOURCE),
+        (
+            sa.and_(
+                sa.func.coalesce(syndicated, "") != "",
+                sa.or_(model.Package.state == "deleted", status == "archived"),
+            ),
+            REMOVAL,
+        ),
+        (model.Package.private.is_(True), PRIVATE),
+        (sa.func.coalesce(status, "") != "published", NOT_PUBLISHED),
+        else_=PUBLISHED,
+    )
+
+
+def _extra_value(key: str) -> Any:
+    return (
+        sa.select(model.PackageExtra.value)
+        .where(
+            model.PackageExtra.package_id == model.Package.id,
+            model.PackageExtra.key == key,
+        )
+        .limit(1)
+        .scalar_subquery()
+    )
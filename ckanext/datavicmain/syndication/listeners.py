@@ -1,8 +1,12 @@
 from __future__ import annotations
 
+import hashlib
 import logging
 import os
-from typing import Any
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Iterable
 
 import ckanapi
 import requests
@@ -11,11 +15,21 @@ import ckan.model as model
 import ckan.plugins.toolkit as tk
 from ckan.lib.uploader import get_resource_uploader
 
-from ckanext.syndicate.utils import get_target
+import ckanext.syndicate.utils as syndicate_utils
+from ckanext.syndicate.interfaces import Profile
+from ckanext.syndicate.utils import get_profiles
+
+from ckanext.datavicmain import config
+from ckanext.datavicmain.model import FailedResourceSync, SyndicatedResource
+from ckanext.datavicmain.syndication import views
 
 CONFIG_INTERNAL_HOSTS = "ckan.datavic.syndication.internal_hosts"
 DEFAULT_INTERNAL_HOSTS = []
 
+RETRY_LEASE = timedelta(hours=1)
+
+DIGEST_CHUNK_SIZE = 1024 * 1024
+
 log = logging.getLogger(__name__)
 
 
@@ -23,16 +37,50 @@ class SyndicationResourceError(Exception):
     """Raised when one or more resource files fail to syndicate."""
 
 
+@dataclass
+class FileState:
+    """Content of the file at the moment of syndication"""
+
+    remote_id: str
+    digest: str
+    size: int
+    mtime: float
+
+
+@dataclass
+class LocalFile:
+    """Details of the uploaded file, collected before the transfer, because
+    worker threads have no access to the database session"""
+
+    id: str
+    path: str
+    url: str
+    synced: FileState | None = None
+
+
+@dataclass
+class ResourceSync:
+    remote: dict[str, Any]
+    views: list[dict[str, Any]]
+    file: LocalFile | None = None
+
+
+def get_target(profile: Profile) -> ckanapi.RemoteCKAN:
+    """Client of the profile's portal, created by ckanext-syndicate"""
+    return syndicate_utils.get_target(profile.ckan_url, profile.api_key)
+
+
 def after_syndication_listener(package_id, **kwargs):
     log.debug("Synchronizing uploaded files of %s", package_id)
     profile = kwargs["profile"]
     remote = kwargs["remote"]
+    # bulk syndication passes its pooled clients
+    target_factory = kwargs.get("get_target", get_target)
 
     if "id" not in remote:
         log.debug("Cannot detect remote ID. Skip")
         return
 
-    ckan = get_target(profile.ckan_url, profile.api_key)
     resources = remote.get("resources")
 
     pkg = model.Package.get(package_id)
@@ -40,84 +88,389 @@ def after_syndication_listener(package_id, **kwargs):
     if not pkg:
         return
 
+    failed = synchronize_resources(pkg, profile, resources, target_factory)
+    # every resource is synchronized, so all previous failures are resolved
+    attempts = _record_failures(pkg.id, remote["id"], profile, failed)
+
+    if not failed:
+        return
+
+    log.error(
+        "Failed to syndicate %d resource file(s) for dataset %s: %s",
+        len(failed),
+        package_id,
+        ", ".join(failed),
+    )
+
+    if attempts < config.get_resource_sync_retries():
+        _schedule_retry(pkg.id, profile.id, attempts)
+
+
+def retry_failed_resources(package_id: str, profile_id: str) -> None:
+    """Synchronize resources of the dataset that failed during the
+    syndication, without syndicating the whole dataset again. The retry is
+    scheduled again with a longer delay until the resources are synchronized
+    or the number of attempts is exhausted."""
+    profile = next((p for p in get_profiles() if p.id == profile_id), None)
+
+    if not profile:
+        log.warning("Syndication profile %s not found", profile_id)
+        return
+
+    retries = config.get_resource_sync_retries()
+    pending = [
+        record
+        for record in FailedResourceSync.for_dataset(package_id, profile_id)
+        if record.attempts < retries
+    ]
+
+    if not pending:
+        return
+
+    pkg = model.Package.get(package_id)
+    ids = [record.resource_id for record in pending]
+    remote_id = pending[0].remote_package_id
+    failed: dict[str, str] = {}
+
+    # resources that are removed from any side are not synchronized anymore
+    if pkg and pkg.state == model.State.ACTIVE:
+        ckan = get_target(profile)
+
+        try:
+            remote = ckan.action.package_show(id=remote_id)
+        except ckanapi.NotFound:
+            log.debug("Remote dataset %s does not exist", remote_id)
+        except (ckanapi.CKANAPIError, requests.RequestException) as e:
+            failed = dict.fromkeys(ids, str(e))
+        else:
+            resources = [
+                res for res in remote["resources"] if res["id"] in ids
+            ]
+            failed = synchronize_resources(
+                pkg, profile, resources, lambda profile: ckan
+            )
+
+    attempts = _record_failures(package_id, remote_id, profile, failed, ids)
+
+    if not failed:
+        return
+
+    if attempts < retries:
+        _schedule_retry(package_id, profile_id, attempts)
+
+    raise SyndicationResourceError(
+        "Failed to syndicate %d resource file(s) for dataset %s: %s"
+        % (len(failed), package_id, ", ".join(failed))
+    )
+
+
+def synchronize_resources(
+    pkg: model.Package,
+    profile: Profile,
+    resources: list[dict[str, Any]],
+    target_factory: Callable[[Profile], Any] = get_target,
+) -> dict[str, str]:
+    """Synchronize views and uploaded files of remote resources in parallel.
+    Every worker gets its client from `target_factory`. Return errors of
+    resources that failed."""
     hosts = tk.aslist(
         tk.config.get(CONFIG_INTERNAL_HOSTS, DEFAULT_INTERNAL_HOSTS)
     )
 
     hosts.append(profile.ckan_url)
 
-    failed_resource_ids = []
+    synced = SyndicatedResource.get_many(
+        [res["id"] for res in resources], profile.id
+    )
+    syncs = [
+        _prepare_resource_sync(res, hosts, pkg, synced.get(res["id"]))
+        for res in resources
+    ]
+
+    failed: dict[str, str] = {}
+    states: dict[str, FileState] = {}
+
+    with ThreadPoolExecutor(
+        max_workers=config.get_syndication_concurrency(profile.id),
+        thread_name_prefix="datavic-syndication",
+    ) as executor:
+        futures = {
+            executor.submit(
+                _synchronize_resource, sync, target_factory(profile)
+            ): sync
+            for sync in syncs
+        }
+
+        for future in as_completed(futures):
+            sync = futures[future]
+
+            try:
+                state = future.result()
+            except Exception as e:
+                failed[sync.remote["id"]] = str(e) or type(e).__name__
+                continue
+
+            if sync.file and state:
+                states[sync.file.id] = state
+
+    _save_file_states(states, synced, profile)
+
+    return failed
+
+
+def _record_failures(
+    package_id: str,
+    remote_id: str,
+    profile: Profile,
+    failed: dict[str, str],
+    resource_ids: Iterable[str] | None = None,
+) -> int:
+    """Remember failed resources and forget the ones that were synchronized.
+    Without `resource_ids` all the resources of the dataset are considered
+    synchronized. Return the smallest number of attempts among failed
+    resources."""
+    records = {
+        record.resource_id: record
+        for record in FailedResourceSync.for_dataset(package_id, profile.id)
+    }
 
-    for res in resources:
-        try:
-            _update_remote_resource(res, hosts, pkg, ckan)
-        except Exception:
-            failed_resource_ids.append(res["id"])
-
-    if failed_resource_ids:
-        raise SyndicationResourceError(
-            "Failed to syndicate %d resource file(s) for dataset %s: %s"
-            % (
-                len(failed_resource_ids),
-                package_id,
-                ", ".join(failed_resource_ids),
+    if resource_ids is None:
+        resource_ids = set(records) | set(failed)
+
+    for resource_id in resource_ids:
+        record = records.get(resource_id)
+
+        if resource_id not in failed:
+            if record:
+                model.Session.delete(record)
+            continue
+
+        if not record:
+            record = FailedResourceSync(
+                resource_id=resource_id,
+                profile_id=profile.id,
+                attempts=0,
             )
-        )
+            model.Session.add(record)
 
+        record.package_id = package_id
+        record.remote_package_id = remote_id
+        record.attempts += 1
+        record.error = failed[resource_id]
+        records[resource_id] = record
 
-def _update_remote_resource(
+    model.Session.commit()
+
+    return min(
+        (records[resource_id].attempts for resource_id in failed), default=0
+    )
+
+
+def enqueue_due_retries() -> int:
+    """Enqueue retries of failed resources that are due. Return the number
+    of enqueued jobs.
+
+    Retries are postponed in the DB instead of waiting inside the job, so
+    pending retries don't occupy workers and survive the job timeout."""
+    due = FailedResourceSync.due(config.get_resource_sync_retries()).all()
+
+    for package_id, profile_id in due:
+        enqueue_retry(package_id, profile_id)
+
+    return len(due)
+
+
+def enqueue_retry(package_id: str, profile_id: str) -> None:
+    """Enqueue the retry of failed resources right now.
+
+    The retry is postponed by RETRY_LEASE first, so it's not enqueued twice
+    while the job is pending. If the job is lost or killed, the retry is
+    enqueued again after the lease."""
+    model.Session.query(FailedResourceSync).filter(
+        FailedResourceSync.package_id == package_id,
+        FailedResourceSync.profile_id == profile_id,
+    ).update({"next_attempt_at": datetime.utcnow() + RETRY_LEASE})
+    model.Session.commit()
+
+    tk.enqueue_job(
+        retry_failed_resources,
+        [package_id, profile_id],
+        title=f"Retry failed resources of {package_id} in {profile_id}",
+    )
+
+
+def _schedule_retry(package_id: str, profile_id: str, attempts: int) -> None:
+    delay = config.get_resource_sync_backoff() * 2 ** (attempts - 1)
+    next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+
+    for record in FailedResourceSync.for_dataset(package_id, profile_id):
+        record.next_attempt_at = next_attempt_at
+
+    model.Session.commit()
+
+
+def _prepare_resource_sync(
     res: dict[str, Any],
     hosts: list[str],
     pkg: model.Package,
-    ckan: ckanapi.RemoteCKAN,
-) -> None:
-    log.debug("Checking resource %s", res["id"])
-
-    _synchronize_views(res, ckan)
+    synced: SyndicatedResource | None,
+) -> ResourceSync:
+    """Collect local data required for the resource synchronization."""
+    sync = ResourceSync(
+        res,
+        tk.get_action("resource_view_list")(
+            {"ignore_auth": True}, {"id": res["id"]}
+        ),
+    )
 
     if not any(host in res["url"] for host in hosts):
-        return log.debug("External resource with a url %s. Skip", res["url"])
+        log.debug("External resource with a url %s. Skip", res["url"])
+        return sync
 
     local_res = _get_original_resource(pkg.resources, res["id"])
 
     if not local_res:
-        return log.debug(
-            "Cannot locate resource with ID %s locally. Skip", res["id"]
-        )
+        log.debug("Cannot locate resource with ID %s locally. Skip", res["id"])
+        return sync
+
+    uploader = get_resource_uploader(local_res.as_dict())
+    sync.file = LocalFile(
+        local_res.id, uploader.get_path(local_res.id), local_res.url
+    )
+
+    if synced:
+        sync.file.synced = _record_state(synced)
+
+    return sync
+
 
-    check_res = requests.head(res["url"])
+def _synchronize_resource(sync: ResourceSync, ckan: Any) -> FileState | None:
+    """Synchronize views and the uploaded file of the remote resource. Runs
+    in a worker thread. Return the state of the synchronized file."""
+    _synchronize_views(sync.remote, sync.views, ckan)
 
-    if check_res.ok:
-        remote_size = int(check_res.headers.get("Content-Length", 0))
+    if sync.file:
+        return _update_remote_resource(sync.remote, sync.file, ckan)
 
-        if remote_size == local_res.size:
-            return log.debug("File already exists on remote portal. Skip")
+
+def _update_remote_resource(
+    res: dict[str, Any],
+    local_file: LocalFile,
+    ckan: ckanapi.RemoteCKAN,
+) -> FileState | None:
+    """Upload the file if its content differs from the last syndicated one.
+    Return the state of the file on the remote portal, if it's known.
+
+    The file is not read at all if its size and modification time are the
+    same as during the last syndication. Files that were never syndicated
+    before are compared with the remote file by size. Such match doesn't
+    prove the content is the same, so its state is not recorded and the
+    file is compared by size again next time."""
+    log.debug("Checking resource %s", res["id"])
+
+    stat = os.stat(local_file.path)
+    synced = local_file.synced
+
+    if (
+        synced
+        and synced.remote_id == res["id"]
+        and synced.size == stat.st_size
+        and synced.mtime == stat.st_mtime
+    ):
+        log.debug("File has not changed since last syndication. Skip")
+        return synced
+
+    state = FileState(
+        res["id"], _file_digest(local_file.path), stat.st_size, stat.st_mtime
+    )
+
+    if synced and synced.remote_id == res["id"]:
+        if synced.digest == state.digest:
+            log.debug("Content of the file has not changed. Skip")
+            return state
+
+    elif not synced:
+        check_res = requests.head(res["url"])
+
+        if check_res.ok:
+            remote_size = int(check_res.headers.get("Content-Length", 0))
+
+            if remote_size == state.size:
+                log.debug("File already exists on remote portal. Skip")
+                return None
 
     log.debug(
         "File does not exist or differ for %s resource, copying it.",
         res["id"],
     )
 
-    uploader = get_resource_uploader(local_res.as_dict())
-
     try:
-        with open(uploader.get_path(local_res.id), "rb") as file_data:
-            name = os.path.basename(local_res.url)
+        with open(local_file.path, "rb") as file_data:
+            name = os.path.basename(local_file.url)
 
             ckan.action.resource_patch(
                 id=res["id"],
                 upload=(name, file_data),
                 size=None,
-                url=local_res.url,
+                url=local_file.url,
             )
     except Exception:
         log.exception(
             "Cannot upload file from local resource %s to the remote %s",
-            local_res.id,
+            local_file.id,
             res["id"],
         )
         raise
 
+    return state
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+
+    with open(path, "rb") as src:
+        for chunk in iter(lambda: src.read(DIGEST_CHUNK_SIZE), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def _record_state(record: SyndicatedResource) -> FileState:
+    return FileState(
+        record.remote_id, record.digest, record.size, record.mtime
+    )
+
+
+def _save_file_states(
+    states: dict[str, FileState],
+    synced: dict[str, SyndicatedResource],
+    profile: Profile,
+) -> None:
+    """Remember the state of syndicated files, so unchanged files are skipped
+    next time"""
+    changed = False
+
+    for resource_id, state in states.items():
+        record = synced.get(resource_id)
+
+        if record and _record_state(record) == state:
+            continue
+
+        if not record:
+            record = SyndicatedResource(
+                resource_id=resource_id, profile_id=profile.id
+            )
+            model.Session.add(record)
+
+        record.remote_id = state.remote_id
+        record.digest = state.digest
+        record.size = state.size
+        record.mtime = state.mtime
+        changed = True
+
+    if changed:
+        model.Session.commit()
+
 
 def _get_original_resource(
     resources: list[model.Resource], res_id: str
@@ -129,64 +482,17 @@ def _get_original_resource(
         return resource
 
 
-def _synchronize_views(res: dict[str, Any], ckan: ckanapi.RemoteCKAN):
-    """Recreate public views if they are not the same as internal."""
+def _synchronize_views(
+    res: dict[str, Any],
+    local: list[dict[str, Any]],
+    ckan: ckanapi.RemoteCKAN,
+):
+    """Apply only the difference between internal and public views."""
     remote = ckan.action.resource_view_list(id=res["id"])
-    local = tk.get_action("resource_view_list")(
-        {"ignore_auth": True}, {"id": res["id"]}
-    )
+    plan = views.diff_views(local, remote)
 
-    if len(remote) == len(local) and all(
-        _view_data(left) == _view_data(right)
-        for left, right in zip(local, remote)
-    ):
+    if plan.is_empty:
         log.debug("Skip view synchronization because views are identical")
         return
 
-    for view in remote:
-        ckan.action.resource_view_delete(id=view["id"])
-
-    for view in local:
-        data = (
-            _view_data(view)
-            if view["view_type"] != "charts_view"
-            else _charts_view_data(view)
-        )
-
-        try:
-            ckan.action.resource_view_create(**data)
-        except ckanapi.ValidationError as e:
-            log.error("Cannot synchronize view %s: %s", view["id"], e)
-
-
-_view_fields = [
-    "description",
-    "filter_fields",
-    "filter_values",
-    "resource_id",
-    "title",
-    "view_type",
-]
-
-
-def _view_data(view: dict[str, Any]) -> dict[str, Any]:
-    """Extract fields allowed by view_create schema."""
-    return {
-        f: view[f]
-        for f in [
-            "description",
-            "filter_fields",
-            "filter_values",
-            "resource_id",
-            "title",
-            "view_type",
-        ]
-        if f in view
-    }
-
-
-def _charts_view_data(view: dict[str, Any]) -> dict[str, Any]:
-    """charts_view has a lot of custom fields we want to preserve."""
-    exclude_fields = ["id", "__extras"]
-
-    return {k: v for k, v in view.items() if k not in exclude_fields}
+    views.apply_view_plan(res["id"], plan, ckan)
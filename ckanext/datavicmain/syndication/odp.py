@@ -1,45 +1,78 @@
+from __future__ import annotations
+
+from typing import Any, Callable
+
 import ckan.plugins.toolkit as tk
 
+Transformation = Callable[[dict[str, Any]], None]
 
-def prepare_package_for_odp(package_id, data_dict):
-    _extract_extras(data_dict)
-    pkg_dict = tk.get_action("package_show")(
-        {"ignore_auth": True},
-        {"id": package_id},
-    )
 
-    resources = pkg_dict.get("resources", [])
+def prepare_package_for_odp(
+    package_id: str,
+    data_dict: dict[str, Any],
+    pipeline: list[Transformation] | None = None,
+) -> dict[str, Any]:
+    """Turn the syndicated dataset into ODP payload.
 
-    resources[:] = [
-        # don't synchronize hash, because it will prevent resource's ingestion
-        # into datastore
-        dict(res, hash="")
-        for res in resources
+    Transformations modify the payload in place. Resources are taken from the
+    payload itself, if every resource there is complete. Otherwise they are
+    fetched with the dataset, because the payload could carry stripped
+    resources."""
+    if not _has_complete_resources(data_dict):
+        data_dict["resources"] = tk.get_action("package_show")(
+            {"ignore_auth": True},
+            {"id": package_id},
+        ).get("resources", [])
+
+    for transformation in ODP_PIPELINE if pipeline is None else pipeline:
+        transformation(data_dict)
+
+    return data_dict
+
+
+def _has_complete_resources(data_dict: dict[str, Any]) -> bool:
+    """Resources of the payload can be used as is, only if each of them is
+    identified and points to the data"""
+    resources = data_dict.get("resources")
+
+    if not isinstance(resources, list):
+        return False
+
+    return all(res.get("id") and res.get("url") for res in resources)
+
+
+def extract_extras(data_dict: dict[str, Any]) -> None:
+    for extra in data_dict.pop("extras", []):
+        data_dict[extra["key"]] = extra["value"]
+
+
+def drop_private_resources(data_dict: dict[str, Any]) -> None:
+    data_dict["resources"] = [
+        res
+        for res in data_dict["resources"]
         if not tk.asbool(res.get("private"))
     ]
 
-    ## Update resources
-    for res in resources:
+
+def reset_resources(data_dict: dict[str, Any]) -> None:
+    for res in data_dict["resources"]:
         res["package_id"] = data_dict["name"]
+        # don't synchronize hash, because it will prevent resource's ingestion
+        # into datastore
+        res["hash"] = ""
 
         if "datastore_active" in res:
             res["datastore_active"] = False
 
-    data_dict.pop("resources")
-    data_dict["resources"] = resources
-
-    ## Update groups
-    groups = data_dict.pop("groups")
-    data_dict["groups"] = []
-    for group in groups:
-        group.pop("id")
-        data_dict["groups"].append(group)
 
-    return data_dict
+def drop_group_ids(data_dict: dict[str, Any]) -> None:
+    for group in data_dict.get("groups", []):
+        group.pop("id", None)
 
 
-def _extract_extras(data_dict):
-    extras = data_dict.pop("extras")
-
-    for extra in extras:
-        data_dict[extra["key"]] = extra["value"]
+ODP_PIPELINE: list[Transformation] = [
+    extract_extras,
+    drop_private_resources,
+    reset_resources,
+    drop_group_ids,
+]
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import io
+import json
+import logging
+import os
+import uuid
+from typing import IO, Any
+
+import ckanapi
+import requests
+
+import ckanext.syndicate.utils as syndicate_utils
+from ckanext.syndicate.interfaces import Profile
+
+log = logging.getLogger(__name__)
+
+UPLOAD_FIELD = "image_upload"
+UPLOAD_TIMEOUT = 300
+
+
+class MultipartStream:
+    """multipart/form-data body that reads the file lazily.
+
+    requests streams file-like objects with known length, instead of building
+    the whole body in memory as it does for `files`.
+    """
+
+    def __init__(
+        self,
+        fields: dict[str, Any],
+        file_field: str,
+        filename: str,
+        fileobj: IO[bytes],
+    ):
+        self.boundary = uuid.uuid4().hex
+        head = b"".join(
+            self._part_header(name) + _form_value(value).encode() + b"\r\n"
+            for name, value in fields.items()
+        ) + self._part_header(file_field, filename)
+        tail = f"\r\n--{self.boundary}--\r\n".encode()
+
+        size = os.fstat(fileobj.fileno()).st_size - fileobj.tell()
+        self.len = len(head) + size + len(tail)
+        self._parts: list[IO[bytes]] = [
+            io.BytesIO(head),
+            fileobj,
+            io.BytesIO(tail),
+        ]
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def read(self, size: int = -1) -> bytes:
+        chunks: list[bytes] = []
+
+        while self._parts and (size < 0 or size > 0):
+            chunk = self._parts[0].read(size)
+
+            if not chunk:
+                self._parts.pop(0)
+                continue
+
+            chunks.append(chunk)
+
+            if size > 0:
+                size -= len(chunk)
+
+        return b"".join(chunks)
+
+    def _part_header(self, name: str, filename: str | None = None) -> bytes:
+        disposition = f'form-data; name="{name}"'
+
+        if filename:
+            disposition += f'; filename="{filename}"'
+
+        headers = (
+            f"--{self.boundary}\r\nContent-Disposition: {disposition}\r\n"
+        )
+
+        if filename:
+            headers += "Content-Type: application/octet-stream\r\n"
+
+        return (headers + "\r\n").encode()
+
+
+def propagate_organization(
+    profile: Profile,
+    name: str,
+    patch: dict[str, Any],
+    image_path: str | None = None,
+) -> dict[str, Any] | None:
+    """Apply changes of the organisation to the profile's portal. The remote
+    organisation is located by its name, which could be different from the
+    name of the local organisation if the name is changed by the patch.
+
+    Return the remote organisation, or None if it does not exist."""
+    ckan = syndicate_utils.get_target(profile.ckan_url, profile.api_key)
+
+    try:
+        remote = ckan.action.organization_show(id=name)
+    except ckanapi.NotFound:
+        log.debug("Organization %s not found in %s", name, profile.ckan_url)
+        return None
+
+    if not image_path:
+        return ckan.action.organization_patch(id=remote["id"], **patch)
+
+    with open(image_path, "rb") as image:
+        return _patch_with_upload(
+            ckan,
+            profile,
+            dict(patch, id=remote["id"]),
+            os.path.basename(image_path),
+            image,
+        )
+
+
+def _patch_with_upload(
+    ckan: Any,
+    profile: Profile,
+    data_dict: dict[str, Any],
+    filename: str,
+    fileobj: IO[bytes],
+) -> dict[str, Any]:
+    """Stream the upload through the session of the remote client, so it
+    reuses pooled connections, when the client has one"""
+    body = MultipartStream(data_dict, UPLOAD_FIELD, filename, fileobj)
+    session = getattr(ckan, "session", None) or requests
+    resp = session.post(
+        f"{profile.ckan_url.rstrip('/')}/api/action/organization_patch",
+        data=body,
+        headers={
+            "Authorization": profile.api_key,
+            "Content-Type": body.content_type,
+        },
+        timeout=UPLOAD_TIMEOUT,
+    )
+
+    if resp.status_code == 409:
+        raise ckanapi.ValidationError(resp.json().get("error"))
+
+    resp.raise_for_status()
+
+    return resp.json()["result"]
+
+
+def _form_value(value: Any) -> str:
+    if value is None:
+        return ""
+
+    if isinstance(value, str):
+        return value
+
+    return json.dumps(value)
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any
+
+import ckanapi
+
+log = logging.getLogger(__name__)
+
+VIEW_FIELDS = [
+    "description",
+    "filter_fields",
+    "filter_values",
+    "resource_id",
+    "title",
+    "view_type",
+]
+CHARTS_EXCLUDED_FIELDS = ["id", "__extras"]
+COMPARISON_EXCLUDED_FIELDS = ["package_id", "position"]
+
+
+@dataclass
+class ViewPlan:
+    """Changes required to turn remote views of the resource into local ones.
+
+    `matches` contains remote view ID for every local view that already
+    exists remotely, or None if the view must be created."""
+
+    matches: list[str | None] = field(default_factory=list)
+    create: list[dict[str, Any]] = field(default_factory=list)
+    update: list[tuple[str, dict[str, Any]]] = field(default_factory=list)
+    delete: list[str] = field(default_factory=list)
+    reorder: bool = False
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.create or self.update or self.delete or self.reorder)
+
+
+def view_data(view: dict[str, Any]) -> dict[str, Any]:
+    """Extract fields allowed by view_create schema. charts_view has a lot of
+    custom fields we want to preserve."""
+    if view["view_type"] == "charts_view":
+        return {
+            k: v for k, v in view.items() if k not in CHARTS_EXCLUDED_FIELDS
+        }
+
+    return {f: view[f] for f in VIEW_FIELDS if f in view}
+
+
+def diff_views(
+    local: list[dict[str, Any]], remote: list[dict[str, Any]]
+) -> ViewPlan:
+    """Match local views with remote ones by type and title, in order of
+    their position. Matched views are updated only if they differ, remote
+    views without a match are deleted and local views without a match are
+    created."""
+    plan = ViewPlan()
+    candidates: dict[tuple[str, str], list[dict[str, Any]]] = defaultdict(list)
+
+    for view in remote:
+        candidates[_view_key(view)].append(view)
+
+    for view in local:
+        data = view_data(view)
+        options = candidates.get(_view_key(view))
+
+        if not options:
+            plan.matches.append(None)
+            plan.create.append(data)
+            continue
+
+        match = options.pop(0)
+        plan.matches.append(match["id"])
+
+        if not _is_same(data, match):
+            plan.update.append((match["id"], data))
+
+    plan.delete = [
+        view["id"] for views in candidates.values() for view in views
+    ]
+
+    # remote portal appends created views to the end
+    remaining = [
+        view["id"] for view in remote if view["id"] not in plan.delete
+    ]
+    matched = [view_id for view_id in plan.matches if view_id]
+    appended = matched + [None] * len(plan.create)
+    plan.reorder = remaining != matched or plan.matches != appended
+
+    return plan
+
+
+def apply_view_plan(
+    resource_id: str, plan: ViewPlan, ckan: ckanapi.RemoteCKAN
+) -> None:
+    """Execute the plan against the remote portal"""
+    for view_id in plan.delete:
+        ckan.action.resource_view_delete(id=view_id)
+
+    for view_id, data in plan.update:
+        try:
+            ckan.action.resource_view_update(id=view_id, **data)
+        except ckanapi.ValidationError as e:
+            log.error("Cannot update view %s: %s", view_id, e)
+
+    created = iter(plan.create)
+    order: list[str] = []
+
+    for view_id in plan.matches:
+        if view_id:
+            order.append(view_id)
+            continue
+
+        data = next(created)
+
+        try:
+            order.append(ckan.action.resource_view_create(**data)["id"])
+        except ckanapi.ValidationError as e:
+            log.error("Cannot create view %s: %s", data.get("title"), e)
+
+    if plan.reorder and order:
+        ckan.action.resource_view_reorder(id=resource_id, order=order)
+
+
+def _view_key(view: dict[str, Any]) -> tuple[str, str]:
+    return view["view_type"], view.get("title") or ""
+
+
+def _is_same(data: dict[str, Any], remote: dict[str, Any]) -> bool:
+    return all(
+        remote.get(key) == value
+        for key, value in data.items()
+        if key not in COMPARISON_EXCLUDED_FIELDS
+    )
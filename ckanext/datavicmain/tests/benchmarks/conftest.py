@@ -0,0 +1,202 @@
+"""Synthetic data for benchmarks.
+
+Size of the generated hierarchy can be adjusted with environment variables:
+
+    DATAVIC_BENCHMARK_ORGS          number of organisations (5000)
+    DATAVIC_BENCHMARK_DEPTH         depth of the hierarchy (6)
+    DATAVIC_BENCHMARK_RESTRICTED    share of restricted organisations (0.2)
+    DATAVIC_BENCHMARK_MEMBERSHIPS   memberships of the benchmark user (50)
+    DATAVIC_BENCHMARK_DATASETS      number of datasets (1000)
+
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator
+
+import pytest
+import sqlalchemy as sa
+
+import ckan.model as model
+
+from ckanext.datavicmain import cache, const, utils
+
+
+@dataclass
+class Hierarchy:
+    levels: list[list[str]]
+    restricted: set[str]
+    user: model.User
+    memberships: list[str]
+    datasets: list[str] = field(default_factory=list)
+
+    @property
+    def org_ids(self) -> list[str]:
+        return [org_id for level in self.levels for org_id in level]
+
+    @property
+    def leaves(self) -> list[str]:
+        return self.levels[-1]
+
+
+class QueryCounter:
+    """Count SQL statements executed by the application"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args: Any, **kwargs: Any):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        sa.event.listen(model.meta.engine, "before_cursor_execute", self)
+        return self
+
+    def __exit__(self, *exc: Any):
+        sa.event.remove(model.meta.engine, "before_cursor_execute", self)
+
+
+def _env(name: str, default: Any) -> Any:
+    return type(default)(os.environ.get(f"DATAVIC_BENCHMARK_{name}", default))
+
+
+def _uuid() -> str:
+    return str(uuid.uuid4())
+
+
+def _build_hierarchy(user: model.User) -> Hierarchy:
+    rnd = random.Random(42)
+    total = _env("ORGS", 5000)
+    depth = _env("DEPTH", 6)
+    ratio = _env("RESTRICTED", 0.2)
+
+    # every level is twice as wide as the previous one
+    weights = [2**level for level in range(depth)]
+    sizes = [max(1, total * w // sum(weights)) for w in weights]
+
+    levels: list[list[str]] = [
+        [_uuid() for _ in range(size)] for size in sizes
+    ]
+    restricted = {
+        org_id for level in levels for org_id in level if rnd.random() < ratio
+    }
+
+    groups = []
+    extras = []
+    members = []
+
+    for depth_idx, level in enumerate(levels):
+        for org_id in level:
+            groups.append(
+                {
+                    "id": org_id,
+                    "name": f"bench-org-{org_id}",
+                    "title": f"Benchmark org {org_id}",
+                    "type": "organization",
+                    "is_organization": True,
+                    "state": "active",
+                    "approval_status": "approved",
+                }
+            )
+            extras.append(
+                {
+                    "id": _uuid(),
+                    "group_id": org_id,
+                    "key": const.ORG_VISIBILITY_FIELD,
+                    "value": (
+                        const.ORG_RESTRICTED
+                        if org_id in restricted
+                        else const.ORG_UNRESTRICTED
+                    ),
+                    "state": "active",
+                }
+            )
+
+            if depth_idx:
+                members.append(
+                    {
+                        "id": _uuid(),
+                        "group_id": org_id,
+                        "table_id": rnd.choice(levels[depth_idx - 1]),
+                        "table_name": "group",
+                        "capacity": "parent",
+                        "state": "active",
+                    }
+                )
+
+    memberships = rnd.sample(
+        [org_id for level in levels for org_id in level],
+        min(_env("MEMBERSHIPS", 50), total),
+    )
+    members.extend(
+        {
+            "id": _uuid(),
+            "group_id": org_id,
+            "table_id": user.id,
+            "table_name": "user",
+            "capacity": "member",
+            "state": "active",
+        }
+        for org_id in memberships
+    )
+
+    datasets = [_uuid() for _ in range(_env("DATASETS", 1000))]
+    owners = [org_id for level in levels for org_id in level]
+    packages = [
+        {
+            "id": pkg_id,
+            "name": f"bench-dataset-{pkg_id}",
+            "title": f"Benchmark dataset {pkg_id}",
+            "type": "dataset",
+            "state": "active",
+            "private": False,
+            "owner_org": rnd.choice(owners),
+        }
+        for pkg_id in datasets
+    ]
+
+    session = model.Session
+    session.execute(model.group_table.insert(), groups)
+    session.execute(model.group_extra_table.insert(), extras)
+    session.execute(model.member_table.insert(), members)
+    session.execute(model.package_table.insert(), packages)
+    session.commit()
+
+    utils.refresh_org_restriction()
+    session.commit()
+    cache.invalidate(cache.NS_HIERARCHY)
+
+    return Hierarchy(levels, restricted, user, memberships, datasets)
+
+
+@pytest.fixture
+def hierarchy(clean_db: None, user: dict[str, Any]) -> Hierarchy:
+    return _build_hierarchy(model.User.get(user["id"]))
+
+
+@pytest.fixture
+def count_queries(benchmark: Any) -> Iterator[Callable[..., Any]]:
+    """Benchmark the function and record the number of SQL queries that it
+    makes into `extra_info` of the benchmark.
+
+    Queries are counted during a separate cold run, after caches are reset.
+    """
+
+    def runner(func: Callable[..., Any], *args: Any, **kwargs: Any) -> int:
+        cache.hierarchy_cache.clear()
+        cache.user_labels_cache.clear()
+
+        with QueryCounter() as counter:
+            func(*args, **kwargs)
+
+        benchmark.extra_info["queries"] = counter.count
+        benchmark(func, *args, **kwargs)
+
+        return counter.count
+
+    yield runner
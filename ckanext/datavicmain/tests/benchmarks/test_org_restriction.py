@@ -0,0 +1,150 @@
+"""Benchmarks of organisation restriction and hierarchy helpers.
+
+Run them with:
+
+    pytest -m benchmark ckanext/datavicmain/tests/benchmarks
+
+Besides the wall time, each benchmark stores the number of SQL queries of
+a cold call in `extra_info.queries`. Query budgets below don't depend on
+the size of the hierarchy, so an N+1 regression fails the benchmark.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable
+
+import pytest
+from flask_login import login_user
+
+import ckan.model as model
+import ckan.plugins.toolkit as tk
+from ckan.tests.helpers import call_action
+
+from ckanext.datavicmain import helpers, utils
+from ckanext.datavicmain.implementation import bulk_indexing
+from ckanext.datavicmain.implementation.permission_labels import (
+    PermissionLabels,
+)
+
+from .conftest import Hierarchy
+
+pytestmark = [
+    pytest.mark.benchmark,
+    pytest.mark.usefixtures("with_plugins"),
+]
+
+CountQueries = Callable[..., int]
+
+
+class TestOrgRestriction:
+    def test_is_org_restricted(
+        self, hierarchy: Hierarchy, count_queries: CountQueries
+    ):
+        leaves = hierarchy.leaves[:100]
+
+        def run():
+            for org_id in leaves:
+                utils.is_org_restricted(org_id)
+
+        assert count_queries(run) <= len(leaves)
+
+    def test_get_org_restricted_parents(
+        self, hierarchy: Hierarchy, count_queries: CountQueries
+    ):
+        leaves = hierarchy.leaves[:100]
+
+        def run():
+            for org_id in leaves:
+                utils.get_org_restricted_parents(org_id)
+
+        # organisation, its parents and extras of every parent
+        budget = len(leaves) * (len(hierarchy.levels) + 1)
+        assert count_queries(run) <= budget
+
+
+class TestOrgAccess:
+    def test_user_has_org_access(
+        self, app: Any, hierarchy: Hierarchy, count_queries: CountQueries
+    ):
+        leaves = hierarchy.leaves[:100]
+        user_id = hierarchy.user.id
+
+        with app.flask_app.test_request_context():
+
+            def run():
+                tk.g.pop("_datavic_org_access_resolvers", None)
+                for org_id in leaves:
+                    utils.user_has_org_access(org_id, user_id)
+
+            # restriction of every organisation, memberships are fetched
+            # once per request
+            budget = len(leaves) + len(hierarchy.memberships) + 20
+            assert count_queries(run) <= budget
+
+    def test_organization_list(
+        self, hierarchy: Hierarchy, count_queries: CountQueries
+    ):
+        context = {"user": hierarchy.user.name, "ignore_auth": True}
+
+        def run():
+            call_action("organization_list", dict(context), limit=1000)
+
+        assert count_queries(run) <= 20
+
+    def test_restrict_hierarchy_tree(
+        self,
+        app: Any,
+        hierarchy: Hierarchy,
+        count_queries: CountQueries,
+    ):
+        tree = call_action("group_tree", type="organization")
+
+        with app.flask_app.test_request_context():
+            login_user(hierarchy.user)
+
+            def run():
+                tk.g.pop("_datavic_org_access_resolvers", None)
+                helpers.datavic_restrict_hierarchy_tree(tree)
+
+            assert count_queries(run) <= 10
+
+
+class TestPermissionLabels:
+    def test_get_user_dataset_labels(
+        self, hierarchy: Hierarchy, count_queries: CountQueries
+    ):
+        user = hierarchy.user
+
+        def run():
+            PermissionLabels().get_user_dataset_labels(user)
+
+        assert count_queries(run) <= 20
+
+    def test_get_dataset_labels(
+        self, hierarchy: Hierarchy, count_queries: CountQueries
+    ):
+        datasets = model.Session.query(model.Package).filter(
+            model.Package.id.in_(hierarchy.datasets[:500])
+        )
+        datasets = datasets.all()
+
+        def run():
+            for dataset in datasets:
+                PermissionLabels().get_dataset_labels(dataset)
+
+        assert count_queries(run) <= len(datasets)
+
+    def test_get_dataset_labels_bulk(
+        self, hierarchy: Hierarchy, count_queries: CountQueries
+    ):
+        datasets = model.Session.query(model.Package).filter(
+            model.Package.id.in_(hierarchy.datasets[:500])
+        )
+        datasets = datasets.all()
+
+        def run():
+            with bulk_indexing():
+                for dataset in datasets:
+                    PermissionLabels().get_dataset_labels(dataset)
+
+        assert count_queries(run) <= 1
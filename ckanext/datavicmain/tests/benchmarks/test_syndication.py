@@ -0,0 +1,112 @@
+"""Benchmarks of syndication against the local stand-in of the remote portal.
+
+Run them with:
+
+    pytest -m benchmark ckanext/datavicmain/tests/benchmarks
+
+Size of the workload and behaviour of the remote portal can be adjusted
+with environment variables:
+
+    DATAVIC_BENCHMARK_SYNDICATED    number of datasets (20)
+    DATAVIC_BENCHMARK_RESOURCES     resources per dataset (3)
+    DATAVIC_BENCHMARK_FILE_SIZE     size of resource files in bytes (65536)
+    DATAVIC_BENCHMARK_LATENCY       delay of remote requests in seconds (0.005)
+    DATAVIC_BENCHMARK_FAILURE_RATE  share of failed remote calls (0.0)
+
+Besides the wall time, each benchmark stores requests per dataset, requests
+by action and transferred bytes of the last round in `extra_info`.
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+
+import ckan.model as model
+
+from ckanext.datavicmain.model import FailedResourceSync, SyndicatedResource
+from ckanext.datavicmain.tests.remote import (
+    FakeProfile,
+    FakeRemoteCKAN,
+    SyndicationReport,
+    make_uploaded_dataset,
+    syndicate,
+)
+
+from .conftest import _env
+
+pytestmark = [
+    pytest.mark.benchmark,
+    pytest.mark.usefixtures("with_plugins", "clean_db", "storage_path"),
+]
+
+
+@pytest.fixture
+def remote_ckan():
+    with FakeRemoteCKAN(
+        latency=_env("LATENCY", 0.005),
+        failure_rate=_env("FAILURE_RATE", 0.0),
+    ) as remote:
+        yield remote
+
+
+@pytest.fixture
+def datasets(package_factory: Any) -> list[str]:
+    return [
+        make_uploaded_dataset(
+            package_factory,
+            _env("RESOURCES", 3),
+            _env("FILE_SIZE", 65536),
+        )["id"]
+        for _ in range(_env("SYNDICATED", 20))
+    ]
+
+
+def _record(benchmark: Any, report: SyndicationReport) -> None:
+    benchmark.extra_info.update(
+        {
+            "requests_per_dataset": report.requests_per_dataset,
+            "requests": dict(report.stats.requests),
+            "uploaded": report.stats.uploaded,
+            "downloaded": report.stats.downloaded,
+            "failed_datasets": len(report.failed),
+        }
+    )
+
+
+def _forget_syndication(remote: FakeRemoteCKAN) -> None:
+    """Start the next round from scratch on both sides"""
+    model.Session.query(SyndicatedResource).delete()
+    model.Session.query(FailedResourceSync).delete()
+    model.Session.commit()
+
+    remote.datasets.clear()
+    remote.views.clear()
+    remote.files.clear()
+
+
+class TestSyndication:
+    def test_initial_syndication(
+        self, benchmark: Any, remote_ckan: FakeRemoteCKAN, datasets: list[str]
+    ):
+        profile = FakeProfile("odp", remote_ckan.url)
+
+        def setup():
+            _forget_syndication(remote_ckan)
+            return (remote_ckan, profile, datasets), {}
+
+        report = benchmark.pedantic(syndicate, setup=setup, rounds=3)
+        _record(benchmark, report)
+
+    def test_unchanged_resyndication(
+        self, benchmark: Any, remote_ckan: FakeRemoteCKAN, datasets: list[str]
+    ):
+        profile = FakeProfile("odp", remote_ckan.url)
+        syndicate(remote_ckan, profile, datasets)
+
+        report = benchmark(syndicate, remote_ckan, profile, datasets)
+        _record(benchmark, report)
+
+        if not remote_ckan.failure_rate:
+            assert "resource_patch" not in report.stats.requests
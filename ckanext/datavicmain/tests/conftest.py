@@ -5,6 +5,7 @@ from pytest_factoryboy import register
 from ckan.tests import factories
 
 from ckanext.datavicmain import const
+from ckanext.datavicmain.tests.remote import FakeRemoteCKAN
 
 
 @pytest.fixture
@@ -12,11 +13,25 @@ def clean_db(reset_db, migrate_db_for, with_plugins):
     reset_db()
 
     migrate_db_for("flakes")
+    migrate_db_for("datavicmain_dataset")
     migrate_db_for("datavicmain_home")
     migrate_db_for("pages")
     migrate_db_for("harvest")
 
 
+@pytest.fixture
+def remote_ckan():
+    """Local stand-in for the syndication target"""
+    with FakeRemoteCKAN() as remote:
+        yield remote
+
+
+@pytest.fixture
+def storage_path(ckan_config, monkeypatch, tmp_path):
+    monkeypatch.setitem(ckan_config, "ckan.storage_path", str(tmp_path))
+    return tmp_path
+
+
 @register
 class PackageFactory(factories.Dataset):
     access = "yes"
@@ -0,0 +1,449 @@
+"""In-process stand-in for the API of a syndication target.
+
+FakeRemoteCKAN serves a small subset of the CKAN action API over HTTP on a
+random local port, so the syndication code talks to it through the same
+ckanapi client and connection handling as to a real portal. Latency and
+failures can be injected, and every request is counted together with the
+number of transferred bytes.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Iterable
+
+import ckanapi
+
+import ckan.plugins.toolkit as tk
+from ckan.lib.uploader import get_resource_uploader
+
+from ckanext.datavicmain.syndication import listeners
+from ckanext.datavicmain.syndication.odp import prepare_package_for_odp
+
+ACTION_PREFIX = "/api/action/"
+
+
+class NotFound(Exception):
+    pass
+
+
+@dataclass
+class FakeProfile:
+    id: str
+    ckan_url: str
+    api_key: str = "fake-api-key"
+    field_id: str = "syndicated_id"
+
+
+@dataclass
+class RemoteStats:
+    """Traffic of the remote portal from the point of view of its client"""
+
+    requests: Counter[str] = field(default_factory=Counter)
+    uploaded: int = 0
+    downloaded: int = 0
+
+    @property
+    def total(self) -> int:
+        return sum(self.requests.values())
+
+
+@dataclass
+class SyndicationReport:
+    datasets: int
+    wall_time: float
+    stats: RemoteStats
+    failed: list[str] = field(default_factory=list)
+
+    @property
+    def requests_per_dataset(self) -> float:
+        return self.stats.total / self.datasets if self.datasets else 0
+
+
+class FakeRemoteCKAN:
+    """Remote CKAN portal that keeps datasets, views and uploaded files in
+    memory.
+
+    `latency` is added to every request, `failure_rate` is the share of
+    action calls that fail with HTTP 500 and actions from `fail_actions`
+    always fail."""
+
+    def __init__(
+        self, latency: float = 0, failure_rate: float = 0, seed: int = 42
+    ):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.fail_actions: set[str] = set()
+        self.datasets: dict[str, dict[str, Any]] = {}
+        self.views: dict[str, dict[str, Any]] = {}
+        self.files: dict[str, bytes] = {}
+        self.stats = RemoteStats()
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(
+            ("127.0.0.1", 0), _make_handler(self)
+        )
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> FakeRemoteCKAN:
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self) -> FakeRemoteCKAN:
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.stats = RemoteStats()
+
+    def handle(
+        self, method: str, path: str, content_type: str, body: bytes
+    ) -> tuple[int, dict[str, str], bytes]:
+        """Process the HTTP request. Return status, headers and content."""
+        if self.latency:
+            time.sleep(self.latency)
+
+        if path.startswith(ACTION_PREFIX):
+            action = path[len(ACTION_PREFIX) :].split("?")[0]
+            status, content = self._call_action(action, content_type, body)
+            headers = {"Content-Type": "application/json"}
+        else:
+            action = f"{method} file"
+            status, content = self._download(path)
+            headers = {"Content-Type": "application/octet-stream"}
+
+        with self._lock:
+            self.stats.requests[action] += 1
+            self.stats.uploaded += len(body)
+
+            if method != "HEAD":
+                self.stats.downloaded += len(content)
+
+        return status, headers, content
+
+    def _call_action(
+        self, action: str, content_type: str, body: bytes
+    ) -> tuple[int, bytes]:
+        handler: Callable[..., Any] | None = getattr(
+            self, f"_action_{action}", None
+        )
+
+        with self._lock:
+            failed = action in self.fail_actions or (
+                self._random.random() < self.failure_rate
+            )
+
+        if failed:
+            return 500, b"Internal Server Error"
+
+        if not handler:
+            return 400, b'"Bad request - Action name not known"'
+
+        data, files = _parse_body(content_type, body)
+
+        try:
+            with self._lock:
+                result = handler(files=files, **data)
+        except NotFound:
+            return 404, _error("Not Found Error")
+
+        return 200, json.dumps({"success": True, "result": result}).encode()
+
+    def _download(self, path: str) -> tuple[int, bytes]:
+        # /dataset/<id>/resource/<id>/download/<filename>
+        parts = path.split("/")
+
+        if len(parts) < 6 or parts[-2] != "download":
+            return 404, b""
+
+        content = self.files.get(parts[-3])
+
+        if content is None:
+            return 404, b""
+
+        return 200, content
+
+    def _download_url(self, package_id: str, res: dict[str, Any]) -> str:
+        name = os.path.basename(res.get("url") or "") or "file"
+        return (
+            f"{self.url}/dataset/{package_id}/resource/{res['id']}"
+            f"/download/{name}"
+        )
+
+    def _get_dataset(self, id: str) -> dict[str, Any]:
+        for pkg in self.datasets.values():
+            if id in (pkg["id"], pkg.get("name")):
+                return pkg
+
+        raise NotFound(id)
+
+    def _get_resource(self, id: str) -> dict[str, Any]:
+        for pkg in self.datasets.values():
+            for res in pkg.get("resources", []):
+                if res["id"] == id:
+                    return res
+
+        raise NotFound(id)
+
+    def _store(self, pkg: dict[str, Any]) -> dict[str, Any]:
+        pkg.setdefault("id", str(uuid.uuid4()))
+
+        for res in pkg.setdefault("resources", []):
+            res.setdefault("id", str(uuid.uuid4()))
+            res["package_id"] = pkg["id"]
+
+            if res.get("url_type") == "upload":
+                res["url"] = self._download_url(pkg["id"], res)
+
+        self.datasets[pkg["id"]] = pkg
+        return pkg
+
+    def _action_package_show(self, id: str, **kwargs: Any) -> dict[str, Any]:
+        return self._get_dataset(id)
+
+    def _action_package_create(self, files: Any, **data: Any):
+        return self._store(data)
+
+    def _action_package_update(self, files: Any, id: str, **data: Any):
+        current = self._get_dataset(id)
+        return self._store(dict(data, id=current["id"]))
+
+    def _action_package_patch(self, files: Any, id: str, **data: Any):
+        current = self._get_dataset(id)
+        return self._store(dict(current, **data))
+
+    def _action_resource_patch(
+        self, files: dict[str, bytes], id: str, **data: Any
+    ) -> dict[str, Any]:
+        res = self._get_resource(id)
+        res.update(data)
+
+        if "upload" in files:
+            self.files[id] = files["upload"]
+            res["url_type"] = "upload"
+            res["size"] = len(files["upload"])
+            res["url"] = self._download_url(res["package_id"], res)
+
+        return res
+
+    def _action_resource_view_list(self, id: str, **kwargs: Any):
+        return sorted(
+            (
+                view
+                for view in self.views.values()
+                if view["resource_id"] == id
+            ),
+            key=lambda view: view["position"],
+        )
+
+    def _action_resource_view_create(self, files: Any, **data: Any):
+        data["id"] = str(uuid.uuid4())
+        data["position"] = len(
+            self._action_resource_view_list(data["resource_id"])
+        )
+        self.views[data["id"]] = data
+
+        return data
+
+    def _action_resource_view_update(self, files: Any, id: str, **data: Any):
+        if id not in self.views:
+            raise NotFound(id)
+
+        self.views[id].update(data)
+        return self.views[id]
+
+    def _action_resource_view_delete(self, id: str, **kwargs: Any) -> None:
+        if self.views.pop(id, None) is None:
+            raise NotFound(id)
+
+    def _action_resource_view_reorder(
+        self, id: str, order: list[str], **kwargs: Any
+    ) -> dict[str, Any]:
+        for position, view_id in enumerate(order):
+            self.views[view_id]["position"] = position
+
+        return {"id": id, "order": order}
+
+
+def _make_handler(remote: FakeRemoteCKAN) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        # keep connections alive, so pooling of the client matters
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            self._respond()
+
+        def do_HEAD(self):
+            self._respond()
+
+        def do_POST(self):
+            self._respond()
+
+        def _respond(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+            status, headers, content = remote.handle(
+                self.command,
+                self.path,
+                self.headers.get("Content-Type", ""),
+                body,
+            )
+
+            self.send_response(status)
+
+            for name, value in headers.items():
+                self.send_header(name, value)
+
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+
+            if self.command != "HEAD":
+                self.wfile.write(content)
+
+        def log_message(self, *args: Any):
+            pass
+
+    return Handler
+
+
+def _error(error_type: str) -> bytes:
+    return json.dumps(
+        {"success": False, "error": {"__type": error_type, "message": ""}}
+    ).encode()
+
+
+def _parse_body(
+    content_type: str, body: bytes
+) -> tuple[dict[str, Any], dict[str, bytes]]:
+    """Extract action parameters and uploaded files from the request"""
+    if not content_type.startswith("multipart/form-data"):
+        return (json.loads(body) if body else {}), {}
+
+    message = BytesParser(policy=HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + body
+    )
+    data: dict[str, Any] = {}
+    files: dict[str, bytes] = {}
+
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        content = part.get_payload(decode=True)
+
+        if part.get_filename() is None:
+            data[name] = content.decode()
+        else:
+            files[name] = content
+
+    return data, files
+
+
+def make_uploaded_dataset(
+    package_factory: Callable[..., dict[str, Any]],
+    resources: int = 3,
+    size: int = 1024,
+) -> dict[str, Any]:
+    """Create a dataset with uploaded resource files of the given size.
+    Requires `ckan.storage_path`."""
+    dataset = package_factory(
+        resources=[
+            {"url": f"data-{idx}.csv", "url_type": "upload", "format": "CSV"}
+            for idx in range(resources)
+        ]
+    )
+
+    for res in dataset["resources"]:
+        path = get_resource_uploader(res).get_path(res["id"])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(path, "wb") as dest:
+            dest.write(os.urandom(size))
+
+    return dataset
+
+
+def syndicate(
+    remote: FakeRemoteCKAN,
+    profile: FakeProfile,
+    package_ids: Iterable[str],
+) -> SyndicationReport:
+    """Simplified stand-in for the syndication task of ckanext-syndicate:
+    check whether the dataset exists remotely, create or update it with the
+    ODP payload and synchronize resources in after_syndication_listener.
+
+    It does not reproduce the task itself. The payload is built from
+    package_show by prepare_package_for_odp only, skip_syndication is not
+    checked, local IDs are used as remote IDs and the client is created
+    directly instead of through the pooled targets of bulk syndication, so
+    neither pooling nor delta syndication apply to dataset calls. Use it to
+    measure resource synchronization, not the whole syndication.
+
+    Datasets that cannot be created or updated are reported as failed.
+    Failures of resource synchronization are recorded by the listener, as
+    usual."""
+    ckan = ckanapi.RemoteCKAN(remote.url, apikey=profile.api_key)
+    package_ids = list(package_ids)
+
+    failed = []
+
+    remote.reset_stats()
+    started = time.perf_counter()
+
+    for package_id in package_ids:
+        payload = prepare_package_for_odp(
+            package_id,
+            tk.get_action("package_show")(
+                {"ignore_auth": True}, {"id": package_id}
+            ),
+        )
+
+        try:
+            try:
+                ckan.action.package_show(id=payload["id"])
+            except ckanapi.NotFound:
+                result = ckan.action.package_create(**payload)
+            else:
+                result = ckan.action.package_update(**payload)
+        except ckanapi.CKANAPIError:
+            failed.append(package_id)
+            continue
+
+        listeners.after_syndication_listener(
+            package_id, profile=profile, remote=result
+        )
+
+    report = SyndicationReport(
+        len(package_ids), time.perf_counter() - started, remote.stats, failed
+    )
+    ckan.close()
+
+    return report
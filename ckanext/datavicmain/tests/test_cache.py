@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import pytest
+
+import ckan.model as model
+from ckan.lib.redis import connect_to_redis
+
+from ckanext.datavicmain import cache
+
+
+@pytest.mark.usefixtures("clean_redis")
+class TestVersionedCache:
+    def test_invalidate_bumps_version(self):
+        (version,) = cache.get_versions("test")
+
+        cache.invalidate("test")
+
+        assert cache.get_versions("test") == (version + 1,)
+
+    def test_versions_do_not_repeat_after_reset(self):
+        (initial,) = cache.get_versions("test")
+        cache.invalidate("test")
+
+        connect_to_redis().delete(cache._version_key("test"))
+
+        (version,) = cache.get_versions("test")
+        assert version > initial + 1
+
+    @pytest.mark.usefixtures("with_plugins", "clean_db")
+    def test_invalidate_on_commit(self):
+        (version,) = cache.get_versions("test")
+
+        cache.invalidate_on_commit("test")
+        assert cache.get_versions("test") == (version,)
+
+        model.Session.commit()
+        assert cache.get_versions("test") == (version + 1,)
+
+    def test_value_is_cached_until_invalidated(self, mocker):
+        versioned = cache.VersionedCache("test")
+        factory = mocker.Mock(side_effect=[1, 2])
+
+        assert versioned.get("key", factory) == 1
+        assert versioned.get("key", factory) == 1
+
+        cache.invalidate("test")
+
+        assert versioned.get("key", factory) == 2
+        assert factory.call_count == 2
+
+    def test_extra_namespaces(self, mocker):
+        versioned = cache.VersionedCache("test")
+        factory = mocker.Mock(side_effect=[1, 2])
+        user_ns = cache.user_namespace("user-id")
+
+        assert versioned.get("key", factory, (user_ns,)) == 1
+
+        cache.invalidate(user_ns)
+
+        assert versioned.get("key", factory, (user_ns,)) == 2
+
+    def test_cache_is_bypassed_without_redis(self, mocker):
+        mocker.patch.object(cache, "get_versions", return_value=None)
+        versioned = cache.VersionedCache("test")
+        factory = mocker.Mock(side_effect=[1, 2])
+
+        assert versioned.get("key", factory) == 1
+        assert versioned.get("key", factory) == 2
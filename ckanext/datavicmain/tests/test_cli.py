@@ -5,11 +5,14 @@ from io import StringIO
 from typing import Any, Callable
 
 import pytest
+from click.testing import CliRunner
 
 import ckan.model as model
+from ckan.lib import search
 from ckan.tests.helpers import call_action
 
 import ckanext.datavicmain.cli as cli
+from ckanext.datavicmain import const
 
 
 class TestResourceFilesizeConvert:
@@ -144,3 +147,28 @@ class TestReportPackageAuthors:
         assert data[0]["Name"] == user["name"]
         assert data[0]["Email"] == user["email"]
         assert data[0]["Packages"] == "1"
+
+
+@pytest.mark.usefixtures("with_plugins", "clean_db", "clean_index")
+class TestRebuildSearchIndex:
+    def test_rebuild(self, organization_factory, package_factory, mocker):
+        org = organization_factory(
+            **{const.ORG_VISIBILITY_FIELD: const.ORG_RESTRICTED}
+        )
+        package_factory.create_batch(2, owner_org=org["id"])
+        search.clear_all()
+        bulk = mocker.spy(cli.maintain, "bulk_indexing")
+
+        result = CliRunner().invoke(
+            cli.datavic_main, ["maintain", "rebuild-search-index"]
+        )
+
+        assert result.exit_code == 0, result.output
+        assert "Search index has been rebuilt" in result.output
+        assert bulk.call_count == 1
+
+        label = f"vicmain-restricted-org-{org['id']}"
+        found = search.query_for(model.Package).run(
+            {"fq": f'+permission_labels:"{label}"'}
+        )
+        assert found["count"] == 2
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import json
+from typing import Any
+
+import pytest
+
+import ckan.lib.search as search
+import ckan.model as model
+
+from ckanext.datavicmain import cache, indexing
+from ckanext.datavicmain.model import OrgRestriction
+
+
+def _document(formats: list[str], resources: list[dict[str, Any]]):
+    return {
+        "id": "test-id",
+        "res_format": formats,
+        "validated_data_dict": json.dumps({"resources": resources}),
+    }
+
+
+class TestEnrichIndexDocument:
+    def test_formats_are_normalized(self):
+        result = indexing.enrich_index_document(
+            _document(["csv", ".xlsx"], [])
+        )
+
+        assert result["res_format"] == ["CSV", "XLSX"]
+
+    @pytest.mark.parametrize("fmt", ["wms", "GeoJSON", "esri rest"])
+    def test_api_format(self, fmt: str):
+        result = indexing.enrich_index_document(_document([fmt], []))
+
+        assert indexing.ALL_API_FORMAT in result["res_format"]
+
+    @pytest.mark.parametrize(
+        "datastore_active,expected", [(True, True), (False, False)]
+    )
+    def test_datastore_csv(self, datastore_active: bool, expected: bool):
+        result = indexing.enrich_index_document(
+            _document(
+                ["csv"],
+                [{"format": "csv", "datastore_active": datastore_active}],
+            )
+        )
+
+        assert (indexing.ALL_API_FORMAT in result["res_format"]) is expected
+
+    def test_dataset_is_not_fetched(self, mocker):
+        spy = mocker.patch.object(indexing.tk, "get_action")
+
+        indexing.enrich_index_document(_document(["csv"], [{"format": "csv"}]))
+
+        spy.assert_not_called()
+
+    def test_no_formats(self):
+        result = indexing.enrich_index_document({"id": "test-id"})
+
+        assert "res_format" not in result
+
+
+@pytest.mark.usefixtures("with_plugins", "clean_db", "clean_index")
+class TestUpdatePermissionLabels:
+    def test_labels_are_updated(self, organization, package_factory, mocker):
+        mocker.patch.object(
+            indexing, "atomic_updates_supported", return_value=True
+        )
+        label = f"vicmain-restricted-org-{organization['id']}"
+        dataset = package_factory(owner_org=organization["id"])
+
+        OrgRestriction.get(organization["id"]).restricted = True
+        model.Session.commit()
+        cache.invalidate(cache.NS_HIERARCHY)
+
+        assert indexing.update_permission_labels([dataset["id"]]) == []
+        search.commit()
+
+        result = search.query_for(model.Package).run(
+            {"fq": f'+permission_labels:"{label}"'},
+            permission_labels=[label],
+        )
+        assert result["count"] == 1
+
+    def test_fallback(self, package, mocker):
+        mocker.patch.object(
+            indexing, "atomic_updates_supported", return_value=False
+        )
+
+        assert indexing.update_permission_labels([package["id"]]) == [
+            package["id"]
+        ]
+
+    def test_missing_document(self, package, mocker):
+        mocker.patch.object(
+            indexing, "atomic_updates_supported", return_value=True
+        )
+        search.clear_all()
+
+        assert indexing.update_permission_labels([package["id"]]) == [
+            package["id"]
+        ]
@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import pytest
+
+from ckan.lib.redis import connect_to_redis
+from ckan.tests.helpers import call_action
+
+from ckanext.datavicmain import const, jobs
+from ckanext.datavicmain.model import ReindexTask
+
+
+@pytest.mark.ckan_config("ckanext.datavicmain.reindex.chunk_size", 2)
+@pytest.mark.usefixtures("with_plugins", "clean_db", "clean_index")
+class TestReindexOrganization:
+    def test_chunks(self, organization, package_factory, mocker):
+        enqueue = mocker.patch.object(jobs.tk, "enqueue_job")
+        package_factory.create_batch(3, owner_org=organization["id"])
+
+        jobs.reindex_organization(organization["id"])
+
+        task = ReindexTask.get_latest(organization["id"])
+        assert task.total == 3
+        assert enqueue.call_count == 2
+        assert task.dictize()["state"] == ReindexTask.STATE_PENDING
+
+        for call in enqueue.call_args_list:
+            jobs.reindex_chunk(*call.args[1])
+
+        status = call_action("datavic_reindex_status", org_id=task.org_id)
+        assert status["state"] == ReindexTask.STATE_COMPLETE
+        assert status["processed"] == 3
+        assert status["chunks"][ReindexTask.STATE_COMPLETE] == 2
+
+    def test_resume(self, organization, package_factory, mocker):
+        enqueue = mocker.patch.object(jobs.tk, "enqueue_job")
+        package_factory.create_batch(3, owner_org=organization["id"])
+
+        jobs.reindex_organization(organization["id"])
+        jobs.reindex_chunk(*enqueue.call_args_list[0].args[1])
+        task = ReindexTask.get_latest(organization["id"])
+
+        enqueue.reset_mock()
+        assert jobs.enqueue_reindex_chunks(task) == 1
+        assert task.dictize()["state"] == ReindexTask.STATE_RUNNING
+
+
+@pytest.mark.usefixtures("with_plugins", "clean_db")
+class TestIterRelatedPackageIds:
+    def test_subtree(self, organization_factory, package_factory):
+        top = organization_factory()
+        child = organization_factory(groups=[{"name": top["name"]}])
+        grandchild = organization_factory(groups=[{"name": child["name"]}])
+        other = organization_factory()
+
+        expected = {
+            package_factory(owner_org=org["id"])["id"]
+            for org in (top, child, grandchild)
+        }
+        deleted = package_factory(owner_org=grandchild["id"])
+        call_action("package_delete", id=deleted["id"])
+        package_factory(owner_org=other["id"])
+
+        batches = list(jobs.iter_related_package_ids(top["id"], 2))
+
+        assert [len(batch) for batch in batches] == [2, 1]
+        assert {pkg_id for batch in batches for pkg_id in batch} == expected
+
+
+@pytest.mark.usefixtures("with_plugins", "clean_db", "clean_redis")
+class TestEnqueueOrganizationReindex:
+    def test_duplicates_are_dropped(self, organization, mocker):
+        enqueue = mocker.patch.object(jobs.tk, "enqueue_job")
+
+        assert jobs.enqueue_organization_reindex(organization["id"])
+        assert not jobs.enqueue_organization_reindex(organization["id"])
+        assert enqueue.call_count == 1
+
+    def test_parent_absorbs_child(self, organization_factory, mocker):
+        mocker.patch.object(jobs.tk, "enqueue_job")
+        parent = organization_factory()
+        child = organization_factory(groups=[{"name": parent["name"]}])
+
+        assert jobs.enqueue_organization_reindex(child["id"])
+        assert jobs.enqueue_organization_reindex(parent["id"])
+        assert not jobs.enqueue_organization_reindex(child["id"])
+
+        spy = mocker.spy(jobs, "iter_related_package_ids")
+        jobs.reindex_organization(parent["id"], coalesced=True)
+        jobs.reindex_organization(child["id"], coalesced=True)
+
+        assert spy.call_count == 1
+
+    def test_new_job_after_start(self, organization, mocker):
+        enqueue = mocker.patch.object(jobs.tk, "enqueue_job")
+
+        jobs.enqueue_organization_reindex(organization["id"])
+        jobs.reindex_organization(organization["id"], coalesced=True)
+
+        assert jobs.enqueue_organization_reindex(organization["id"])
+        assert enqueue.call_count == 2
+
+    def test_expired_marker(self, organization, mocker):
+        mocker.patch.object(jobs.tk, "enqueue_job")
+        jobs.enqueue_organization_reindex(organization["id"])
+        connect_to_redis().delete(
+            jobs._pending_reindex_key(organization["id"])
+        )
+
+        spy = mocker.spy(jobs, "iter_related_package_ids")
+        jobs.reindex_organization(organization["id"], coalesced=True)
+
+        assert spy.call_count == 1
+
+    def test_duplicate_job_is_skipped(self, organization, mocker):
+        mocker.patch.object(jobs.tk, "enqueue_job")
+        jobs.enqueue_organization_reindex(organization["id"])
+
+        spy = mocker.spy(jobs, "iter_related_package_ids")
+        jobs.reindex_organization(organization["id"], coalesced=True)
+        jobs.reindex_organization(organization["id"], coalesced=True)
+
+        assert spy.call_count == 1
+
+    def test_full_reindex_upgrades_labels_only(self, organization, mocker):
+        enqueue = mocker.patch.object(jobs.tk, "enqueue_job")
+
+        assert jobs.enqueue_organization_reindex(
+            organization["id"], labels_only=True
+        )
+        assert not jobs.enqueue_organization_reindex(
+            organization["id"], labels_only=True
+        )
+        assert jobs.enqueue_organization_reindex(organization["id"])
+        assert enqueue.call_count == 2
+
+        jobs.reindex_organization(
+            organization["id"], coalesced=True, labels_only=True
+        )
+
+        task = ReindexTask.get_latest(organization["id"])
+        assert not task.labels_only
+
+
+@pytest.mark.usefixtures("with_plugins", "clean_db", "clean_redis")
+class TestRestrictionChangeReindex:
+    def test_attached_to_restricted_parent(self, organization_factory, mocker):
+        parent = organization_factory(
+            **{const.ORG_VISIBILITY_FIELD: const.ORG_RESTRICTED}
+        )
+        child = organization_factory()
+        organization_factory(groups=[{"name": child["name"]}])
+        enqueue = mocker.patch.object(jobs.tk, "enqueue_job")
+
+        call_action(
+            "member_create",
+            id=child["id"],
+            object=parent["id"],
+            object_type="group",
+            capacity="parent",
+        )
+
+        enqueue.assert_called_once()
+        assert enqueue.call_args.args[0] is jobs.reindex_organization
+        assert enqueue.call_args.args[1] == [child["id"]]
+        assert enqueue.call_args.args[2]["labels_only"]
+
+    def test_restriction_not_changed(self, organization_factory, mocker):
+        parent = organization_factory()
+        child = organization_factory()
+        enqueue = mocker.patch.object(jobs.tk, "enqueue_job")
+
+        call_action(
+            "member_create",
+            id=child["id"],
+            object=parent["id"],
+            object_type="group",
+            capacity="parent",
+        )
+
+        enqueue.assert_not_called()
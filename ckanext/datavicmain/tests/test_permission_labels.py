@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import pytest
+
+import ckan.model as model
+from ckan.tests.helpers import call_action
+
+from ckanext.datavicmain import const
+from ckanext.datavicmain.implementation import permission_labels
+from ckanext.datavicmain.implementation.permission_labels import (
+    PermissionLabels,
+)
+
+
+@pytest.mark.usefixtures("with_plugins", "clean_db")
+class TestUserDatasetLabels:
+    def test_labels_are_cached(self, user, mocker):
+        user_obj = model.User.get(user["id"])
+        spy = mocker.spy(permission_labels, "_get_user_orgs_ids")
+
+        first = PermissionLabels().get_user_dataset_labels(user_obj)
+        second = PermissionLabels().get_user_dataset_labels(user_obj)
+
+        assert first == second
+        assert spy.call_count == 1
+
+    def test_demotion_invalidates_labels(self, sysadmin, mocker):
+        spy = mocker.spy(permission_labels, "_get_user_orgs_ids")
+
+        PermissionLabels().get_user_dataset_labels(
+            model.User.get(sysadmin["id"])
+        )
+        call_action("user_patch", id=sysadmin["id"], sysadmin=False)
+
+        user_obj = model.User.get(sysadmin["id"])
+        assert not user_obj.sysadmin
+
+        PermissionLabels().get_user_dataset_labels(user_obj)
+        assert spy.call_count == 2
+
+    def test_user_update_invalidates_user_namespace(self, sysadmin, mocker):
+        from ckanext.datavicmain import cache
+
+        invalidate = mocker.spy(cache, "invalidate")
+
+        call_action("user_patch", id=sysadmin["id"], sysadmin=False)
+
+        invalidate.assert_any_call(cache.user_namespace(sysadmin["id"]))
+
+    def test_membership_invalidates_labels(self, user, organization_factory):
+        user_obj = model.User.get(user["id"])
+        org = organization_factory(
+            **{const.ORG_VISIBILITY_FIELD: const.ORG_RESTRICTED}
+        )
+        label = f"vicmain-restricted-org-{org['id']}"
+
+        assert label not in PermissionLabels().get_user_dataset_labels(
+            user_obj
+        )
+
+        call_action(
+            "organization_member_create",
+            id=org["id"],
+            username=user["name"],
+            role="admin",
+        )
+
+        assert label in PermissionLabels().get_user_dataset_labels(user_obj)
+
+
+@pytest.mark.usefixtures("with_plugins", "clean_db")
+class TestBulkIndexing:
+    def test_labels_are_computed_once_per_org(
+        self, organization_factory, package_factory, mocker
+    ):
+        restricted = organization_factory(
+            **{const.ORG_VISIBILITY_FIELD: const.ORG_RESTRICTED}
+        )
+        public = organization_factory()
+        datasets = [
+            model.Package.get(package_factory(owner_org=org["id"])["id"])
+            for org in (restricted, public)
+            for _ in range(3)
+        ]
+        lookup = mocker.spy(permission_labels.utils, "is_org_restricted")
+        label = mocker.spy(permission_labels, "_org_restriction_label")
+
+        with permission_labels.bulk_indexing():
+            labels = [
+                PermissionLabels().get_dataset_labels(pkg)[0]
+                for pkg in datasets
+            ]
+
+        restricted_label = f"vicmain-restricted-org-{restricted['id']}"
+        assert labels == [restricted_label] * 3 + ["public"] * 3
+        lookup.assert_not_called()
+        assert label.call_count == 1
+
+    def test_labels_are_reset_on_exit(self):
+        with permission_labels.bulk_indexing():
+            assert permission_labels._bulk_org_labels.get() is not None
+
+        assert permission_labels._bulk_org_labels.get() is None
+
+    def test_labels_are_reset_on_error(self):
+        with pytest.raises(ValueError):
+            with permission_labels.bulk_indexing():
+                raise ValueError()
+
+        assert permission_labels._bulk_org_labels.get() is None
@@ -1,19 +1,30 @@
 from __future__ import annotations
 
+import os
+from datetime import datetime, timedelta
 from typing import Any
 
 import ckanapi
 import pytest
 
+import ckan.model as model
 from ckan.tests.helpers import call_action
 
 
 @pytest.fixture
-def ckan(user, app, monkeypatch):
+def ckan(user, app, monkeypatch, mocker):
     from ckanext.datavicmain.logic import action
+    from ckanext.datavicmain.syndication import organization
 
     ckan = ckanapi.TestAppCKAN(app, user["apikey"])
-    monkeypatch.setattr(action, "get_target", lambda *args: ckan)
+    monkeypatch.setattr(
+        organization.syndicate_utils, "get_target", lambda *args: ckan
+    )
+    mocker.patch.object(
+        action.toolkit,
+        "enqueue_job",
+        side_effect=lambda fn, args, *rest, **kwargs: fn(*args),
+    )
     yield ckan
 
 
@@ -88,3 +99,627 @@ class TestOrgSyndication:
         )
 
         ckan.action.organization_patch.assert_called_once()
+
+    @pytest.mark.ckan_config("ckanext.datavicmain.org_propagation.backoff", 0)
+    def test_propagation_is_retried(
+        self, ckan, user: dict[str, Any], organization: dict[str, Any], mocker
+    ):
+        from requests.exceptions import ConnectionError
+
+        from ckanext.datavicmain import jobs
+        from ckanext.datavicmain.model import OrgPropagation
+
+        ckan.action.organization_show = mocker.Mock()
+        ckan.action.organization_show.return_value = {"id": "xxx"}
+        ckan.action.organization_patch = mocker.Mock()
+        ckan.action.organization_patch.side_effect = [
+            ConnectionError(),
+            {"id": "xxx"},
+        ]
+
+        call_action(
+            "organization_patch",
+            id=organization["id"],
+            title="new-title",
+            context={
+                "user": user["name"],
+            },
+        )
+
+        record = OrgPropagation.get(organization["id"], "odp")
+        assert record.state == OrgPropagation.STATE_PENDING
+        assert record.attempts == 1
+        assert record.next_attempt_at
+
+        assert jobs.enqueue_due_propagations() == 1
+
+        record = OrgPropagation.get(organization["id"], "odp")
+        assert record.state == OrgPropagation.STATE_SUCCESS
+        assert record.attempts == 2
+        assert jobs.enqueue_due_propagations() == 0
+
+
+@pytest.mark.usefixtures("with_plugins", "clean_db")
+@pytest.mark.ckan_config(
+    "ckanext.datavicmain.syndication.odp.concurrency", "2"
+)
+class TestAfterSyndicationListener:
+    def test_failures_are_recorded(self, package_factory, mocker):
+        from ckanext.datavicmain.model import FailedResourceSync
+        from ckanext.datavicmain.syndication import listeners
+
+        profile = mocker.Mock(id="odp", ckan_url="http://remote.test")
+        target = mocker.Mock()
+        target.action.resource_view_list.side_effect = [
+            [],
+            ValueError("remote is down"),
+            [],
+        ]
+        mocker.patch.object(
+            listeners.syndicate_utils, "get_target", return_value=target
+        )
+        enqueue = mocker.patch.object(listeners.tk, "enqueue_job")
+
+        dataset = package_factory(
+            resources=[
+                {"url": f"http://external.test/{idx}.csv"} for idx in range(3)
+            ]
+        )
+
+        listeners.after_syndication_listener(
+            dataset["id"],
+            profile=profile,
+            remote={"id": "remote-id", "resources": dataset["resources"]},
+        )
+
+        records = FailedResourceSync.for_dataset(dataset["id"], "odp")
+        assert [(r.attempts, r.error) for r in records] == [
+            (1, "remote is down")
+        ]
+        assert records[0].next_attempt_at > datetime.utcnow()
+        enqueue.assert_not_called()
+        assert listeners.config.get_syndication_concurrency("odp") == 2
+
+    def test_due_retries_are_enqueued(self, package_factory, mocker):
+        from ckanext.datavicmain.model import FailedResourceSync
+        from ckanext.datavicmain.syndication import listeners
+
+        dataset = package_factory(
+            resources=[{"url": "http://external.test/data.csv"}]
+        )
+        profile = mocker.Mock(id="odp")
+        enqueue = mocker.patch.object(listeners.tk, "enqueue_job")
+        listeners._record_failures(
+            dataset["id"],
+            "remote-id",
+            profile,
+            {dataset["resources"][0]["id"]: "down"},
+        )
+        listeners._schedule_retry(dataset["id"], "odp", 1)
+
+        assert listeners.enqueue_due_retries() == 0
+
+        record = FailedResourceSync.for_dataset(dataset["id"], "odp")[0]
+        record.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        model.Session.commit()
+
+        assert listeners.enqueue_due_retries() == 1
+        assert enqueue.call_args.args[1] == [dataset["id"], "odp"]
+        # the retry is not enqueued again while the job is pending
+        assert listeners.enqueue_due_retries() == 0
+
+    @pytest.mark.ckan_config(
+        "ckanext.datavicmain.syndication.resource_retries", "2"
+    )
+    def test_only_failed_resources_are_retried(self, package_factory, mocker):
+        from ckanext.datavicmain.model import FailedResourceSync
+        from ckanext.datavicmain.syndication import listeners
+
+        dataset = package_factory(
+            resources=[
+                {"url": f"http://external.test/{idx}.csv"} for idx in range(2)
+            ]
+        )
+        failed = dataset["resources"][0]
+        profile = mocker.Mock(id="odp", ckan_url="http://remote.test")
+        mocker.patch.object(listeners, "get_profiles", return_value=[profile])
+        target = mocker.Mock()
+        target.action.package_show.return_value = dataset
+        target.action.resource_view_list.side_effect = ValueError("down")
+        mocker.patch.object(
+            listeners.syndicate_utils, "get_target", return_value=target
+        )
+        enqueue = mocker.patch.object(listeners.tk, "enqueue_job")
+
+        listeners._record_failures(
+            dataset["id"], dataset["id"], profile, {failed["id"]: "down"}
+        )
+
+        with pytest.raises(listeners.SyndicationResourceError):
+            listeners.retry_failed_resources(dataset["id"], "odp")
+
+        target.action.resource_view_list.assert_called_once_with(
+            id=failed["id"]
+        )
+        enqueue.assert_not_called()
+        assert FailedResourceSync.stuck(2).count() == 1
+
+
+class TestUpdateRemoteResource:
+    @pytest.fixture
+    def local_file(self, tmp_path):
+        from ckanext.datavicmain.syndication import listeners
+
+        path = tmp_path / "data.csv"
+        path.write_text("a,b\n1,2\n")
+
+        return listeners.LocalFile("local-id", str(path), "data.csv")
+
+    def test_unchanged_file_is_skipped(self, local_file, mocker):
+        from ckanext.datavicmain.syndication import listeners
+
+        head = mocker.patch.object(listeners.requests, "head")
+        head.return_value.ok = False
+        target = mocker.Mock()
+        remote = {"id": "remote-id", "url": "http://remote.test/data.csv"}
+
+        state = listeners._update_remote_resource(remote, local_file, target)
+        local_file.synced = state
+
+        assert (
+            listeners._update_remote_resource(remote, local_file, target)
+            == state
+        )
+        assert head.call_count == 1
+        assert target.action.resource_patch.call_count == 1
+
+    def test_same_size_edit_is_uploaded(self, local_file, mocker):
+        from ckanext.datavicmain.syndication import listeners
+
+        head = mocker.patch.object(listeners.requests, "head")
+        head.return_value.ok = False
+        target = mocker.Mock()
+        remote = {"id": "remote-id", "url": "http://remote.test/data.csv"}
+
+        local_file.synced = listeners._update_remote_resource(
+            remote, local_file, target
+        )
+        with open(local_file.path, "w") as dest:
+            dest.write("a,b\n3,4\n")
+
+        state = listeners._update_remote_resource(remote, local_file, target)
+
+        assert state.digest != local_file.synced.digest
+        assert target.action.resource_patch.call_count == 2
+
+    def test_size_match_is_not_recorded(self, local_file, mocker):
+        from ckanext.datavicmain.syndication import listeners
+
+        head = mocker.patch.object(listeners.requests, "head")
+        head.return_value.ok = True
+        head.return_value.headers = {
+            "Content-Length": str(os.path.getsize(local_file.path))
+        }
+        target = mocker.Mock()
+        remote = {"id": "remote-id", "url": "http://remote.test/data.csv"}
+
+        assert (
+            listeners._update_remote_resource(remote, local_file, target)
+            is None
+        )
+        target.action.resource_patch.assert_not_called()
+
+
+class TestDiffViews:
+    def _view(self, id_: str, title: str, view_type: str = "image_view"):
+        return {
+            "id": id_,
+            "resource_id": "res",
+            "title": title,
+            "view_type": view_type,
+            "description": "",
+        }
+
+    def test_identical(self):
+        from ckanext.datavicmain.syndication import views
+
+        local = [self._view("1", "a"), self._view("2", "b")]
+        remote = [self._view("x", "a"), self._view("y", "b")]
+
+        assert views.diff_views(local, remote).is_empty
+
+    def test_changes(self):
+        from ckanext.datavicmain.syndication import views
+
+        local = [
+            dict(self._view("1", "a"), description="changed"),
+            self._view("2", "new", "datatables_view"),
+        ]
+        remote = [self._view("x", "a"), self._view("y", "old")]
+
+        plan = views.diff_views(local, remote)
+
+        assert plan.matches == ["x", None]
+        assert plan.update == [("x", views.view_data(local[0]))]
+        assert plan.create == [views.view_data(local[1])]
+        assert plan.delete == ["y"]
+        assert not plan.reorder
+
+    def test_reorder(self, mocker):
+        from ckanext.datavicmain.syndication import views
+
+        local = [self._view("2", "b"), self._view("1", "a")]
+        remote = [self._view("x", "a"), self._view("y", "b")]
+        ckan = mocker.Mock()
+
+        plan = views.diff_views(local, remote)
+        views.apply_view_plan("res", plan, ckan)
+
+        ckan.action.resource_view_reorder.assert_called_once_with(
+            id="res", order=["y", "x"]
+        )
+        ckan.action.resource_view_delete.assert_not_called()
+        ckan.action.resource_view_create.assert_not_called()
+
+
+@pytest.mark.usefixtures("with_plugins", "clean_db")
+class TestBulkSyndication:
+    def test_select_by_organization_subtree(
+        self, organization_factory, package_factory
+    ):
+        from ckanext.datavicmain.syndication import bulk
+
+        parent = organization_factory()
+        child = organization_factory(groups=[{"name": parent["name"]}])
+        other = organization_factory()
+
+        nested = package_factory(owner_org=child["id"])
+        package_factory(owner_org=other["id"])
+
+        assert bulk.select_package_ids([parent["id"]]) == [nested["id"]]
+
+    def test_targets_are_pooled(self, mocker):
+        from ckanext.datavicmain.syndication import bulk
+
+        targets = bulk.PooledTargets(8)
+        profile = mocker.Mock(ckan_url="http://a.test", api_key="key")
+        other = mocker.Mock(ckan_url="http://b.test", api_key="key")
+
+        first = targets.get(profile)
+
+        assert first is targets.get(profile)
+        assert first is not targets.get(other)
+        assert first.session.get_adapter("http://a.test")._pool_maxsize == 8
+
+    def test_syndicated_dataset_updated_by_pooled_target(
+        self, package_factory, app, mocker
+    ):
+        from ckanext.datavicmain.syndication import bulk
+
+        dataset = package_factory()
+        model.Package.get(dataset["id"]).extras["remote"] = "rid"
+        model.Session.commit()
+        profile = mocker.Mock(id="test", field_id="remote")
+        ckan = mocker.Mock()
+        ckan.action.package_show.return_value = {
+            "id": "rid",
+            "name": "remote-name",
+            "owner_org": "remote-org",
+        }
+        targets = mocker.Mock(get=mocker.Mock(return_value=ckan))
+        mocker.patch.object(bulk.p, "PluginImplementations", return_value=[])
+        sync = mocker.patch.object(bulk.tasks, "sync_package", create=True)
+        send = mocker.patch.object(bulk.signals.after_syndication, "send")
+
+        assert bulk._syndicate(app.flask_app, dataset["id"], profile, targets)
+
+        sync.assert_not_called()
+        payload = ckan.action.package_update.call_args.kwargs
+        assert payload["id"] == "rid"
+        assert payload["name"] == "remote-name"
+        assert payload["title"] == dataset["title"]
+        send.assert_called_once_with(
+            dataset["id"],
+            profile=profile,
+            remote=ckan.action.package_update.return_value,
+            get_target=targets.get,
+        )
+
+    def test_new_dataset_created_by_task(self, package_factory, app, mocker):
+        from ckanext.datavicmain.syndication import bulk
+
+        dataset = package_factory()
+        profile = mocker.Mock(id="test", field_id="remote")
+        targets = mocker.Mock()
+        mocker.patch.object(bulk.p, "PluginImplementations", return_value=[])
+        sync = mocker.patch.object(bulk.tasks, "sync_package", create=True)
+
+        assert bulk._syndicate(app.flask_app, dataset["id"], profile, targets)
+
+        sync.assert_called_once_with(dataset["id"], bulk.Topic.update, profile)
+        targets.get.assert_not_called()
+
+
+class TestPreparePackageForOdp:
+    def test_payload_resources_are_used(self, mocker):
+        from ckanext.datavicmain.syndication import odp
+
+        show = mocker.patch.object(odp.tk, "get_action")
+        data_dict = {
+            "name": "dataset",
+            "extras": [{"key": "agency", "value": "dpc"}],
+            "groups": [{"id": "group-id", "name": "group"}],
+            "resources": [
+                {
+                    "id": "public",
+                    "url": "http://data.test/public.csv",
+                    "hash": "xxx",
+                    "datastore_active": True,
+                },
+                {
+                    "id": "private",
+                    "url": "http://data.test/private.csv",
+                    "private": "true",
+                },
+            ],
+        }
+
+        result = odp.prepare_package_for_odp("id", data_dict)
+
+        show.assert_not_called()
+        assert result["agency"] == "dpc"
+        assert result["groups"] == [{"name": "group"}]
+        assert result["resources"] == [
+            {
+                "id": "public",
+                "url": "http://data.test/public.csv",
+                "hash": "",
+                "datastore_active": False,
+                "package_id": "dataset",
+            }
+        ]
+
+    @pytest.mark.usefixtures("with_plugins", "clean_db")
+    def test_stripped_resources_are_fetched(self, package_factory, mocker):
+        from ckanext.datavicmain import plugins
+
+        dataset = package_factory(
+            resources=[{"url": "http://data.test/data.csv", "name": "Data"}]
+        )
+        payload = {
+            "name": dataset["name"],
+            "resources": [
+                {"url": "http://data.test/data.csv", "name": "Data"}
+            ],
+        }
+
+        result = plugins.DatasetForm().prepare_package_for_syndication(
+            dataset["id"], payload, mocker.Mock(id="odp")
+        )
+
+        assert [res["id"] for res in result["resources"]] == [
+            dataset["resources"][0]["id"]
+        ]
+
+
+@pytest.mark.usefixtures("clean_db")
+class TestDeltaSyndication:
+    @pytest.fixture
+    def target(self, mocker):
+        from ckanext.datavicmain.syndication import delta
+
+        remote = {"id": "remote-id", "name": "dataset", "title": "Title"}
+        ckan = mocker.Mock()
+        ckan.action.package_show.return_value = remote
+        ckan.action.package_update.return_value = remote
+        ckan.action.package_patch.return_value = remote
+
+        return delta.DeltaCKAN(ckan, "odp")
+
+    def test_only_changed_fields_are_sent(self, target):
+        payload = {"id": "remote-id", "name": "dataset", "title": "Title"}
+
+        target.action.package_update(**payload)
+        target.action.package_update(**dict(payload, title="New"))
+
+        target.ckan.action.package_update.assert_called_once()
+        target.ckan.action.package_patch.assert_called_once_with(
+            id="remote-id", title="New"
+        )
+
+    def test_unchanged_payload_is_not_sent(self, target):
+        payload = {"id": "remote-id", "name": "dataset", "title": "Title"}
+
+        target.action.package_update(**payload)
+        remote = target.action.package_show(id="remote-id")
+
+        assert target.action.package_update(**payload) is remote
+        target.ckan.action.package_update.assert_called_once()
+        target.ckan.action.package_patch.assert_not_called()
+
+    def test_removed_field_requires_update(self, target):
+        payload = {"id": "remote-id", "name": "dataset", "title": "Title"}
+
+        target.action.package_update(**payload)
+        payload.pop("title")
+        target.action.package_update(**payload)
+
+        assert target.ckan.action.package_update.call_count == 2
+
+    @pytest.mark.parametrize("enabled", [True, False])
+    def test_wrapped_only_when_enabled(self, enabled, monkeypatch, mocker):
+        from ckanext.datavicmain.syndication import delta
+
+        monkeypatch.setattr(
+            delta.config, "is_syndication_delta_enabled", lambda: enabled
+        )
+        ckan = mocker.Mock()
+
+        target = delta.wrap_target(ckan, mocker.Mock(id="odp"))
+
+        assert isinstance(target, delta.DeltaCKAN) is enabled
+
+
+@pytest.mark.usefixtures("with_plugins", "clean_db", "storage_path")
+class TestFakeRemoteSyndication:
+    def test_unchanged_files_are_uploaded_once(
+        self, remote_ckan, package_factory
+    ):
+        from ckanext.datavicmain.tests import remote
+
+        dataset = remote.make_uploaded_dataset(package_factory, 2, 100)
+        profile = remote.FakeProfile("odp", remote_ckan.url)
+
+        first = remote.syndicate(remote_ckan, profile, [dataset["id"]])
+        second = remote.syndicate(remote_ckan, profile, [dataset["id"]])
+
+        assert first.stats.requests["resource_patch"] == 2
+        assert first.stats.uploaded > 200
+        assert "resource_patch" not in second.stats.requests
+        assert second.requests_per_dataset < first.requests_per_dataset
+
+    def test_failed_uploads_are_recorded(
+        self, remote_ckan, package_factory, mocker
+    ):
+        from ckanext.datavicmain.model import FailedResourceSync
+        from ckanext.datavicmain.syndication import listeners
+        from ckanext.datavicmain.tests import remote
+
+        enqueue = mocker.patch.object(listeners.tk, "enqueue_job")
+        remote_ckan.fail_actions.add("resource_patch")
+        dataset = remote.make_uploaded_dataset(package_factory, 2, 100)
+        profile = remote.FakeProfile("odp", remote_ckan.url)
+
+        remote.syndicate(remote_ckan, profile, [dataset["id"]])
+
+        records = FailedResourceSync.for_dataset(dataset["id"], "odp")
+        assert len(records) == 2
+        assert all(record.next_attempt_at for record in records)
+        enqueue.assert_not_called()
+
+
+@pytest.mark.usefixtures("with_plugins", "clean_db")
+@pytest.mark.ckan_config("ckanext.syndicate.profile.odp.api_key", "xxx")
+@pytest.mark.ckan_config("ckanext.syndicate.profile.odp.ckan_url", "xxx")
+class TestSyndicationEligibility:
+    def test_reasons(self, package_factory, organization_factory):
+        from ckanext.datavicmain import const
+
+        restricted = organization_factory(visibility=const.ORG_RESTRICTED)
+        published = package_factory(workflow_status="published")
+        draft = package_factory()
+        hidden = package_factory(
+            workflow_status="published", owner_org=restricted["id"]
+        )
+
+        result = call_action(
+            "datavic_syndication_eligibility",
+            ids=[published["id"], draft["name"], hidden["id"]],
+        )
+
+        reasons = {item["id"]: item["reason"] for item in result["results"]}
+        assert reasons == {
+            published["id"]: "published",
+            draft["id"]: "not_published",
+            hidden["id"]: "restricted_org",
+        }
+        assert result["summary"]["odp"] == {
+            "published": 1,
+            "not_published": 1,
+            "restricted_org": 1,
+        }
+
+    def test_skipped_only(self, package_factory):
+        published = package_factory(workflow_status="published")
+        draft = package_factory()
+
+        result = call_action(
+            "datavic_syndication_eligibility",
+            ids=[published["id"], draft["id"]],
+            skipped_only=True,
+        )
+
+        assert [item["id"] for item in result["results"]] == [draft["id"]]
+        assert result["count"] == 1
+
+    def test_org_subtree_is_paginated(
+        self, package_factory, organization_factory
+    ):
+        parent = organization_factory()
+        child = organization_factory(groups=[{"name": parent["name"]}])
+        names = sorted(
+            package_factory(owner_org=org["id"])["name"]
+            for org in (parent, child, child)
+        )
+        package_factory()
+
+        result = call_action(
+            "datavic_syndication_eligibility",
+            org_id=parent["name"],
+            offset=1,
+            limit=1,
+        )
+
+        assert result["count"] == 3
+        assert [item["name"] for item in result["results"]] == names[1:2]
+        assert result["summary"]["odp"] == {"not_published": 3}
+
+    def test_sql_reason_matches_check(
+        self, package_factory, organization_factory
+    ):
+        from ckanext.datavicmain import const, utils
+        from ckanext.datavicmain.syndication import eligibility
+        from ckanext.datavicmain.tests import remote
+
+        restricted = organization_factory(visibility=const.ORG_RESTRICTED)
+        org = organization_factory()
+        ids = [
+            package_factory(workflow_status="published")["id"],
+            package_factory()["id"],
+            package_factory(workflow_status="archived")["id"],
+            package_factory(
+                workflow_status="published", owner_org=restricted["id"]
+            )["id"],
+            package_factory(
+                workflow_status="published", owner_org=org["id"], private=True
+            )["id"],
+            package_factory(
+                workflow_status="published", skip_syndication="true"
+            )["id"],
+        ]
+        profile = remote.FakeProfile("odp", "xxx")
+        restrictions = utils.get_org_restrictions()
+
+        expected = {
+            facts.id: eligibility.check(facts, profile, restrictions)[1]
+            for facts in eligibility.load_facts(ids, [profile])
+        }
+        reasons = dict(
+            model.Session.query(
+                model.Package.id,
+                eligibility.reason_clause(profile, restrictions.restricted),
+            ).filter(model.Package.id.in_(ids))
+        )
+
+        assert reasons == expected
+        assert len(set(reasons.values())) > 3
+
+    def test_org_without_materialized_restriction(
+        self, package_factory, organization_factory
+    ):
+        from ckanext.datavicmain import const, utils
+        from ckanext.datavicmain.model import OrgRestriction
+        from ckanext.datavicmain.syndication import eligibility
+        from ckanext.datavicmain.tests import remote
+
+        restricted = organization_factory(visibility=const.ORG_RESTRICTED)
+        dataset = package_factory(
+            workflow_status="published", owner_org=restricted["id"]
+        )
+        OrgRestriction.delete_many([restricted["id"]])
+        facts = eligibility.load_facts([dataset["id"]], [])[0]
+        profile = remote.FakeProfile("odp", "xxx")
+
+        assert eligibility.check(
+            facts, profile, utils.OrgRestrictions(frozenset(), frozenset())
+        ) == (False, eligibility.RESTRICTED_ORG)
@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import pytest
+
+import ckan.model as model
+from ckan.tests.helpers import call_action
+
+from ckanext.datavicmain import cache, const, utils
+from ckanext.datavicmain.model import OrgRestriction
+
+
+@pytest.mark.usefixtures("with_plugins", "clean_db")
+class TestOrgRestriction:
+    def test_restriction_is_materialized(self, organization_factory):
+        restricted = organization_factory(
+            **{const.ORG_VISIBILITY_FIELD: const.ORG_RESTRICTED}
+        )
+        unrestricted = organization_factory()
+
+        assert OrgRestriction.get(restricted["id"]).restricted
+        assert not OrgRestriction.get(unrestricted["id"]).restricted
+
+    def test_restriction_is_inherited(self, organization_factory):
+        parent = organization_factory(
+            **{const.ORG_VISIBILITY_FIELD: const.ORG_RESTRICTED}
+        )
+        child = organization_factory()
+
+        call_action(
+            "member_create",
+            id=child["id"],
+            object=parent["id"],
+            object_type="group",
+            capacity="parent",
+        )
+
+        assert OrgRestriction.get(child["id"]).restricted
+        assert utils.is_org_restricted(child["id"])
+
+        call_action(
+            "member_delete",
+            id=child["id"],
+            object=parent["id"],
+            object_type="group",
+        )
+
+        assert not OrgRestriction.get(child["id"]).restricted
+        assert not utils.is_org_restricted(child["id"])
+
+    def test_deleted_org_is_dropped(self, organization):
+        call_action("organization_delete", id=organization["id"])
+
+        assert OrgRestriction.get(organization["id"]) is None
+
+    def test_fallback_for_missing_record(self, organization_factory):
+        org = organization_factory(
+            **{const.ORG_VISIBILITY_FIELD: const.ORG_RESTRICTED}
+        )
+        OrgRestriction.delete_many([org["id"]])
+
+        assert utils.is_org_restricted(org["id"])
+
+        utils.refresh_org_restriction()
+
+        assert OrgRestriction.get(org["id"]).restricted
+
+
+@pytest.mark.usefixtures("with_plugins", "clean_db")
+class TestOrgAccessResolver:
+    def test_access(self, user, user_factory, organization_factory):
+        restricted = organization_factory(
+            **{const.ORG_VISIBILITY_FIELD: const.ORG_RESTRICTED},
+            users=[{"name": user["name"], "capacity": "admin"}],
+        )
+        unrestricted = organization_factory()
+
+        resolver = utils.OrgAccessResolver(user["name"])
+        assert resolver.has_access(restricted["id"])
+        assert resolver.has_access(unrestricted["id"])
+
+        resolver = utils.OrgAccessResolver(user_factory()["name"])
+        assert not resolver.has_access(restricted["id"])
+        assert resolver.has_access(unrestricted["id"])
+
+    def test_memberships_are_fetched_once(
+        self, user, organization_factory, mocker
+    ):
+        orgs = [
+            organization_factory(
+                **{const.ORG_VISIBILITY_FIELD: const.ORG_RESTRICTED}
+            )
+            for _ in range(3)
+        ]
+        resolver = utils.OrgAccessResolver(user["name"])
+        spy = mocker.spy(utils.tk, "get_action")
+
+        assert resolver.filter_accessible(org["id"] for org in orgs) == set()
+        assert spy.call_count == 1
+
+    def test_select_without_materialized_restriction(
+        self, user, organization_factory
+    ):
+        restricted = organization_factory(
+            **{const.ORG_VISIBILITY_FIELD: const.ORG_RESTRICTED}
+        )
+        unrestricted = organization_factory()
+        OrgRestriction.delete_many([restricted["id"], unrestricted["id"]])
+
+        resolver = utils.OrgAccessResolver(user["name"])
+        accessible = resolver.select_accessible(
+            model.Group.name, [restricted["name"], unrestricted["name"]]
+        )
+
+        assert accessible == {unrestricted["name"]}
+
+
+@pytest.mark.usefixtures("with_plugins", "clean_db")
+class TestGetOrgChain:
+    def test_chain_is_ordered_from_top(self, organization_factory):
+        top = organization_factory()
+        middle = organization_factory(groups=[{"name": top["name"]}])
+        bottom = organization_factory(groups=[{"name": middle["name"]}])
+
+        chain = utils.get_org_chain(bottom["name"])
+
+        assert [node["id"] for node in chain] == [
+            top["id"],
+            middle["id"],
+            bottom["id"],
+        ]
+
+    def test_missing_org(self):
+        assert utils.get_org_chain("not-a-real-org") == []
+
+
+@pytest.mark.usefixtures("with_plugins", "clean_db")
+class TestOrgHasUnrestrictedDescendant:
+    def test_no_children(self, organization):
+        assert not utils.org_has_unrestricted_descendant(organization["id"])
+
+    def test_unrestricted_grandchild(self, organization_factory):
+        top = organization_factory()
+        middle = organization_factory(groups=[{"name": top["name"]}])
+        organization_factory(groups=[{"name": middle["name"]}])
+
+        assert utils.org_has_unrestricted_descendant(top["id"])
+
+    def test_restricted_children(self, organization_factory):
+        restricted = {const.ORG_VISIBILITY_FIELD: const.ORG_RESTRICTED}
+        top = organization_factory(**restricted)
+        organization_factory(groups=[{"name": top["name"]}], **restricted)
+
+        assert not utils.org_has_unrestricted_descendant(top["id"])
+
+
+@pytest.mark.usefixtures("with_plugins", "clean_db")
+class TestFilterHierarchyTree:
+    def test_restricted_branch_is_removed(self, user, organization_factory):
+        top = organization_factory()
+        restricted = organization_factory(
+            groups=[{"name": top["name"]}],
+            **{const.ORG_VISIBILITY_FIELD: const.ORG_RESTRICTED},
+        )
+        tree = call_action("group_tree", type="organization")
+
+        assert tree[0]["children"][0]["id"] == restricted["id"]
+
+        result = utils.filter_hierarchy_tree(
+            tree, utils.OrgAccessResolver(user["name"])
+        )
+
+        assert result[0]["id"] == top["id"]
+        assert result[0]["children"] == []
+
+    def test_branch_without_materialized_restriction(
+        self, user, organization_factory
+    ):
+        top = organization_factory()
+        restricted = organization_factory(
+            groups=[{"name": top["name"]}],
+            **{const.ORG_VISIBILITY_FIELD: const.ORG_RESTRICTED},
+        )
+        OrgRestriction.delete_many([restricted["id"]])
+        cache.hierarchy_cache.clear()
+
+        tree = call_action("group_tree", type="organization")
+        result = utils.filter_hierarchy_tree(
+            tree, utils.OrgAccessResolver(user["name"])
+        )
+
+        assert result[0]["children"] == []
+
+    def test_tree_cache_is_invalidated(self, organization_factory):
+        top = organization_factory()
+        assert len(call_action("group_tree", type="organization")) == 1
+
+        organization_factory(groups=[{"name": top["name"]}])
+        tree = call_action("group_tree", type="organization")
+
+        assert len(tree) == 1
+        assert len(tree[0]["children"]) == 1
+
+
+@pytest.mark.usefixtures("with_plugins", "clean_db")
+class TestOrgRestrictions:
+    def test_missing_records_are_computed(self, organization_factory):
+        restricted = organization_factory(
+            **{const.ORG_VISIBILITY_FIELD: const.ORG_RESTRICTED}
+        )
+        child = organization_factory(groups=[{"name": restricted["name"]}])
+        OrgRestriction.delete_many([restricted["id"], child["id"]])
+        cache.hierarchy_cache.clear()
+
+        restrictions = utils.get_org_restrictions()
+
+        assert restrictions.is_restricted(restricted["id"])
+        assert restrictions.is_restricted(child["id"])
+
+    def test_unknown_org_is_checked_live(self, organization_factory):
+        restrictions = utils.OrgRestrictions(frozenset(), frozenset())
+        org = organization_factory(
+            **{const.ORG_VISIBILITY_FIELD: const.ORG_RESTRICTED}
+        )
+
+        assert restrictions.is_restricted(org["id"])
+        assert not restrictions.is_restricted(None)
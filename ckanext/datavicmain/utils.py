@@ -1,16 +1,26 @@
 from __future__ import annotations
 
 import logging
-from typing import Any, TypedDict
+from dataclasses import dataclass
+from datetime import datetime
+from functools import cached_property
+from typing import Any, Collection, Iterable, TypedDict
 
+import sqlalchemy as sa
+from flask import has_request_context
+
+import ckan.authz as authz
 import ckan.model as model
 import ckan.plugins.toolkit as tk
 import ckan.types as types
+from ckan.model.group import MAX_RECURSES
 
 from ckanext.mailcraft.mailer import MailerException
 from ckanext.mailcraft.utils import get_mailer
 
+import ckanext.datavicmain.cache as cache
 import ckanext.datavicmain.const as const
+from ckanext.datavicmain.model import OrgRestriction
 
 log = logging.getLogger(__name__)
 PENDING_USERS_FLAKE_NAME = "datavic:organization:join_request"
@@ -255,23 +265,234 @@ def notify_about_org_join_request(
 def user_has_org_access(org_id: str, user_id: str):
     """Organisation could be restricted. Only sysadmins and org members should
     have an access to the restricted organisation"""
+    return get_org_access_resolver(user_id).has_access(org_id)
 
-    if not is_org_restricted(org_id):
-        return True
 
-    user_orgs = tk.get_action("organization_list_for_user")(
-        {"ignore_auth": True}, {"id": user_id}
-    )
+class OrgAccessResolver:
+    """Resolve user's access to restricted organisations.
+
+    User's memberships and organisations restriction are fetched once and
+    reused for every check, so filtering a list of organisations doesn't
+    call organization_list_for_user per organisation."""
+
+    def __init__(self, user: str | None):
+        self.user = user
+        self._restricted: dict[str, bool] = {}
+
+    @cached_property
+    def is_sysadmin(self) -> bool:
+        return bool(self.user) and authz.is_sysadmin(self.user)
+
+    @cached_property
+    def member_org_ids(self) -> set[str]:
+        """IDs and names of organisations available to the user"""
+        if not self.user:
+            return set()
+
+        user_orgs = tk.get_action("organization_list_for_user")(
+            {"ignore_auth": True}, {"id": self.user}
+        )
 
-    for org in user_orgs:
-        if org_id in [org["id"], org["name"]]:
+        return {org["id"] for org in user_orgs} | {
+            org["name"] for org in user_orgs
+        }
+
+    def prefetch(self, org_ids: Iterable[str]) -> None:
+        """Load restriction of multiple organisations with a single query"""
+        missing = [
+            org_id for org_id in org_ids if org_id not in self._restricted
+        ]
+
+        if not missing:
+            return
+
+        for org_id, restriction in OrgRestriction.get_many(missing).items():
+            self._restricted[org_id] = restriction.restricted
+
+    def is_restricted(self, org_id: str) -> bool:
+        if org_id not in self._restricted:
+            self._restricted[org_id] = is_org_restricted(org_id)
+
+        return self._restricted[org_id]
+
+    def has_access(self, org_id: str) -> bool:
+        if self.is_sysadmin or not self.is_restricted(org_id):
             return True
 
-    return False
+        return org_id in self.member_org_ids
+
+    def select_accessible(
+        self, column: Any, values: Collection[str]
+    ) -> set[str]:
+        """Return organisations from the list that are available to user.
+        Organisations are filtered by ID or name(depends on column) in SQL"""
+        query = (
+            model.Session.query(column, model.Group.id, OrgRestriction.org_id)
+            .select_from(model.Group)
+            .outerjoin(OrgRestriction, OrgRestriction.org_id == model.Group.id)
+            .filter(column.in_(values))
+        )
+
+        if self.is_sysadmin:
+            return {value for value, _id, _materialized in query}
+
+        # organisations without materialized restriction are checked below
+        condition = OrgRestriction.restricted.isnot(True)
+
+        if self.member_org_ids:
+            condition = sa.or_(
+                condition, model.Group.id.in_(self.member_org_ids)
+            )
+
+        return {
+            value
+            for value, org_id, materialized in query.filter(condition)
+            if materialized
+            or org_id in self.member_org_ids
+            or not self.is_restricted(org_id)
+        }
+
+    def filter_accessible(self, org_ids: Iterable[str]) -> set[str]:
+        """Return organisations from the list that are available to user"""
+        org_ids = set(org_ids)
+
+        if self.is_sysadmin:
+            return org_ids
+
+        self.prefetch(org_ids)
+
+        return {org_id for org_id in org_ids if self.has_access(org_id)}
+
+
+@dataclass(frozen=True)
+class OrgRestrictions:
+    """Effective restriction of all organisations.
+
+    Organisations that have no materialized restriction yet are calculated
+    from the hierarchy when the snapshot is loaded, and organisations that
+    appeared after it are checked live."""
+
+    restricted: frozenset[str]
+    known: frozenset[str]
+
+    def is_restricted(self, org_id: str | None) -> bool:
+        if not org_id:
+            return False
+
+        if org_id in self.known:
+            return org_id in self.restricted
+
+        return is_org_restricted(org_id)
+
+
+def get_org_restrictions() -> OrgRestrictions:
+    """Return the restriction of all organisations. The snapshot is cached
+    until the organisation hierarchy is changed"""
+    return cache.hierarchy_cache.get(
+        "org_restrictions", _load_org_restrictions
+    )
+
+
+def _load_org_restrictions() -> OrgRestrictions:
+    restrictions: dict[str, bool] = dict(
+        model.Session.query(OrgRestriction.org_id, OrgRestriction.restricted)
+    )
+    visibility, parents = _load_org_hierarchy()
+
+    for org_id in visibility.keys() - restrictions.keys():
+        restrictions[org_id] = _is_restricted_in_hierarchy(
+            org_id, visibility, parents
+        )
+
+    return OrgRestrictions(
+        frozenset(
+            org_id for org_id, restricted in restrictions.items() if restricted
+        ),
+        frozenset(restrictions),
+    )
+
+
+def get_restricted_org_ids() -> frozenset[str]:
+    """Return IDs of all restricted organisations, including organisations
+    without materialized restriction"""
+    return get_org_restrictions().restricted
+
+
+def filter_hierarchy_tree(
+    tree: list[dict[str, Any]], resolver: OrgAccessResolver
+) -> list[dict[str, Any]]:
+    """Remove organisations unavailable to the user from the hierarchy tree.
+    Every node is visited once and checked against precomputed sets"""
+    if resolver.is_sysadmin:
+        return tree
+
+    restrictions = get_org_restrictions()
+
+    def _filter(nodes: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        result = []
+
+        for node in nodes:
+            if node[
+                "id"
+            ] not in resolver.member_org_ids and restrictions.is_restricted(
+                node["id"]
+            ):
+                continue
+
+            node["children"] = _filter(node.get("children", []))
+            result.append(node)
+
+        return result
+
+    return _filter(tree)
+
+
+def get_org_access_resolver(
+    user: str | None, context: types.Context | None = None
+) -> OrgAccessResolver:
+    """Return an access resolver for the user. Resolver is shared by the
+    current request (or the given context), so memberships are fetched once"""
+    if context is not None:
+        resolvers = context.setdefault(
+            "_datavic_org_access_resolvers", {}  # type: ignore
+        )
+    elif has_request_context():
+        resolvers = tk.g.setdefault("_datavic_org_access_resolvers", {})
+    else:
+        return OrgAccessResolver(user)
+
+    if user not in resolvers:
+        resolvers[user] = OrgAccessResolver(user)
+
+    return resolvers[user]
+
+
+def forget_org_access_resolvers() -> None:
+    """Drop resolvers of the current request after membership changes"""
+    if has_request_context():
+        tk.g.pop("_datavic_org_access_resolvers", None)
 
 
 def is_org_restricted(org_id: str) -> bool:
-    """Check if the organization is restricted"""
+    """Check if the organization is restricted. The effective restriction is
+    materialized, so it's a single lookup. Fallback to the hierarchy walk for
+    organisations that are not materialized yet"""
+    restriction = OrgRestriction.get(org_id)
+
+    if restriction is None:
+        organization = model.Group.get(org_id)
+
+        if organization and organization.id != org_id:
+            return is_org_restricted(organization.id)
+
+        return _compute_org_restriction(org_id)
+
+    return restriction.restricted
+
+
+def _compute_org_restriction(org_id: str) -> bool:
+    """Calculate the effective organisation restriction from its own visibility
+    and its parents hierarchy"""
     is_restricted = bool(
         model.Session.query(model.GroupExtra)
         .filter(model.GroupExtra.group_id == org_id)
@@ -313,6 +534,222 @@ def get_org_restricted_parents(org_id: str) -> list[model.Group]:
     return restricted_parents
 
 
+ORG_CHAIN_CTE = """WITH RECURSIVE chain(id, depth) AS (
+    SELECT g.id, 0 FROM "group" AS g
+    WHERE (g.id = :id OR g.name = :id)
+        AND g.type = :type AND g.state = 'active'
+    UNION
+    SELECT m.table_id, c.depth + 1 FROM chain AS c
+    INNER JOIN member AS m
+        ON m.group_id = c.id
+        AND m.table_name = 'group'
+        AND m.state = 'active'
+    WHERE c.depth < :max_depth
+)
+SELECT g.id, g.name, g.title FROM chain AS c
+INNER JOIN "group" AS g ON g.id = c.id
+WHERE g.type = :type AND g.state = 'active'
+ORDER BY c.depth DESC"""
+
+
+def get_org_chain(
+    id_or_name: str, type_: str = "organization"
+) -> list[dict[str, str]]:
+    """Return the organisation and all its parents with a single query.
+    Chain is sorted from the top level parent to the organisation itself"""
+    rows = model.Session.execute(
+        sa.text(ORG_CHAIN_CTE),
+        {
+            "id": id_or_name,
+            "type": type_,
+            "max_depth": MAX_RECURSES,
+        },
+    )
+
+    return [
+        {"id": id_, "name": name, "title": title} for id_, name, title in rows
+    ]
+
+
+def org_descendants_cte(org_id: str) -> Any:
+    """Recursive CTE with IDs of all organisations below the given one. It
+    could be joined to other queries, e.g. to collect packages of the
+    organisation subtree"""
+    base = sa.select(
+        model.Member.group_id.label("id"), sa.literal(1).label("depth")
+    ).where(
+        model.Member.table_id == org_id,
+        model.Member.table_name == "group",
+        model.Member.state == model.State.ACTIVE,
+    )
+    cte = base.cte("org_descendant", recursive=True)
+
+    member = sa.orm.aliased(model.Member)
+
+    return cte.union(
+        sa.select(member.group_id, cte.c.depth + 1).where(
+            member.table_id == cte.c.id,
+            member.table_name == "group",
+            member.state == model.State.ACTIVE,
+            cte.c.depth < MAX_RECURSES,
+        )
+    )
+
+
+def get_org_descendants_visibility(org_id: str) -> Any:
+    """Return a query of (ID, visibility) of every active organisation below
+    the given one. Visibility is None if the organisation doesn't have it"""
+    descendants = org_descendants_cte(org_id)
+
+    return (
+        model.Session.query(model.Group.id, model.GroupExtra.value)
+        .join(descendants, descendants.c.id == model.Group.id)
+        .outerjoin(
+            model.GroupExtra,
+            sa.and_(
+                model.GroupExtra.group_id == model.Group.id,
+                model.GroupExtra.key == const.ORG_VISIBILITY_FIELD,
+                model.GroupExtra.state == model.State.ACTIVE,
+            ),
+        )
+        .filter(model.Group.is_organization.is_(True))
+        .filter(model.Group.state == model.State.ACTIVE)
+    )
+
+
+def org_has_unrestricted_descendant(org_id: str) -> bool:
+    """Check if any organisation below the given one is unrestricted. The
+    check is done in SQL and stops at the first match"""
+    query = get_org_descendants_visibility(org_id).filter(
+        sa.or_(
+            model.GroupExtra.value.is_(None),
+            model.GroupExtra.value == const.ORG_UNRESTRICTED,
+        )
+    )
+
+    return model.Session.query(query.exists()).scalar()
+
+
+def refresh_org_restriction(org_id: str | None = None) -> set[str]:
+    """Recalculate the materialized restriction of the organisation and all
+    its children orgs. Recalculate the whole hierarchy if org_id is not
+    provided.
+
+    Restriction is inherited, so any change of visibility or of the parent
+    organisation affects the whole subtree.
+
+    Return IDs of the topmost organisations whose restriction has changed.
+    Datasets of their subtrees have outdated permission labels."""
+    visibility, parents = _load_org_hierarchy()
+
+    if org_id is None:
+        org_ids = set(visibility)
+    else:
+        organization = model.Group.get(org_id)
+
+        if not organization or not organization.is_organization:
+            return set()
+
+        org_ids = _get_subtree_ids(organization.id, parents)
+
+    existing = OrgRestriction.get_many(org_ids)
+    changed: set[str] = set()
+
+    for group_id in org_ids:
+        if group_id not in visibility:
+            continue
+
+        restricted = _is_restricted_in_hierarchy(group_id, visibility, parents)
+        restriction = existing.get(group_id)
+
+        if restriction is None:
+            model.Session.add(
+                OrgRestriction(org_id=group_id, restricted=restricted)
+            )
+        elif restriction.restricted != restricted:
+            restriction.restricted = restricted
+            restriction.modified_at = datetime.utcnow()
+            changed.add(group_id)
+
+    if org_id is None:
+        stale_ids = OrgRestriction.all_ids() - org_ids
+    else:
+        stale_ids = org_ids - set(visibility)
+
+    if stale_ids:
+        OrgRestriction.delete_many(stale_ids)
+
+    return {
+        group_id
+        for group_id in changed
+        if parents.get(group_id) not in changed
+    }
+
+
+def _is_restricted_in_hierarchy(
+    org_id: str,
+    visibility: dict[str, str | None],
+    parents: dict[str, str],
+) -> bool:
+    """Walk up from the organisation and check if any node is restricted"""
+    seen: set[str] = set()
+    current: str | None = org_id
+
+    while current and current not in seen:
+        if visibility.get(current) == const.ORG_RESTRICTED:
+            return True
+
+        seen.add(current)
+        current = parents.get(current)
+
+    return False
+
+
+def _load_org_hierarchy() -> tuple[dict[str, str | None], dict[str, str]]:
+    """Return own visibility of every active organisation and a mapping of
+    organisation ID to its parent ID"""
+    visibility: dict[str, str | None] = dict(
+        model.Session.query(model.Group.id, model.GroupExtra.value)
+        .outerjoin(
+            model.GroupExtra,
+            (model.GroupExtra.group_id == model.Group.id)
+            & (model.GroupExtra.key == const.ORG_VISIBILITY_FIELD)
+            & (model.GroupExtra.state == model.State.ACTIVE),
+        )
+        .filter(model.Group.is_organization.is_(True))
+        .filter(model.Group.state == model.State.ACTIVE)
+    )
+
+    parents: dict[str, str] = dict(
+        model.Session.query(model.Member.group_id, model.Member.table_id)
+        .filter(model.Member.table_name == "group")
+        .filter(model.Member.state == model.State.ACTIVE)
+        .filter(model.Member.group_id.in_(visibility))
+    )
+
+    return visibility, parents
+
+
+def _get_subtree_ids(org_id: str, parents: dict[str, str]) -> set[str]:
+    children: dict[str, list[str]] = {}
+
+    for child_id, parent_id in parents.items():
+        children.setdefault(parent_id, []).append(child_id)
+
+    subtree = {org_id}
+    queue = [org_id]
+
+    while queue:
+        for child_id in children.get(queue.pop(), []):
+            if child_id in subtree:
+                continue
+
+            subtree.add(child_id)
+            queue.append(child_id)
+
+    return subtree
+
+
 def get_extra_value(
     key: str, org_dict: types.ActionResult.OrganizationUpdate
 ) -> Any | None: